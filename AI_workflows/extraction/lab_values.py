@@ -0,0 +1,241 @@
+"""
+Structured lab-value extraction from PyPDF2 report text.
+
+Result lines are parsed into rows of test name, value, unit, reference range and
+the lab's own flag, e.g.
+    "Hemoglobin: 13.4 g/dL (Normal)"
+    "Hemoglobin  Hb  14.2 g/dL 13.0   17.0"
+Units are normalized to one canonical unit per known analyte, and all rows are
+flagged against their reference range (the report's own, else a bundled adult
+default) in one vectorized pass. Where the lab printed its own low/high flag,
+that flag wins; rows where the lab's note and the range still disagree are
+marked so the caller can have the LLM look at them.
+"""
+import re
+
+import numpy as np
+
+NUMBER = r"\d[\d,]*(?:\.\d+)?(?!\d)"
+ROW_RE = re.compile(
+    r"^(?P<name>[A-Za-z][A-Za-z0-9 ().,/%'-]*?)\s*:?\s*"
+    rf"(?P<qualifier>[<>≤≥]=?)?\s*(?P<value>{NUMBER})\s*"
+    r"(?P<unit>(?:lakhs?|million|thousand|x?\s*10\^?\d+)?\s*/?\s*[A-Za-zµμ%][A-Za-z0-9µμ%³/^.]*?)?\s*"
+    rf"(?:(?P<low>{NUMBER})\s*(?:-|–|to|\s)\s*(?P<high>{NUMBER}))?\s*"
+    r"(?:\((?P<flag>[^)]*)\))?\s*$"
+)
+IGNORED_NAME_RE = re.compile(r"\b(?:age|date|page|no|report|registration|sample|collected|received|phone|id)\b", re.I)
+CANDIDATE_LINE_RE = re.compile(r"^[A-Za-z].*\d")
+IGNORED_LINE_RE = re.compile(r"https?://|\||\b(?:page|date|no\.|registration|collected|received|generated|age|phone)\b", re.I)
+
+# Canonical name, canonical unit, adult reference range, name pattern.
+# First match wins, so red cell indices and HbA1c come before plain hemoglobin.
+ANALYTES = [
+    ("MCHC", "g/dL", (32, 36), r"\bmchc\b|mean corpuscular h(?:b|emoglobin) conc"),
+    ("MCH", "pg", (27, 32), r"\bmch\b|mean corpuscular h(?:b|emoglobin)"),
+    ("HbA1c", "%", (4.0, 5.7), r"hba1c|a1c|glycated|glycosylated"),
+    ("Hemoglobin", "g/dL", (12.0, 17.5), r"ha?emoglobin|\bhb\b|\bhgb\b"),
+    ("Total WBC count", "/µL", (4000, 11000), r"\bwbc\b|leu[ck]ocyte count|white blood cell"),
+    ("RBC count", "million/µL", (4.2, 5.9), r"\brbc\b|red blood cell"),
+    ("Platelet count", "/µL", (150000, 450000), r"platelet"),
+    ("Hematocrit", "%", (36, 50), r"ha?ematocrit|\bpcv\b|\bhct\b"),
+    ("MCV", "fL", (80, 100), r"\bmcv\b|mean corpuscular volume"),
+    ("ESR", "mm/hr", (0, 20), r"\besr\b|sedimentation"),
+    ("Fasting blood sugar", "mg/dL", (70, 100), r"fasting.*(?:sugar|glucose)|(?:sugar|glucose).*fasting|\bfbs\b"),
+    ("Postprandial blood sugar", "mg/dL", (70, 140), r"post ?prandial|\bppbs\b|\bpp\b"),
+    ("Random blood sugar", "mg/dL", (70, 140), r"random.*(?:sugar|glucose)|(?:sugar|glucose).*random|\brbs\b"),
+    ("Total cholesterol", "mg/dL", (0, 200), r"total cholesterol|^cholesterol"),
+    ("LDL cholesterol", "mg/dL", (0, 100), r"\bldl\b"),
+    ("HDL cholesterol", "mg/dL", (40, np.inf), r"\bhdl\b"),
+    ("Triglycerides", "mg/dL", (0, 150), r"triglyceride"),
+    ("Creatinine", "mg/dL", (0.6, 1.3), r"creatinine"),
+    ("Urea", "mg/dL", (15, 45), r"\burea\b|\bbun\b"),
+    ("Vitamin D", "ng/mL", (30, 100), r"vitamin d|25.?oh"),
+    ("Vitamin B12", "pg/mL", (200, 900), r"vitamin b12|cobalamin"),
+    ("CRP", "mg/L", (0, 5), r"\bcrp\b|c.reactive"),
+    ("TSH", "µIU/mL", (0.4, 4.5), r"\btsh\b|thyroid stimulating"),
+    ("Neutrophils", "%", (40, 75), r"neutrophil"),
+    ("Lymphocytes", "%", (20, 45), r"lymphocyte"),
+    ("Monocytes", "%", (2, 10), r"monocyte"),
+    ("Eosinophils", "%", (1, 6), r"eosinophil"),
+    ("Basophils", "%", (0, 1), r"basophil"),
+]
+ANALYTE_PATTERNS = [(re.compile(pattern, re.I), name, unit, reference) for name, unit, reference, pattern in ANALYTES]
+
+# The lab's own flag, e.g. "(Slightly Elevated)", "(Borderline High)", "(Deficient)", "(Normal)"
+LOW_FLAG_RE = re.compile(r"\b(?:low|lo|l|decreased|reduced|deficien\w*|insufficien\w*|below)\b", re.I)
+HIGH_FLAG_RE = re.compile(r"\b(?:high|hi|h|elevated|raised|increased|above)\b", re.I)
+BOUNDARY_NORMAL_RE = re.compile(r"^(?:low|high|upper|lower)[- ]normal(?: range)?$", re.I)
+NORMAL_FLAG_RE = re.compile(r"^(?:normal|n|wnl|within (?:normal )?(?:limits|range)|optimal|desirable|negative|non[- ]?reactive)$", re.I)
+
+# (analyte or None for any, normalized unit) -> (canonical unit, factor)
+UNIT_CONVERSIONS = {
+    (None, "/mm3"): ("/µL", 1),
+    (None, "cells/µl"): ("/µL", 1),
+    (None, "lakh/µl"): ("/µL", 1e5),
+    (None, "lakhs/µl"): ("/µL", 1e5),
+    (None, "lakh/mm3"): ("/µL", 1e5),
+    (None, "thousand/µl"): ("/µL", 1e3),
+    (None, "10^3/µl"): ("/µL", 1e3),
+    (None, "10^9/l"): ("/µL", 1e3),
+    (None, "million/mm3"): ("million/µL", 1),
+    (None, "10^6/µl"): ("million/µL", 1),
+    (None, "10^12/l"): ("million/µL", 1),
+    ("Hemoglobin", "g/l"): ("g/dL", 0.1),
+    ("MCHC", "g/l"): ("g/dL", 0.1),
+    ("Fasting blood sugar", "mmol/l"): ("mg/dL", 18.016),
+    ("Postprandial blood sugar", "mmol/l"): ("mg/dL", 18.016),
+    ("Random blood sugar", "mmol/l"): ("mg/dL", 18.016),
+    ("Total cholesterol", "mmol/l"): ("mg/dL", 38.67),
+    ("LDL cholesterol", "mmol/l"): ("mg/dL", 38.67),
+    ("HDL cholesterol", "mmol/l"): ("mg/dL", 38.67),
+    ("Triglycerides", "mmol/l"): ("mg/dL", 88.57),
+    ("Creatinine", "µmol/l"): ("mg/dL", 1 / 88.4),
+    ("Urea", "mmol/l"): ("mg/dL", 6.006),
+    ("Vitamin D", "nmol/l"): ("ng/mL", 1 / 2.496),
+    ("CRP", "mg/dl"): ("mg/L", 10),
+    ("HbA1c", "mmol/mol"): ("%", None),  # IFCC -> NGSP is affine, handled in normalize_units
+}
+
+
+def _number(text):
+    return float(text.replace(",", "")) if text else np.nan
+
+
+def _unit_key(unit):
+    unit = (unit or "").lower().replace("μ", "µ").replace("³", "3").replace("cumm", "mm3").replace("x", "").replace(" ", "")
+    return unit.replace("ul", "µl").replace("µµl", "µl").replace("iu", "IU") if unit else ""
+
+
+def identify_analyte(name):
+    for pattern, canonical, unit, reference in ANALYTE_PATTERNS:
+        if pattern.search(name):
+            return canonical, unit, reference
+    return None, None, None
+
+
+def parse_lab_text(text):
+    """
+    Returns (rows, unparsed): one dict per recognized result line and the
+    remaining lines that look like results but could not be parsed.
+    """
+    rows, unparsed = [], []
+    for line in (text or "").splitlines():
+        # PyPDF2 emits NULs for glyphs it cannot map (often the dash and brackets around ranges)
+        line = re.sub(r"[\x00-\x1f\s]+", " ", line).strip()
+        match = ROW_RE.match(line)
+        if match and not IGNORED_NAME_RE.search(match.group("name")) and (match.group("unit") or match.group("low") or match.group("flag")):
+            name = match.group("name").strip(" :.-")
+            analyte, _, _ = identify_analyte(name)
+            rows.append({
+                "test": analyte or name,
+                "value": _number(match.group("value")),
+                "qualifier": match.group("qualifier") or "",
+                "unit": (match.group("unit") or "").strip(),
+                "low": _number(match.group("low")),
+                "high": _number(match.group("high")),
+                "lab_flag": (match.group("flag") or "").strip(),
+            })
+        elif CANDIDATE_LINE_RE.match(line) and not IGNORED_LINE_RE.search(line):
+            unparsed.append(line)
+    return rows, unparsed
+
+
+def normalize_units(rows):
+    """Converts value and reference range to the analyte's canonical unit where a conversion is known."""
+    for row in rows:
+        analyte, canonical_unit, _ = identify_analyte(row["test"])
+        key = _unit_key(row["unit"])
+        if canonical_unit and key == _unit_key(canonical_unit):
+            row["unit"] = canonical_unit
+            continue
+        target, factor = UNIT_CONVERSIONS.get((analyte, key)) or UNIT_CONVERSIONS.get((None, key)) or (None, None)
+        if target == "%" and analyte == "HbA1c":
+            convert = lambda value: value * 0.09148 + 2.152
+        elif target:
+            convert = lambda value: value * factor
+        else:
+            continue
+        row["value"], row["low"], row["high"] = convert(row["value"]), convert(row["low"]), convert(row["high"])
+        row["unit"] = target
+    return rows
+
+
+def lab_flag_direction(lab_flag):
+    """"low", "high" or "normal" for the lab's own flag, None when empty or not one of those."""
+    lab_flag = (lab_flag or "").strip()
+    if BOUNDARY_NORMAL_RE.match(lab_flag):
+        return "normal"
+    low, high = bool(LOW_FLAG_RE.search(lab_flag)), bool(HIGH_FLAG_RE.search(lab_flag))
+    if low != high:
+        return "low" if low else "high"
+    if NORMAL_FLAG_RE.match(lab_flag):
+        return "normal"
+    return None
+
+
+def flag_rows(rows):
+    """
+    Adds "flag" ("low", "high", "normal" or "unknown") to every row in one pass:
+    the report's reference range is used where given, else the bundled default,
+    and a low/high flag printed by the lab overrides both. "flag_conflict" is
+    set where the lab's note still disagrees (it says normal, or something we
+    can't read, while the range says otherwise).
+    """
+    if not rows:
+        return rows
+    defaults = [identify_analyte(row["test"])[2] or (np.nan, np.nan) for row in rows]
+    values = np.array([row["value"] for row in rows], dtype=np.float64)
+    low = np.array([row["low"] for row in rows], dtype=np.float64)
+    high = np.array([row["high"] for row in rows], dtype=np.float64)
+
+    # Default ranges only apply when the row is in the analyte's canonical unit
+    canonical = np.array([row["unit"] == (identify_analyte(row["test"])[1] or "") for row in rows])
+    missing = np.isnan(low) & np.isnan(high) & canonical
+    low = np.where(missing, [d[0] for d in defaults], low)
+    high = np.where(missing, [d[1] for d in defaults], high)
+
+    flags = np.full(len(rows), "unknown", dtype=object)
+    known = ~np.isnan(low) & ~np.isnan(high)
+    flags[known] = "normal"
+    flags[known & (values < low)] = "low"
+    flags[known & (values > high)] = "high"
+
+    for row, row_low, row_high, flag in zip(rows, low, high, flags):
+        lab_direction = lab_flag_direction(row["lab_flag"])
+        if lab_direction in ("low", "high") or (lab_direction == "normal" and flag == "unknown"):
+            # The lab knows its method and population better than a bundled adult default
+            flag = lab_direction
+        row["flag_conflict"] = bool(row["lab_flag"]) and (
+            (lab_direction == "normal" and flag != "normal") or (lab_direction is None and flag in ("normal", "unknown"))
+        )
+        row["low"], row["high"], row["flag"] = row_low, row_high, flag
+    return rows
+
+
+def extract_lab_results(text):
+    """(flagged rows, unparsed result-like lines) for a lab report's text."""
+    rows, unparsed = parse_lab_text(text)
+    return flag_rows(normalize_units(rows)), unparsed
+
+
+def _format_number(value):
+    if np.isnan(value):
+        return ""
+    if np.isinf(value):
+        return "∞"
+    return f"{value:,.2f}".rstrip("0").rstrip(".")
+
+
+def format_lab_table(rows):
+    """Compact pipe table for the prompts; abnormal rows are marked with '!'."""
+    if not rows:
+        return "No lab values could be extracted from the report."
+    lines = ["Test | Value | Unit | Reference | Flag | Lab note"]
+    for row in rows:
+        reference = f"{_format_number(row['low'])}-{_format_number(row['high'])}" if not np.isnan(row["low"]) else ""
+        marker = "!" if row["flag"] in ("low", "high") else ""
+        lines.append(
+            f"{row['test']} | {row['qualifier']}{_format_number(row['value'])} | {row['unit']} | {reference} | "
+            f"{marker}{row['flag']} | {row['lab_flag']}"
+        )
+    return "\n".join(lines)
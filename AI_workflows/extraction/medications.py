@@ -0,0 +1,203 @@
+"""
+Deterministic medication normalizer for the free-text medication fields.
+
+Drug names (generic names, brands and aliases from drug_dictionary.json) are found
+with an Aho-Corasick automaton in one pass over the text; dosage and frequency are
+parsed from the text that follows each match. Output has the same shape the
+medication summarization task produces:
+    [{"medicine_name": ..., "dosage": ..., "frequency": ...}, ...]
+
+Sentences that mention no known drug, and sentences that name one but say it
+is not taken (negated, stopped, past use, allergy), are returned separately so
+the caller can send only those to the LLM.
+"""
+import json
+import os
+import re
+from collections import deque
+
+DICTIONARY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "drug_dictionary.json")
+UNKNOWN = "unknown"
+
+SENTENCE_SPLIT_RE = re.compile(r"\n+|(?<!\d)[.;](?!\d)")
+LIST_MARKER_RE = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+")
+NONE_RE = re.compile(r"^(?:none|nil|no|na|n/a|not applicable|no medications?|no medicines?|nothing)\.?$", re.I)
+# A drug in a sentence with one of these may not be a current medication; the LLM reads it instead
+CAVEAT_RE = re.compile(
+    r"\b(?:not|no|never|non|without|stop(?:ped|ping|s)?|discontinu\w*|quit|ceased|held|withheld|off|"
+    r"allerg\w*|intoleran\w*|reaction|sensitive|anymore|any more|previously|formerly|earlier|used to|"
+    r"in the past|was on|were on|history of|avoid\w*|(?:do|does|did|is|was|are|were|have|has|had)n'?t|can'?t)\b",
+    re.I,
+)
+
+DOSAGE_RE = re.compile(
+    r"(\d{1,3}(?:,\d{3})+|\d+(?:\.\d+)?)\s*"
+    r"(mg|mcg|µg|gm|g|ml|iu|units?|drops?|puffs?|tablets?|tabs?|capsules?|caps?|%)(?![a-z])",
+    re.I,
+)
+UNIT_NAMES = {"µg": "mcg", "gm": "g", "iu": "IU", "tab": "tablet", "tabs": "tablets", "cap": "capsule", "caps": "capsules"}
+COMPACT_UNITS = {"mg", "mcg", "g", "ml", "%"}
+
+# First matching pattern wins, so the more specific ones come first
+FREQUENCY_PATTERNS = [
+    (re.compile(r"\b(?:four times|4 times|4x)\s*(?:a|per|each)?\s*(?:day|daily)\b|\bqid\b|\bqds\b", re.I), "four times daily"),
+    (re.compile(r"\b(?:thrice|three times|3 times|3x)\s*(?:a|per|each)?\s*(?:day|daily)?\b|\btid\b|\btds\b", re.I), "three times daily"),
+    (re.compile(r"\b(?:twice|two times|2 times|2x)\s*(?:a|per|each)?\s*(?:day|daily)?\b|\bbid\b|\bbd\b", re.I), "twice daily"),
+    (re.compile(r"\bevery\s+(\d+)\s*(?:hours?|hrs?|h)\b|\bq(\d+)h\b", re.I), "every {} hours"),
+    (re.compile(r"\b(?:as|when|if) (?:needed|required)\b|\bprn\b|\bsos\b|\bon demand\b", re.I), "as needed"),
+    (re.compile(r"\bweekly\b|\b(?:once |one time )?(?:a|per|every|each) week\b", re.I), "once weekly"),
+    (re.compile(r"\bat (?:bed ?time|night)\b|\bbefore (?:bed|sleep)\b|\bnightly\b|\bhs\b", re.I), "once daily at night"),
+    (re.compile(r"\b(?:every|in the|each) morning\b|\bmornings\b", re.I), "once daily in the morning"),
+    (re.compile(r"\bonce\s*(?:a|per|each)?\s*(?:day|daily)\b|\bonce\b|\bdaily\b|\bevery ?day\b|\bod\b|\bqd\b", re.I), "once daily"),
+]
+TIMING_RE = re.compile(r"\b(after meals?|before meals?|with meals?|with food|after food|before food|on an empty stomach|empty stomach)\b", re.I)
+DURATION_RE = re.compile(r"\bfor\s+(\d+)\s*(days?|weeks?|months?)\b", re.I)
+
+
+class AhoCorasick:
+    """Multi-pattern matcher: all dictionary terms are found in one pass over the text."""
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for pattern_id, pattern in enumerate(patterns):
+            state = 0
+            for char in pattern:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.output[state].append((len(pattern), pattern_id))
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    def find_all(self, text):
+        """Yields (start, end, pattern_id) for every occurrence, overlapping included."""
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for length, pattern_id in self.output[state]:
+                yield position - length + 1, position + 1, pattern_id
+
+
+class MedicationNormalizer:
+    def __init__(self, dictionary=None):
+        if dictionary is None:
+            with open(DICTIONARY_FILE, encoding="utf-8") as file:
+                dictionary = json.load(file)
+
+        # Lowercased generic name, brand or alias -> generic name
+        self.terms = {}
+        for generic, aliases in dictionary.items():
+            self.terms.setdefault(generic.lower(), generic)
+            for alias in aliases:
+                self.terms.setdefault(alias.lower(), generic)
+        self.patterns = list(self.terms)
+        self.matcher = AhoCorasick(self.patterns)
+
+    def find_drugs(self, text):
+        """Leftmost-longest, non-overlapping whole-word matches as (start, end, generic name)."""
+        lowered = text.lower()
+        candidates = sorted(self.matcher.find_all(lowered), key=lambda match: (match[0], -(match[1] - match[0])))
+        matches, last_end = [], 0
+        for start, end, pattern_id in candidates:
+            if start < last_end:
+                continue
+            if (start > 0 and lowered[start - 1].isalnum()) or (end < len(lowered) and lowered[end].isalnum()):
+                continue
+            matches.append((start, end, self.terms[self.patterns[pattern_id]]))
+            last_end = end
+        return matches
+
+    def normalize(self, text):
+        """
+        Returns (items, unrecognized): structured medications in input order
+        (duplicates removed) and the sentences left for the LLM, i.e. those that
+        mention no known drug or say a drug is not taken.
+        """
+        items, unrecognized, seen = [], [], set()
+        for sentence in SENTENCE_SPLIT_RE.split(text or ""):
+            sentence = LIST_MARKER_RE.sub("", sentence).strip(" \t\"'“”-–,")
+            if not sentence or NONE_RE.match(sentence):
+                continue
+
+            matches = self.find_drugs(sentence)
+            if not matches or CAVEAT_RE.search(sentence):
+                unrecognized.append(sentence)
+                continue
+
+            for index, (start, end, generic) in enumerate(matches):
+                # Each drug owns the text up to the next drug mention
+                span_end = matches[index + 1][0] if index + 1 < len(matches) else len(sentence)
+                span = sentence[end:span_end]
+                written = sentence[start:end]
+                dosage = parse_dosage(span)
+                if dosage == UNKNOWN:
+                    # "0.5mg Clonazepam at bedtime"
+                    dosage = parse_dosage(sentence[matches[index - 1][1] if index else 0:start])
+                item = {
+                    # Brands and aliases keep the name the patient wrote, e.g. "Diphenhydramine (Benadryl)"
+                    "medicine_name": generic if written.lower() == generic.lower() else f"{generic} ({written})",
+                    "dosage": dosage,
+                    "frequency": parse_frequency(span),
+                }
+                key = (generic, item["dosage"], item["frequency"])
+                if key not in seen:
+                    seen.add(key)
+                    items.append(item)
+        return items, unrecognized
+
+
+def parse_dosage(text):
+    match = DOSAGE_RE.search(text)
+    if not match:
+        return UNKNOWN
+    amount, unit = match.group(1), match.group(2).lower()
+    unit = UNIT_NAMES.get(unit, unit)
+    return f"{amount}{unit}" if unit in COMPACT_UNITS else f"{amount} {unit}"
+
+
+def parse_frequency(text):
+    frequency = None
+    for pattern, canonical in FREQUENCY_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            hours = next((group for group in match.groups() if group), None) if match.groups() else None
+            frequency = canonical.format(hours) if hours else canonical
+            break
+
+    extras = [m.group(1).lower() for m in TIMING_RE.finditer(text)]
+    duration = DURATION_RE.search(text)
+    if duration:
+        extras.append(f"for {duration.group(1)} {duration.group(2).lower()}")
+    if not frequency:
+        return " ".join(extras) if extras else UNKNOWN
+    return " ".join([frequency] + extras)
+
+
+_normalizer = None
+
+
+def get_normalizer():
+    global _normalizer
+    if _normalizer is None:
+        _normalizer = MedicationNormalizer()
+    return _normalizer
+
+
+def normalize_medications(text):
+    return get_normalizer().normalize(text)
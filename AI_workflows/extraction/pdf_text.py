@@ -0,0 +1,92 @@
+"""
+Memory-bounded lab report ingestion.
+
+A report is streamed from its URL into a spooled buffer (in memory up to
+`spool_bytes`, then a temporary file) and hashed on the way, aborting as soon
+as it passes `max_bytes`. PyPDF2 is handed the open file rather than a path
+(a path is read whole into memory), and text is extracted page by page until
+`max_pages` or `max_chars`, so a 300-page scan costs no more than its first
+few pages. Whatever is cut is noted at the end of the text for the LLM.
+"""
+import hashlib
+import os
+import tempfile
+
+import requests
+from PyPDF2 import PdfReader
+
+CHUNK_SIZE = 256 * 1024
+MB = 1024 * 1024
+
+
+class AttachmentTooLarge(ValueError):
+    pass
+
+
+def ingestion_limits(config):
+    return {
+        "max_bytes": config["ATTACHMENT_MAX_MB"] * MB,
+        "spool_bytes": config["PDF_SPOOL_MB"] * MB,
+        "max_pages": config["LAB_REPORT_MAX_PAGES"],
+        "max_chars": config["LAB_REPORT_MAX_CHARS"],
+    }
+
+
+def check_size(size, max_bytes, name="attachment"):
+    if size is not None and size > max_bytes:
+        raise AttachmentTooLarge(f"{name} is {size / MB:.1f} MB, the limit is {max_bytes / MB:.0f} MB")
+
+
+# === Download ===
+def download_to_spool(url, max_bytes, spool_bytes, timeout):
+    """
+    Returns (file, sha256) with the file rewound. The caller closes the file.
+    Raises AttachmentTooLarge past `max_bytes` and ValueError on a failed download.
+    """
+    digest = hashlib.sha256()
+    spool = tempfile.SpooledTemporaryFile(max_size=spool_bytes, suffix=".pdf")
+    try:
+        with requests.get(url, stream=True, timeout=timeout) as response:
+            if response.status_code != 200:
+                raise ValueError(f"Failed to download PDF ({response.status_code})")
+            # Refuse early when the server announces the size; count bytes anyway, it may not
+            length = response.headers.get("Content-Length")
+            check_size(int(length) if length and length.isdigit() else None, max_bytes, "Lab report")
+
+            received = 0
+            for chunk in response.iter_content(CHUNK_SIZE):
+                received += len(chunk)
+                check_size(received, max_bytes, "Lab report")
+                digest.update(chunk)
+                spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+
+    spool.seek(0)
+    return spool, digest.hexdigest()
+
+
+def open_local(path, max_bytes):
+    check_size(os.path.getsize(path), max_bytes, "Lab report")
+    return open(path, "rb")
+
+
+# === Extraction ===
+def extract_text(file, max_pages, max_chars):
+    """Text of the first pages of the PDF in `file`, within the page and character budgets."""
+    reader = PdfReader(file)
+    page_count = len(reader.pages)
+    parts, used = [], 0
+    for number in range(min(page_count, max_pages)):
+        page_text = reader.pages[number].extract_text() or ""
+        if used + len(page_text) > max_chars:
+            parts.append(page_text[:max_chars - used])
+            return "".join(parts) + f"\n\n[Lab report truncated at {max_chars} characters, on page {number + 1} of {page_count}.]"
+        parts.append(page_text)
+        used += len(page_text)
+
+    text = "".join(parts)
+    if page_count > max_pages:
+        text += f"\n\n[Lab report truncated: only the first {max_pages} of {page_count} pages were read.]"
+    return text
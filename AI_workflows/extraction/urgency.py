@@ -0,0 +1,111 @@
+"""
+Rule-based urgency triage over the patient's free text (symptoms and important
+notes), used to order AI workflow jobs. No LLM is involved: each rule is a regex
+with a level, and the most urgent matching rule decides.
+
+    classify_urgency({"symptoms": "Chest pain radiating to left arm"})
+    -> ("emergency", ["chest pain"])
+
+Mentions preceded by a negation in the same clause ("no chest pain", "denies
+fever") are ignored, as are relatives' conditions ("mother had a stroke") and
+the patient's own past episodes: "history of stroke", "seizures in childhood",
+"stroke 5 years ago", or an episode followed by "fine now". A clause ends at
+punctuation or a contrast word, so "no chest pain, but short of breath" still
+counts the breathing difficulty. The checked examples are in
+benchmarks/urgency_triage.py.
+"""
+import re
+
+# Most urgent first; the index is the scheduling priority
+LEVELS = ("emergency", "urgent", "routine")
+ROUTINE = LEVELS.index("routine")
+
+# (level, reason, pattern)
+RULES = [
+    ("emergency", "chest pain", r"chest (?:pain|tightness|pressure|heaviness)|pain in (?:the |my )?chest|heart attack"),
+    ("emergency", "breathing difficulty", r"(?:shortness|short) of breath|difficulty (?:in )?breathing|can'?t breathe|unable to breathe|breathless|gasping|choking"),
+    ("emergency", "stroke signs", r"slurred speech|facial droop|face (?:drooping|droop)|(?:weakness|numbness) (?:on|in) (?:one|the (?:left|right)) side|sudden (?:weakness|numbness|confusion)|(?<!heat )\bstroke\b"),
+    ("emergency", "loss of consciousness", r"unconscious|passed out|fainted|fainting|blackout|black out|unresponsive|collapsed?"),
+    ("emergency", "seizure", r"seizures?|convulsions?|epileptic|\b(?:having|had|getting) (?:a )?fits?\b"),
+    ("emergency", "severe bleeding", r"(?:heavy|severe|uncontrolled|profuse) bleeding|vomiting blood|coughing (?:up )?blood|blood in vomit|haematemesis|hematemesis"),
+    ("emergency", "anaphylaxis", r"(?:throat|tongue|lips?) (?:swelling|swollen|closing)|swelling of (?:the )?(?:throat|tongue|lips?)|anaphyla"),
+    ("emergency", "suicidal thoughts", r"suicid|self[- ]harm|kill (?:myself|himself|herself)|end (?:my|his|her) life"),
+    ("emergency", "worst headache", r"worst headache|thunderclap"),
+    ("urgent", "high fever", r"(?:high|very high) fever|fever (?:of |above |over )?(?:10[3-9]|39\.[5-9]|4[0-2])|10[3-9](?:\.\d)? ?(?:°|deg(?:rees)?)? ?f|(?:39\.[5-9]|4[0-2](?:\.\d)?) ?(?:°|deg(?:rees)?)? ?c\b"),
+    ("urgent", "severe pain", r"(?:severe|excruciating|unbearable|intense) (?:\w+ )?pain|severe headache"),
+    ("urgent", "persistent vomiting", r"(?:persistent|continuous|constant|repeated) vomiting|can'?t keep (?:anything|food|water) down|vomiting (?:for|since) \d+ days"),
+    ("urgent", "dehydration", r"dehydrat|no urine|not urinating|very little urine"),
+    ("urgent", "blood in stool or urine", r"blood in (?:the )?(?:stool|urine|poop)|bloody (?:stool|urine|diarrh)|black,? tarry stool"),
+    ("urgent", "pregnancy", r"pregnan"),
+    ("urgent", "infant", r"\b(?:infant|newborn|[1-9] ?(?:months?|weeks?) old)\b"),
+    ("urgent", "confusion", r"confus|disoriented|drowsy|lethargic"),
+    ("urgent", "stiff neck with fever", r"stiff neck|neck stiffness"),
+]
+COMPILED_RULES = [(LEVELS.index(level), reason, re.compile(pattern, re.I)) for level, reason, pattern in RULES]
+
+# Negation and family history only reach back to the start of the mention's clause
+CLAUSE_BOUNDARY_RE = re.compile(r"[,;.:!?\n]|\b(?:but|however|although|though|yet|except)\b", re.I)
+# A negation word up to three words before the mention
+NEGATION_RE = re.compile(r"\b(?:no|not|denies|denied|without|never|negative for)\b(?:\W+\w+){0,3}\W*$", re.I)
+FAMILY_HISTORY_RE = re.compile(
+    r"\bfamily history\b|\b(?:mother|father|mom|mum|dad|brother|sister|grand\w+|parents?|aunt|uncle|cousin|relatives?)\b.*\b(?:had|has had|died|passed|history)\b",
+    re.I,
+)
+# The patient's past history, before the mention in its clause
+PAST_HISTORY_RE = re.compile(r"\b(?:(?:past|previous|medical) )?history of\b|\bh/o\b", re.I)
+# A time in the past, after the mention in its clause
+PAST_TIME_RE = re.compile(
+    r"\b(?:\d+|an?|one|two|three|four|five|six|seven|eight|nine|ten|few|several|many) (?:years?|yrs?|months?) ago\b"
+    r"|\blast (?:year|summer|winter|spring|autumn|monsoon)\b"
+    r"|\bin (?:my |his |her |their )?childhood\b|\bas an? (?:child|kid|baby)\b",
+    re.I,
+)
+# The clause after the mention says it is over: "choking yesterday, fine now"
+RESOLVED_RE = re.compile(r"^\W*(?:now )?(?:fine|better|okay|ok|normal|resolved|recovered|settled)\b", re.I)
+TEXT_FIELDS = ("symptoms", "important_notes")
+
+
+def _clause_before(text, position):
+    boundaries = [match.end() for match in CLAUSE_BOUNDARY_RE.finditer(text, 0, position)]
+    return text[boundaries[-1] if boundaries else 0:position]
+
+
+def _clause_after(text, position):
+    """The rest of the clause from `position`, and the position where the next clause starts (or None)."""
+    boundary = CLAUSE_BOUNDARY_RE.search(text, position)
+    return (text[position:boundary.start()], boundary.end()) if boundary else (text[position:], None)
+
+
+def _mentioned(pattern, text):
+    for match in pattern.finditer(text):
+        before = _clause_before(text, match.start())
+        if NEGATION_RE.search(before) or FAMILY_HISTORY_RE.search(before) or PAST_HISTORY_RE.search(before):
+            continue
+        after, next_start = _clause_after(text, match.end())
+        if PAST_TIME_RE.search(after):
+            continue
+        if next_start is not None and RESOLVED_RE.search(_clause_after(text, next_start)[0]):
+            continue
+        return True
+    return False
+
+
+def classify_urgency(inputs):
+    """
+    (level, reasons) for an appointment's inputs: the most urgent level with a
+    non-negated match, and the reasons found at that level.
+    """
+    text = "\n".join(str(inputs.get(field) or "") for field in TEXT_FIELDS)
+    best, reasons = ROUTINE, []
+    for rank, reason, pattern in COMPILED_RULES:
+        if rank > best or not _mentioned(pattern, text):
+            continue
+        if rank < best:
+            best, reasons = rank, []
+        reasons.append(reason)
+    return LEVELS[best], reasons
+
+
+def urgency_rank(level):
+    """Scheduling priority of a level (0 is most urgent); unknown levels are routine."""
+    return LEVELS.index(level) if level in LEVELS else ROUTINE
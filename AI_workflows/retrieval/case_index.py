@@ -0,0 +1,273 @@
+"""
+Similar-case retrieval over completed, doctor-validated appointments.
+
+Cases are embedded as hashed TF-IDF vectors (unigrams + bigrams, signed feature
+hashing into a fixed number of dimensions) and stored row-wise in a memory-mapped
+float32 matrix, so a top-k cosine query is a single matrix-vector product. Next
+to each vector only a de-identified summary is kept (see case_summary), since
+matches are shown to the LLM while another patient's report is written.
+
+Usage (from the project root):
+    python -m AI_workflows.retrieval.case_index sync             # index newly completed cases
+    python -m AI_workflows.retrieval.case_index query "chest pain radiating to left arm"
+"""
+import argparse
+import json
+import os
+import threading
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+from AI_workflows.retrieval.case_summary import summarize_case
+from AI_workflows.retrieval.text import tokenize, with_bigrams
+from utils.report_store import attach_reports
+from utils.tiering import TIERS
+
+CASE_TEXT_FIELDS = ["symptoms", "important_notes", "recent_medications", "regular_medications"]
+
+
+def case_text(inputs):
+    # Symptoms are repeated so they outweigh medication lists in the vector
+    return "\n".join([inputs.get("symptoms") or ""] * 2 + [inputs.get(field) or "" for field in CASE_TEXT_FIELDS[1:]])
+
+
+def _feature(token, dim):
+    h = zlib.crc32(token.encode())
+    return h % dim, (1.0 if (h >> 31) & 1 else -1.0)
+
+
+class CaseIndex:
+    """Append-only on-disk index; one process should own writes to a directory."""
+
+    def __init__(self, path, dim=1024):
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+        state_file = os.path.join(path, "state.json")
+        if os.path.exists(state_file):
+            with open(state_file) as file:
+                self.state = json.load(file)
+        else:
+            self.state = {"dim": dim, "count": 0, "capacity": 0, "high_water_mark": None}
+
+        self.dim = self.state["dim"]
+        df_file = os.path.join(path, "df.npy")
+        self.df = np.load(df_file) if os.path.exists(df_file) else np.zeros(self.dim, dtype=np.float64)
+        self.meta = self._load_meta()
+        self.indexed_ids = {entry["appointment_id"] for entry in self.meta}
+        self.vectors = self._open_vectors(self.state["capacity"])
+
+    # ---------- storage ----------
+    def _load_meta(self):
+        meta_file = os.path.join(self.path, "meta.jsonl")
+        if not os.path.exists(meta_file):
+            return []
+        with open(meta_file, encoding="utf-8") as file:
+            return [json.loads(line) for line in file if line.strip()]
+
+    def _open_vectors(self, capacity):
+        if capacity == 0:
+            return None
+        return np.memmap(os.path.join(self.path, "vectors.f32"), dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def _ensure_capacity(self, needed):
+        capacity = self.state["capacity"]
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2, 1024)
+        if self.vectors is not None:
+            self.vectors.flush()
+            self.vectors = None
+        with open(os.path.join(self.path, "vectors.f32"), "ab") as file:
+            file.truncate(new_capacity * self.dim * 4)
+        self.state["capacity"] = new_capacity
+        self.vectors = self._open_vectors(new_capacity)
+
+    def _save_state(self):
+        np.save(os.path.join(self.path, "df.npy"), self.df)
+        with open(os.path.join(self.path, "state.json"), "w") as file:
+            json.dump(self.state, file)
+
+    # ---------- vectors ----------
+    def _term_matrix(self, texts):
+        """Sublinear term frequencies, one row per text (vectorized scatter-add)."""
+        rows, cols, signs = [], [], []
+        for row, text in enumerate(texts):
+            for token in with_bigrams(tokenize(text)):
+                col, sign = _feature(token, self.dim)
+                rows.append(row)
+                cols.append(col)
+                signs.append(sign)
+
+        counts = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(counts, (np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64)), np.array(signs, dtype=np.float32))
+        return np.sign(counts) * np.log1p(np.abs(counts))
+
+    def _weight(self, tf):
+        idf = np.log((1.0 + self.state["count"]) / (1.0 + self.df)) + 1.0
+        weighted = tf * idf.astype(np.float32)
+        norms = np.linalg.norm(weighted, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return weighted / norms
+
+    # ---------- public API ----------
+    def __len__(self):
+        return self.state["count"]
+
+    def add_cases(self, cases):
+        """
+        cases: iterable of dicts with appointment_id, inputs, final_report and
+        optional created_at, patient_name and doctor_name (stripped from the
+        stored summary). Already-indexed appointment ids are skipped.
+        IDF weights are the ones current at insertion time.
+        """
+        with self.lock:
+            cases = [case for case in cases if case["appointment_id"] not in self.indexed_ids]
+            if not cases:
+                return 0
+
+            tf = self._term_matrix([case_text(case["inputs"]) for case in cases])
+            self.df += (tf != 0).sum(axis=0)
+            count = self.state["count"]
+            self.state["count"] = count + len(cases)
+
+            self._ensure_capacity(count + len(cases))
+            self.vectors[count:count + len(cases)] = self._weight(tf)
+            self.vectors.flush()
+
+            with open(os.path.join(self.path, "meta.jsonl"), "a", encoding="utf-8") as file:
+                for case in cases:
+                    names = [case.get("patient_name"), case.get("doctor_name")]
+                    entry = {
+                        "appointment_id": case["appointment_id"],
+                        "created_at": str(case.get("created_at") or ""),
+                        **summarize_case(case["inputs"], case.get("final_report"), names),
+                    }
+                    file.write(json.dumps(entry) + "\n")
+                    self.meta.append(entry)
+                    self.indexed_ids.add(case["appointment_id"])
+
+            self._save_state()
+            return len(cases)
+
+    def query(self, inputs, k=3):
+        """Returns up to k (cosine score, metadata) pairs, best first."""
+        # add_cases bumps the count before the rows and metadata exist; read a consistent snapshot
+        with self.lock:
+            count, vectors, meta = self.state["count"], self.vectors, self.meta
+            if count == 0:
+                return []
+            query_vector = self._weight(self._term_matrix([case_text(inputs)]))[0]
+
+        scores = vectors[:count] @ query_vector
+        k = min(k, count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), meta[i]) for i in top if scores[i] > 0]
+
+    def sync_from_db(self, db, batch_size=500):
+        """
+        Indexes appointments completed since the last sync, from both the hot
+        and the archive tier. The mark is `updated_at`, set when the final
+        report completes (and again when a case is archived); `finalized_at` is
+        set earlier, when the doctor clicks finalize, so a case finalized
+        before an already-synced one but completed after it would be missed.
+        """
+        query = {"status": "completed", "$or": [{"reports.final": {"$exists": True}}, {"final_report": {"$ne": None}}]}
+        if self.state["high_water_mark"]:
+            query["updated_at"] = {"$gte": datetime.fromisoformat(self.state["high_water_mark"])}
+
+        added, high_water_mark = 0, None
+        for tier in TIERS:
+            cursor = db[tier].find(
+                query,
+                {"appointment_id": 1, "inputs": 1, "reports": 1, "final_report": 1, "user_id": 1, "doctor_name": 1, "created_at": 1, "updated_at": 1}
+            ).sort("updated_at", 1)
+
+            batch = []
+            for appt in cursor:
+                batch.append(appt)
+                if appt.get("updated_at"):
+                    high_water_mark = max(high_water_mark or appt["updated_at"], appt["updated_at"])
+                if len(batch) >= batch_size:
+                    added += self.add_cases(with_patient_names(db, attach_reports(db, batch, "final")))
+                    batch = []
+            added += self.add_cases(with_patient_names(db, attach_reports(db, batch, "final")))
+
+        if high_water_mark:
+            self.state["high_water_mark"] = high_water_mark.isoformat()
+            self._save_state()
+        return added
+
+
+# === Workflow helpers ===
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def with_patient_names(db, cases):
+    """`cases` with the patient's name from `users` set, so the summary can strip it."""
+    user_ids = {case["user_id"] for case in cases if case.get("user_id") is not None}
+    if not user_ids:
+        return cases
+    names = {user["_id"]: user.get("name") for user in db.users.find({"_id": {"$in": list(user_ids)}}, {"name": 1})}
+    return [dict(case, patient_name=names.get(case.get("user_id"))) for case in cases]
+
+
+def get_case_index(config):
+    path = config.get("CASE_INDEX_DIR")
+    if not path:
+        return None
+    with _indexes_lock:
+        if path not in _indexes:
+            _indexes[path] = CaseIndex(path, dim=int(config.get("CASE_INDEX_DIM", 1024)))
+        return _indexes[path]
+
+
+def format_similar_cases(hits):
+    if not hits:
+        return "No similar validated cases found."
+    blocks = []
+    for number, (score, entry) in enumerate(hits, 1):
+        # Entries written before summaries were de-identified only have raw text; show none of it
+        if "condition" not in entry:
+            continue
+        blocks.append(
+            f"Similar case {number} (similarity {score:.2f})\n"
+            f"Presenting symptoms: {entry['symptoms'] or 'not recorded'}\n"
+            f"Assessed condition: {entry['condition'] or 'not recorded'}\n"
+            f"Treatment: {entry['treatment'] or 'not recorded'}"
+        )
+    return "\n\n".join(blocks) or "No similar validated cases found."
+
+
+def main(argv=None):
+    from utils.config import load_config
+    from utils.db import get_db
+
+    parser = argparse.ArgumentParser(description="Build or query the similar-case index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("sync", help="Index newly completed appointments")
+    query_parser = sub.add_parser("query", help="Find cases similar to the given symptoms")
+    query_parser.add_argument("symptoms")
+    query_parser.add_argument("-k", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    config = load_config()
+    index = get_case_index(config)
+    if index is None:
+        raise SystemExit("❌ CASE_INDEX_DIR is not configured")
+
+    if args.command == "sync":
+        added = index.sync_from_db(get_db(config))
+        print(f"✅ Indexed {added} new cases ({len(index)} total)")
+    else:
+        for score, entry in index.query({"symptoms": args.symptoms}, k=args.k):
+            print(f"{score:.3f}  #{entry['appointment_id']}  {entry['symptoms'][:80]}")
+
+
+if __name__ == "__main__":
+    main()
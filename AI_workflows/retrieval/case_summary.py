@@ -0,0 +1,127 @@
+"""
+De-identified summaries of completed cases, for the similar-case index.
+
+A validated case is shown to the LLM while another patient's report is
+written, so the index never keeps report text as such. Only three short
+fields are kept: the presenting symptoms, the assessed condition and the
+treatment. They are cut from the final report by its section headings. Names
+(the patient's and doctor's, and any after a title or salutation), ages,
+dates of birth, appointment ids and the signature block are stripped.
+"""
+import re
+
+SUMMARY_CHARS = 300
+
+# Checked in order: "Final Diagnostic and Prescription Report" is a title, not a section
+TITLE_WORDS = ("report",)
+TREATMENT_WORDS = ("treatment", "medication", "medicine", "prescri", "therapy", "plan")
+CONDITION_WORDS = ("condition", "diagnos", "assessment", "impression", "concern", "finding", "problem")
+
+# A markdown heading, or a bold label that may have text after it ("**Diagnosis:** Viral fever")
+HEADING_RE = re.compile(r"^\s*(?:#{1,6}\s+(?P<title>.+?)\s*#*\s*$|(?:\*\*|__)(?P<label>[^*_]+?)(?:\*\*|__)\s*:?\s*(?P<rest>.*)$)")
+MARKDOWN_RE = re.compile(r"[*_#>`|]+")
+# Whole lines that only identify someone
+LABEL_LINE_RE = re.compile(
+    r"^\W*(?:patient(?:'s)?\s+)?(?:name|age|dob|date of birth|appointment(?:\s+(?:id|no\.?|number))?"
+    r"|doctor|physician|consultant|signed(?:\s+by)?|signature|contact)\s*[:\-–]",
+    re.IGNORECASE,
+)
+SALUTATION_RE = re.compile(r"^\W*(?:dear|hello|hi|namaste)\b", re.IGNORECASE)
+# The signature block: this line and everything after it goes
+CLOSING_RE = re.compile(
+    r"^\W*(?:regards|best regards|warm regards|kind regards|sincerely|yours\b|signed\b|signature\b"
+    r"|stay safe|take care|best wishes|warm wishes|wishing you)",
+    re.IGNORECASE,
+)
+INLINE_PATTERNS = [
+    (re.compile(r"\b(?:name|age|dob|date of birth)\s*:\s*[^,;\n]*", re.IGNORECASE), ""),
+    (re.compile(r"\bDr\.?\s+[A-Z][\w.'-]*(?:\s+[A-Z][\w.'-]*)*"), "the doctor"),
+    (re.compile(r"\b(?:Mr|Mrs|Ms|Miss|Master|Shri|Smt|Kumari)\.?\s+[A-Z][\w'-]*(?:\s+[A-Z][\w'-]*)?"), "the patient"),
+    (re.compile(r"\b\d{1,3}[\s-]*(?:years?|yrs?)[\s-]*old\b", re.IGNORECASE), ""),
+    (re.compile(r"\b(?:aged?|age of)\s+\d{1,3}\b", re.IGNORECASE), ""),
+    (re.compile(r"\(\s*\d{1,3}\s*[MF]?\s*\)|\b\d{1,3}\s?[MF]\b"), ""),
+    (re.compile(r"\b(?:appointment|case|report)\s*(?:id|no\.?|number)?\s*[:#]?\s*#?\d+\b", re.IGNORECASE), ""),
+    (re.compile(r"#\d+\b"), ""),
+]
+
+
+def _name_patterns(names):
+    # Whole names first, then their parts; initials and very short parts are left alone
+    parts = set()
+    for name in names:
+        if name:
+            parts.add(name.strip())
+            parts.update(part for part in re.split(r"\W+", name) if len(part) >= 3)
+    return [re.compile(rf"\b{re.escape(part)}\b", re.IGNORECASE) for part in sorted(parts, key=len, reverse=True) if part]
+
+
+def deidentify(text, names=()):
+    """`text` without identifying lines, names, ages or appointment ids; stops at a signature block."""
+    name_patterns = _name_patterns(names)
+    lines = []
+    for line in (text or "").splitlines():
+        line = MARKDOWN_RE.sub(" ", line)
+        if CLOSING_RE.match(line):
+            break
+        if LABEL_LINE_RE.match(line) or SALUTATION_RE.match(line):
+            continue
+        for pattern, replacement in INLINE_PATTERNS:
+            line = pattern.sub(replacement, line)
+        for pattern in name_patterns:
+            line = pattern.sub("the patient", line)
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def _clip(text):
+    text = re.sub(r"\s+", " ", text)
+    # Stripped names and ages leave gaps like "I am the patient, , with..."
+    text = re.sub(r"\s+([,.;:])", r"\1", text)
+    text = re.sub(r"([,;])(?:\s*[,;])+", r"\1", text).strip(" ,;:-")
+    if len(text) <= SUMMARY_CHARS:
+        return text
+    return text[:SUMMARY_CHARS].rsplit(" ", 1)[0] + "..."
+
+
+def _section_kind(heading):
+    heading = heading.lower()
+    if any(word in heading for word in TITLE_WORDS):
+        return "title"
+    if any(word in heading for word in TREATMENT_WORDS):
+        return "treatment"
+    if any(word in heading for word in CONDITION_WORDS):
+        return "condition"
+    return None
+
+
+def summarize_case(inputs, final_report, names=()):
+    """
+    {"symptoms", "condition", "treatment"}, each de-identified and clipped to
+    SUMMARY_CHARS. Text before the first recognised section stands in for
+    the condition when the report has no condition heading.
+    """
+    sections = {None: [], "condition": [], "treatment": []}
+    current = None
+    for line in (final_report or "").splitlines():
+        match = HEADING_RE.match(line)
+        if match:
+            heading, rest = match["title"] or match["label"], match["rest"] or ""
+            kind = _section_kind(heading)
+            if kind == "title":
+                continue
+            if kind:
+                current = kind
+                line = rest
+            else:
+                # Sub-headings ("Poorly Controlled Diabetes") belong to the section they are in
+                line = f"{heading.strip().rstrip(':')}: {rest}" if rest else heading
+        sections[current].append(line)
+
+    def field(lines):
+        return _clip(deidentify("\n".join(lines), names))
+
+    return {
+        "symptoms": field([inputs.get("symptoms") or ""]),
+        "condition": field(sections["condition"] or sections[None]),
+        "treatment": field(sections["treatment"]),
+    }
@@ -0,0 +1,380 @@
+"""
+Local BM25 knowledge store, queried before the live Tavily search.
+
+Documents (curated reference text and accumulated web search results) are split
+into passages and indexed in immutable on-disk segments: a term dictionary plus
+memory-mapped posting arrays (doc ids, term frequencies). Each ingest writes a
+new segment; `compact` merges them into one.
+
+The Streamlit app (live search results) and the CLI ingest may write the same
+directory at once. Writers hold an exclusive lock on `store.lock` and reload
+the state another process left before assigning document ids; loading takes
+the shared lock. Queries work on a snapshot of the loaded state.
+
+Usage (from the project root):
+    python -m AI_workflows.retrieval.knowledge_store ingest references/      # .txt/.md files or .jsonl
+    python -m AI_workflows.retrieval.knowledge_store query "fever sore throat treatment"
+    python -m AI_workflows.retrieval.knowledge_store compact
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import shutil
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import numpy as np
+
+from AI_workflows.retrieval.text import tokenize
+
+K1 = 1.2
+B = 0.75
+PASSAGE_CHARS = 800
+
+
+def split_passages(text, max_chars=PASSAGE_CHARS):
+    """Paragraph-aligned passages of roughly max_chars each."""
+    passages, current = [], ""
+    for paragraph in [p.strip() for p in (text or "").split("\n\n") if p.strip()]:
+        if current and len(current) + len(paragraph) > max_chars:
+            passages.append(current)
+            current = ""
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+        while len(current) > max_chars * 2:
+            passages.append(current[:max_chars])
+            current = current[max_chars:]
+    if current:
+        passages.append(current)
+    return passages
+
+
+class Segment:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "terms.json"), encoding="utf-8") as file:
+            self.terms = json.load(file)
+        size = os.path.getsize(os.path.join(path, "docs.u32")) // 4
+        self.docs = np.memmap(os.path.join(path, "docs.u32"), dtype=np.uint32, mode="r", shape=(size,)) if size else np.zeros(0, np.uint32)
+        self.tfs = np.memmap(os.path.join(path, "tfs.u16"), dtype=np.uint16, mode="r", shape=(size,)) if size else np.zeros(0, np.uint16)
+
+    def postings(self, term):
+        entry = self.terms.get(term)
+        if entry is None:
+            return None
+        offset, count = entry
+        return self.docs[offset:offset + count], self.tfs[offset:offset + count]
+
+    @staticmethod
+    def write(path, postings):
+        """postings: {term: [(doc_id, tf), ...]} with doc ids ascending."""
+        tmp_path = path + ".tmp"
+        os.makedirs(tmp_path, exist_ok=True)
+        terms, docs, tfs, offset = {}, [], [], 0
+        for term in sorted(postings):
+            entries = postings[term]
+            terms[term] = [offset, len(entries)]
+            docs.extend(doc_id for doc_id, _ in entries)
+            tfs.extend(min(tf, 65535) for _, tf in entries)
+            offset += len(entries)
+
+        np.asarray(docs, dtype=np.uint32).tofile(os.path.join(tmp_path, "docs.u32"))
+        np.asarray(tfs, dtype=np.uint16).tofile(os.path.join(tmp_path, "tfs.u16"))
+        with open(os.path.join(tmp_path, "terms.json"), "w", encoding="utf-8") as file:
+            json.dump(terms, file)
+        # Readers only ever see complete segments
+        os.replace(tmp_path, path)
+
+
+class KnowledgeStore:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=1000)
+        os.makedirs(path, exist_ok=True)
+        with self._file_lock(shared=True):
+            self._load()
+
+    # ---------- storage ----------
+    def _state_file(self):
+        return os.path.join(self.path, "state.json")
+
+    @contextmanager
+    def _file_lock(self, shared=False):
+        """Cross-process lock on the store directory (msvcrt has no shared mode, so readers lock exclusively there)."""
+        with open(os.path.join(self.path, "store.lock"), "a+b") as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+                else:
+                    handle.seek(0)
+                    msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _load(self):
+        if os.path.exists(self._state_file()):
+            with open(self._state_file()) as file:
+                self.state = json.load(file)
+            self.state_mtime = os.path.getmtime(self._state_file())
+        else:
+            self.state = {"count": 0, "total_length": 0, "segments": [], "next_segment": 0}
+            self.state_mtime = None
+
+        self.segments = [Segment(os.path.join(self.path, name)) for name in self.state["segments"]]
+        count = self.state["count"]
+        self.doc_lengths = np.fromfile(os.path.join(self.path, "doc_lengths.u32"), dtype=np.uint32, count=count) if count else np.zeros(0, np.uint32)
+        self.doc_offsets = np.fromfile(os.path.join(self.path, "doc_offsets.u64"), dtype=np.uint64, count=count) if count else np.zeros(0, np.uint64)
+
+        hashes_file = os.path.join(self.path, "hashes.txt")
+        self.hashes = set()
+        if os.path.exists(hashes_file):
+            with open(hashes_file) as file:
+                self.hashes = {line.strip() for line in file}
+
+    def refresh(self):
+        # Picks up segments written by another process (e.g. a bulk ingest job)
+        if os.path.exists(self._state_file()) and os.path.getmtime(self._state_file()) != self.state_mtime:
+            with self.lock, self._file_lock(shared=True):
+                self._load()
+
+    def _sync(self):
+        """Reloads what another process wrote; called by writers under both locks."""
+        if not os.path.exists(self._state_file()):
+            return
+        with open(self._state_file()) as file:
+            on_disk = json.load(file)
+        if on_disk != self.state:
+            self._load()
+
+    def _save_state(self):
+        tmp_file = self._state_file() + ".tmp"
+        with open(tmp_file, "w") as file:
+            json.dump(self.state, file)
+        os.replace(tmp_file, self._state_file())
+        self.state_mtime = os.path.getmtime(self._state_file())
+
+    def get_document(self, doc_id, doc_offsets=None):
+        doc_offsets = self.doc_offsets if doc_offsets is None else doc_offsets
+        with open(os.path.join(self.path, "docs.jsonl"), "rb") as file:
+            file.seek(int(doc_offsets[doc_id]))
+            return json.loads(file.readline())
+
+    # ---------- ingest ----------
+    def add_documents(self, documents):
+        """
+        documents: iterable of {"text", "title"?, "source"?, "url"?}. Each is split
+        into passages; passages already in the store are skipped. Writes one segment.
+        """
+        with self.lock, self._file_lock():
+            self._sync()
+            passages = []
+            for document in documents:
+                for passage in split_passages(document.get("text")):
+                    digest = hashlib.sha1(passage.encode()).hexdigest()
+                    if digest in self.hashes:
+                        continue
+                    self.hashes.add(digest)
+                    passages.append((digest, dict(document, text=passage)))
+            if not passages:
+                return 0
+
+            first_id = self.state["count"]
+            postings = defaultdict(list)
+            lengths, offsets = [], []
+            with open(os.path.join(self.path, "docs.jsonl"), "ab") as docs_file:
+                for doc_id, (_, passage) in enumerate(passages, start=first_id):
+                    tokens = tokenize(f"{passage.get('title') or ''}\n{passage['text']}")
+                    for term, tf in Counter(tokens).items():
+                        postings[term].append((doc_id, tf))
+                    lengths.append(len(tokens))
+                    offsets.append(docs_file.tell())
+                    docs_file.write((json.dumps(passage) + "\n").encode())
+
+            # Entries past the committed count are left by an interrupted write; overwrite them
+            with open(os.path.join(self.path, "doc_lengths.u32"), "ab") as file:
+                file.truncate(first_id * 4)
+                np.asarray(lengths, dtype=np.uint32).tofile(file)
+            with open(os.path.join(self.path, "doc_offsets.u64"), "ab") as file:
+                file.truncate(first_id * 8)
+                np.asarray(offsets, dtype=np.uint64).tofile(file)
+            with open(os.path.join(self.path, "hashes.txt"), "a") as file:
+                file.writelines(digest + "\n" for digest, _ in passages)
+
+            name = f"seg_{self.state['next_segment']:05d}"
+            Segment.write(os.path.join(self.path, name), postings)
+            self.segments.append(Segment(os.path.join(self.path, name)))
+
+            self.doc_lengths = np.concatenate([self.doc_lengths, np.asarray(lengths, dtype=np.uint32)])
+            self.doc_offsets = np.concatenate([self.doc_offsets, np.asarray(offsets, dtype=np.uint64)])
+            self.state["count"] += len(passages)
+            self.state["total_length"] += int(sum(lengths))
+            self.state["segments"].append(name)
+            self.state["next_segment"] += 1
+            self._save_state()
+            return len(passages)
+
+    def compact(self):
+        """Merges all segments into one, keeping query cost independent of ingest history."""
+        with self.lock, self._file_lock():
+            self._sync()
+            if len(self.segments) <= 1:
+                return
+            merged = defaultdict(list)
+            for segment in self.segments:
+                for term in segment.terms:
+                    docs, tfs = segment.postings(term)
+                    merged[term].extend(zip(docs.tolist(), tfs.tolist()))
+
+            name = f"seg_{self.state['next_segment']:05d}"
+            Segment.write(os.path.join(self.path, name), merged)
+            old_segments = self.state["segments"]
+            self.state["segments"] = [name]
+            self.state["next_segment"] += 1
+            self._save_state()
+            self.segments = [Segment(os.path.join(self.path, name))]
+            for old in old_segments:
+                shutil.rmtree(os.path.join(self.path, old), ignore_errors=True)
+
+    # ---------- query ----------
+    def search(self, query, k=3):
+        """
+        Returns (hits, coverage). hits are (score, passage) pairs, best first;
+        coverage is the IDF-weighted share of query terms found in those hits,
+        used to decide whether local results are good enough.
+        """
+        started = time.perf_counter()
+        # A concurrent add_documents appends segments before it bumps the count; query a consistent snapshot.
+        # Segments are immutable and already mapped, so another process compacting them away is harmless.
+        with self.lock:
+            count, total_length = self.state["count"], self.state["total_length"]
+            segments, doc_lengths, doc_offsets = list(self.segments), self.doc_lengths, self.doc_offsets
+        terms = list(dict.fromkeys(tokenize(query)))
+        if count == 0 or not terms:
+            return [], 0.0
+
+        avg_length = total_length / count
+        scores = np.zeros(count, dtype=np.float32)
+        term_docs, term_idf = {}, {}
+        for term in terms:
+            found = [p for p in (segment.postings(term) for segment in segments) if p is not None]
+            docs = np.concatenate([p[0] for p in found]) if found else np.zeros(0, np.uint32)
+            df = len(docs)
+            term_idf[term] = math.log(1 + (count - df + 0.5) / (df + 0.5))
+            term_docs[term] = docs
+            if df == 0:
+                continue
+            tf = np.concatenate([p[1] for p in found]).astype(np.float32)
+            lengths = doc_lengths[docs].astype(np.float32)
+            # Each doc appears once per term, so fancy-index accumulation is safe
+            scores[docs] += term_idf[term] * tf * (K1 + 1) / (tf + K1 * (1 - B + B * lengths / avg_length))
+
+        k = min(k, count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        top = top[scores[top] > 0]
+
+        matched_idf = sum(idf for term, idf in term_idf.items() if np.isin(top, term_docs[term]).any())
+        coverage = matched_idf / sum(term_idf.values())
+        hits = [(float(scores[doc_id]), self.get_document(int(doc_id), doc_offsets)) for doc_id in top]
+
+        self.latencies.append(time.perf_counter() - started)
+        return hits, coverage
+
+    def latency_stats(self):
+        if not self.latencies:
+            return {"queries": 0}
+        ordered = sorted(self.latencies)
+        return {
+            "queries": len(ordered),
+            "p50_ms": ordered[len(ordered) // 2] * 1000,
+            "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        }
+
+
+# === Workflow helpers ===
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_knowledge_store(config):
+    path = config.get("KNOWLEDGE_STORE_DIR")
+    if not path:
+        return None
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = KnowledgeStore(path)
+        store = _stores[path]
+    store.refresh()
+    return store
+
+
+def load_documents(path):
+    """Reads .txt/.md files (one document each) and .jsonl files (one document per line)."""
+    files = [path] if os.path.isfile(path) else [
+        os.path.join(root, name) for root, _, names in os.walk(path) for name in sorted(names)
+    ]
+    for file_path in files:
+        if file_path.endswith(".jsonl"):
+            with open(file_path, encoding="utf-8") as file:
+                for line in file:
+                    if line.strip():
+                        yield json.loads(line)
+        elif file_path.endswith((".txt", ".md")):
+            with open(file_path, encoding="utf-8") as file:
+                yield {"title": os.path.splitext(os.path.basename(file_path))[0], "text": file.read(), "source": "curated"}
+
+
+def main(argv=None):
+    from utils.config import load_config
+
+    parser = argparse.ArgumentParser(description="Manage the local BM25 knowledge store.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    ingest_parser = sub.add_parser("ingest", help="Bulk ingest .txt/.md/.jsonl files")
+    ingest_parser.add_argument("path")
+    ingest_parser.add_argument("--batch-size", type=int, default=5000, help="Documents per segment")
+    query_parser = sub.add_parser("query", help="Search the store")
+    query_parser.add_argument("query")
+    query_parser.add_argument("-k", type=int, default=3)
+    sub.add_parser("compact", help="Merge all segments into one")
+    args = parser.parse_args(argv)
+
+    store = get_knowledge_store(load_config())
+    if store is None:
+        raise SystemExit("❌ KNOWLEDGE_STORE_DIR is not configured")
+
+    if args.command == "ingest":
+        added, batch = 0, []
+        for document in load_documents(args.path):
+            batch.append(document)
+            if len(batch) >= args.batch_size:
+                added += store.add_documents(batch)
+                batch = []
+        added += store.add_documents(batch)
+        print(f"✅ Added {added} passages ({store.state['count']} total, {len(store.segments)} segments)")
+    elif args.command == "query":
+        hits, coverage = store.search(args.query, k=args.k)
+        print(f"coverage {coverage:.2f}, {store.latency_stats()['p50_ms']:.2f} ms")
+        for score, passage in hits:
+            print(f"{score:6.2f}  [{passage.get('source', '')}] {passage['text'][:100]!r}")
+    else:
+        store.compact()
+        print("✅ Compacted into one segment")
+
+
+if __name__ == "__main__":
+    main()
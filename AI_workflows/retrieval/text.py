@@ -0,0 +1,19 @@
+import re
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+
+STOPWORDS = frozenset("""
+a an and are as at be been but by for from has have had he her his i in is it its
+me my no not of on or our she so that the their them there they this to was we were
+with you your since past days day few also very some any all can will would should
+""".split())
+
+
+def tokenize(text):
+    """Lowercased word tokens with stopwords and single characters removed."""
+    return [token for token in TOKEN_RE.findall((text or "").lower()) if len(token) > 1 and token not in STOPWORDS]
+
+
+def with_bigrams(tokens):
+    # Bigrams keep short clinical phrases ("chest pain", "shortness breath") together
+    return tokens + [f"{first} {second}" for first, second in zip(tokens, tokens[1:])]
@@ -0,0 +1,476 @@
+"""
+Per-agent model routing for the CrewAI workflows.
+
+Each agent in a workflow's agents.yaml may carry a `routing` block:
+
+    Symptom_Summarizer_Agent:
+      role: ...
+      routing:
+        model: fast            # profile in AI_workflows/models.yaml
+        latency_budget_s: 30   # per LLM call
+        fallback: null         # profile to retry with when the budget is exceeded;
+                               # without one, overruns are only reported
+        hedge: true            # default; false disables hedged requests for the agent
+
+The block is removed before the Agent is created. Agents without one use
+ROUTING_DEFAULT_PROFILE with no budget, i.e. the previous single-model behaviour.
+
+Every workflow run also has an overall deadline (APPOINTMENT_SLO_S): no call
+waits past it, and once it has passed (or the run is cancelled) every further
+call raises RunCancelled, which ends the crew's kickoff. With LLM_HEDGING on, a
+call still running after the p95 latency of earlier calls to the same stage and
+profile gets a duplicate request; the first response wins and the other is
+abandoned.
+Every call is recorded in a RoutingReport (latency, fallbacks, tokens and cost),
+appended to ROUTING_REPORT_FILE at the end of a run. Token counts come from the
+provider's usage where litellm reports it, including prompt tokens served from
+the provider's prefix cache (DeepSeek `prompt_cache_hit_tokens`); otherwise
+they are estimated from text length. Each call is also a span in the
+appointment's trace (utils.tracing).
+
+Usage (from the project root):
+    python -m AI_workflows.routing report        # summarize recorded runs
+"""
+import argparse
+import json
+import os
+import threading
+import time
+import uuid
+import weakref
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeout, wait
+from datetime import datetime, timezone
+
+import litellm
+import yaml
+from crewai import BaseLLM, LLM
+
+from utils import tracing
+
+DEFAULT_MODELS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models.yaml")
+PROFILE_COST_KEYS = ("input_cost_per_mtok", "cached_input_cost_per_mtok", "output_cost_per_mtok")
+
+HEDGE_MIN_SAMPLES = 20
+LATENCY_HISTORY_SIZE = 200
+CANCEL_POLL_S = 0.5
+
+# Calls with a deadline run here so the caller can stop waiting for them; abandoned
+# requests keep a thread until the provider answers or the client timeout hits
+_request_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-request")
+
+# Reports of in-flight runs, looked up by the litellm usage callback
+_active_reports = weakref.WeakValueDictionary()
+_usage_callback_lock = threading.Lock()
+
+
+class RunCancelled(Exception):
+    """Raised by every LLM call of a run whose deadline has passed or that was cancelled."""
+
+
+class RunDeadline:
+    """Overall time limit of one workflow run, shared by all of its calls."""
+
+    def __init__(self, seconds=None, cancelled=None):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds if seconds else None
+        self.cancelled = cancelled or threading.Event()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def remaining(self):
+        """Seconds left (None without a deadline); raises RunCancelled once there are none."""
+        if self.cancelled.is_set():
+            raise RunCancelled("workflow run was cancelled")
+        if self.expires_at is None:
+            return None
+        remaining = self.expires_at - time.monotonic()
+        if remaining <= 0:
+            self.cancel()
+            raise RunCancelled(f"workflow run exceeded its {self.seconds}s deadline")
+        return remaining
+
+
+class LatencyHistory:
+    """Recent successful call latencies per (stage, profile), seeded from the routing report file."""
+
+    def __init__(self, size=LATENCY_HISTORY_SIZE):
+        self.samples = defaultdict(lambda: deque(maxlen=size))
+        self.seeded = set()
+        self.lock = threading.Lock()
+
+    def seed(self, path, tail_bytes=2 ** 20):
+        with self.lock:
+            if not path or path in self.seeded or not os.path.exists(path):
+                return
+            self.seeded.add(path)
+            size = os.path.getsize(path)
+            with open(path, "rb") as file:
+                file.seek(max(0, size - tail_bytes))
+                lines = file.read().splitlines()
+        if size > tail_bytes:
+            lines = lines[1:]  # starts mid-record
+        for line in lines:
+            try:
+                calls = json.loads(line)["calls"]
+            except (ValueError, KeyError):
+                continue
+            for call in calls:
+                if not call.get("timed_out"):
+                    self.add(call["stage"], call["profile"], call["latency_s"])
+
+    def add(self, stage, profile_name, latency):
+        with self.lock:
+            self.samples[(stage, profile_name)].append(latency)
+
+    def p95(self, stage, profile_name):
+        with self.lock:
+            samples = sorted(self.samples.get((stage, profile_name), ()))
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return samples[int(len(samples) * 0.95) - 1]
+
+
+_latency_history = LatencyHistory()
+
+
+def race(call, timeout=None, hedge_after=None, cancelled=None):
+    """
+    Runs call() and, if it is still running after `hedge_after` seconds, a
+    duplicate; returns (result, hedged) from whichever succeeds first. Raises
+    FutureTimeout after `timeout` seconds and RunCancelled when `cancelled` is set.
+    The slower request is abandoned: a queued one is cancelled, one in flight
+    cannot be interrupted through the synchronous client and its result is dropped.
+    """
+    started = time.monotonic()
+    pending, hedged, error = {_request_pool.submit(call)}, False, None
+    while pending:
+        elapsed = time.monotonic() - started
+        limits = [CANCEL_POLL_S] if cancelled is not None else []
+        limits += [limit - elapsed for limit in (timeout, None if hedged else hedge_after) if limit is not None]
+        done, pending = wait(pending, timeout=max(0, min(limits)) if limits else None, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                for loser in pending:
+                    loser.cancel()
+                return future.result(), hedged
+            error = future.exception()
+
+        elapsed = time.monotonic() - started
+        if pending and cancelled is not None and cancelled.is_set():
+            for loser in pending:
+                loser.cancel()
+            raise RunCancelled("workflow run was cancelled")
+        if pending and timeout is not None and elapsed >= timeout:
+            for loser in pending:
+                loser.cancel()
+            raise FutureTimeout()
+        if pending and not hedged and hedge_after is not None and elapsed >= hedge_after:
+            pending.add(_request_pool.submit(call))
+            hedged = True
+    raise error
+
+
+def load_profiles(config):
+    with open(config.get("LLM_MODELS_FILE") or DEFAULT_MODELS_FILE) as file:
+        return yaml.safe_load(file)
+
+
+def estimate_tokens(content):
+    """Rough token count (~4 characters per token) for string or chat-message input."""
+    if isinstance(content, list):
+        content = " ".join(str(message.get("content", "")) if isinstance(message, dict) else str(message) for message in content)
+    return len(str(content or "")) // 4
+
+
+def provider_usage(response):
+    """(prompt, cached prompt, completion) tokens from a litellm response."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return None
+    cached = getattr(usage, "prompt_cache_hit_tokens", None)
+    if cached is None:
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None) if details is not None else None
+    return getattr(usage, "prompt_tokens", 0) or 0, cached or 0, getattr(usage, "completion_tokens", 0) or 0
+
+
+def _record_usage(kwargs, response, start_time, end_time):
+    # litellm success callback; runs for every completion, routed or not
+    metadata = (kwargs.get("litellm_params") or {}).get("metadata") or {}
+    report = _active_reports.get(metadata.get("routing_report"))
+    usage = provider_usage(response)
+    if report is not None and usage is not None:
+        report.record_usage(metadata["routing_stage"], metadata["routing_profile"], *usage)
+
+
+def _install_usage_callback():
+    with _usage_callback_lock:
+        if _record_usage not in litellm.success_callback:
+            litellm.success_callback.append(_record_usage)
+
+
+class RoutingReport:
+    def __init__(self, workflow, profiles=None):
+        self.id = uuid.uuid4().hex
+        self.workflow = workflow
+        self.profiles = profiles or {}
+        self.calls = []
+        self.usage = []
+        self.lock = threading.Lock()
+
+    def record(self, **call):
+        with self.lock:
+            self.calls.append(call)
+
+    def record_usage(self, stage, profile_name, prompt_tokens, cached_tokens, completion_tokens):
+        profile = self.profiles.get(profile_name, {})
+        input_rate = profile.get("input_cost_per_mtok", 0)
+        cost = (
+            (prompt_tokens - cached_tokens) * input_rate
+            + cached_tokens * profile.get("cached_input_cost_per_mtok", input_rate)
+            + completion_tokens * profile.get("output_cost_per_mtok", 0)
+        ) / 1e6
+        with self.lock:
+            self.usage.append({
+                "stage": stage,
+                "profile": profile_name,
+                "prompt_tokens": prompt_tokens,
+                "cached_tokens": cached_tokens,
+                "completion_tokens": completion_tokens,
+                "cost_usd": cost,
+            })
+
+    def summary(self):
+        """
+        One row per stage (agent or helper step): calls, budget overruns, timeouts,
+        fallbacks, latency, tokens, prefix-cache hit rate and cost. Provider usage
+        replaces the text-length estimates for stages that have it.
+        """
+        stages, usage = defaultdict(list), defaultdict(list)
+        for call in self.calls:
+            stages[call["stage"]].append(call)
+        for entry in self.usage:
+            usage[entry["stage"]].append(entry)
+        rows = []
+        for stage, calls in stages.items():
+            latencies = sorted(call["latency_s"] for call in calls)
+            prompt_tokens = sum(entry["prompt_tokens"] for entry in usage[stage])
+            cached_tokens = sum(entry["cached_tokens"] for entry in usage[stage])
+            rows.append({
+                "stage": stage,
+                "profiles": sorted({call["profile"] for call in calls}),
+                "calls": len(calls),
+                "timeouts": sum(bool(call.get("timed_out")) for call in calls),
+                "over_budget": sum(bool(call.get("over_budget")) for call in calls),
+                "fallbacks": sum(call["fallback"] for call in calls),
+                "hedged": sum(bool(call.get("hedged")) for call in calls),
+                "p50_s": latencies[len(latencies) // 2],
+                "max_s": latencies[-1],
+                "total_s": sum(latencies),
+                "tokens": sum(entry["prompt_tokens"] + entry["completion_tokens"] for entry in usage[stage])
+                          if usage[stage] else sum(call["input_tokens"] + call["output_tokens"] for call in calls),
+                "cached_pct": 100 * cached_tokens / prompt_tokens if prompt_tokens else None,
+                "cost_usd": sum(entry["cost_usd"] for entry in usage[stage])
+                            if usage[stage] else sum(call["cost_usd"] for call in calls),
+            })
+        return rows
+
+    def write(self, path, outcome="completed"):
+        if not path or not self.calls:
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a", encoding="utf-8") as file:
+            file.write(json.dumps({
+                "workflow": self.workflow,
+                "finished_at": datetime.now(timezone.utc).isoformat(),
+                "outcome": outcome,
+                "calls": self.calls,
+                "usage": self.usage,
+            }) + "\n")
+
+
+def format_summary(rows):
+    lines = [f"{'stage':<60}{'profile':<14}{'calls':>6}{'over':>5}{'t/o':>5}{'fallb.':>7}{'hedged':>7}{'p50 s':>8}{'max s':>8}{'total s':>9}{'tokens':>8}{'cached':>8}{'cost $':>10}"]
+    for row in sorted(rows, key=lambda row: -row["total_s"]):
+        cached = f"{row['cached_pct']:.0f}%" if row["cached_pct"] is not None else "-"
+        lines.append(
+            f"{row['stage']:<60}{','.join(row['profiles']):<14}{row['calls']:>6}{row['over_budget']:>5}{row['timeouts']:>5}{row['fallbacks']:>7}{row['hedged']:>7}"
+            f"{row['p50_s']:>8.2f}{row['max_s']:>8.2f}{row['total_s']:>9.2f}{row['tokens']:>8}{cached:>8}{row['cost_usd']:>10.5f}"
+        )
+    return "\n".join(lines)
+
+
+def _make_llm(profile, config, timeout=None, metadata=None):
+    options = {key: value for key, value in profile.items() if key not in PROFILE_COST_KEYS + ("api_key",)}
+    if timeout:
+        # Backstop so abandoned calls do not hold a connection forever
+        options.setdefault("timeout", timeout * 2)
+    # Passed through to litellm so _record_usage can attribute the provider's usage
+    return LLM(api_key=config.get(profile.get("api_key"), "none"), metadata=metadata, **options)
+
+
+class RoutedLLM(BaseLLM):
+    """
+    The LLM handed to one agent (or helper step). Calls go to the route's
+    profile; when the latency budget runs out and a fallback profile is set,
+    the call is abandoned and retried once on the fallback. No call waits past
+    the run's deadline.
+    """
+
+    def __init__(self, stage, route, profiles, config, report, deadline=None, traceparent=None):
+        self.stage = stage
+        self.traceparent = traceparent
+        self.profiles = profiles
+        self.report = report
+        self.deadline = deadline or RunDeadline()
+        self.profile_name = route.get("model") or config["ROUTING_DEFAULT_PROFILE"]
+        self.fallback_name = route.get("fallback")
+        self.latency_budget_s = route.get("latency_budget_s")
+        self.hedge = config["LLM_HEDGING"] and route.get("hedge", True)
+        client_timeout = self.latency_budget_s or self.deadline.seconds
+        self.primary = _make_llm(profiles[self.profile_name], config, client_timeout, self._metadata(self.profile_name))
+        self.fallback = _make_llm(profiles[self.fallback_name], config, self.deadline.seconds, self._metadata(self.fallback_name)) if self.fallback_name else None
+        super().__init__(model=self.primary.model, temperature=getattr(self.primary, "temperature", None))
+
+    def _metadata(self, profile_name):
+        return {"routing_report": self.report.id, "routing_stage": self.stage, "routing_profile": profile_name}
+
+    def _record(self, profile_name, latency, messages, result, **extra):
+        profile = self.profiles[profile_name]
+        input_tokens, output_tokens = estimate_tokens(messages), estimate_tokens(result)
+        self.report.record(
+            stage=self.stage,
+            profile=profile_name,
+            model=profile["model"],
+            latency_s=latency,
+            fallback=profile_name != self.profile_name,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            cost_usd=(input_tokens * profile.get("input_cost_per_mtok", 0) + output_tokens * profile.get("output_cost_per_mtok", 0)) / 1e6,
+            **extra,
+        )
+
+    def _invoke(self, llm, profile_name, messages, args, kwargs, budget=None):
+        # CrewAI sets stop words on the agent's LLM, i.e. on this wrapper
+        llm.stop = getattr(self, "stop", None) or getattr(llm, "stop", None)
+        remaining = self.deadline.remaining()
+        timeout = min(limit for limit in (budget, remaining) if limit is not None) if budget or remaining else None
+        hedge_after = _latency_history.p95(self.stage, profile_name) if self.hedge else None
+        if hedge_after is not None and timeout is not None and hedge_after >= timeout:
+            hedge_after = None
+
+        # CrewAI may call from its own threads; the run's span is the parent there
+        parent = tracing.current_traceparent() or self.traceparent
+        with tracing.child(f"llm {self.stage}", parent=parent, profile=profile_name, model=self.profiles[profile_name]["model"]) as span:
+            started = time.perf_counter()
+            try:
+                if timeout is None and hedge_after is None:
+                    result, hedged = llm.call(messages, *args, **kwargs), False
+                else:
+                    result, hedged = race(lambda: llm.call(messages, *args, **kwargs), timeout, hedge_after, self.deadline.cancelled)
+            except FutureTimeout:
+                span.set(timed_out=True)
+                self._record(profile_name, time.perf_counter() - started, messages, "", timed_out=True)
+                if budget is None or timeout < budget:
+                    # The run's deadline, not the call's budget, ran out
+                    self.deadline.cancel()
+                    raise RunCancelled(f"{self.stage}: workflow run exceeded its {self.deadline.seconds}s deadline")
+                raise
+
+            latency = time.perf_counter() - started
+            over_budget = bool(self.latency_budget_s) and latency > self.latency_budget_s
+            span.set(hedged=hedged, over_budget=over_budget)
+            _latency_history.add(self.stage, profile_name, latency)
+            self._record(profile_name, latency, messages, result, over_budget=over_budget, hedged=hedged)
+            return result
+
+    def call(self, messages, *args, **kwargs):
+        # Without a fallback the budget is only reported on: there is nothing better to wait for
+        budget = self.latency_budget_s if self.fallback else None
+        try:
+            return self._invoke(self.primary, self.profile_name, messages, args, kwargs, budget=budget)
+        except FutureTimeout:
+            print(f"⚠️ {self.stage}: {self.profile_name} exceeded {self.latency_budget_s}s, retrying with {self.fallback_name}")
+            return self._invoke(self.fallback, self.fallback_name, messages, args, kwargs)
+
+    def supports_function_calling(self):
+        return self.primary.supports_function_calling()
+
+    def supports_stop_words(self):
+        return self.primary.supports_stop_words()
+
+    def get_context_window_size(self):
+        return self.primary.get_context_window_size()
+
+
+class ModelRouter:
+    """Hands out per-agent LLMs for one workflow run and collects their report."""
+
+    def __init__(self, config, workflow, deadline_s=None, cancelled=None):
+        """`cancelled` is an optional threading.Event the caller can set to stop the run."""
+        self.config = config
+        self.profiles = load_profiles(config)
+        self.report = RoutingReport(workflow, self.profiles)
+        self.deadline = RunDeadline(deadline_s or config["APPOINTMENT_SLO_S"], cancelled)
+        _active_reports[self.report.id] = self.report
+        _install_usage_callback()
+        _latency_history.seed(config.get("ROUTING_REPORT_FILE"))
+        self.traceparent = tracing.current_traceparent()
+
+    def for_agent(self, agent_name, agent_config):
+        """Pops the agent's routing block (Agent(config=...) would reject it) and builds its LLM."""
+        route = agent_config.pop("routing", None) or {}
+        return RoutedLLM(agent_name, route, self.profiles, self.config, self.report, self.deadline, self.traceparent)
+
+    def for_stage(self, stage, **route):
+        return RoutedLLM(stage, route, self.profiles, self.config, self.report, self.deadline, self.traceparent)
+
+    def cancel(self):
+        """Makes every further call of this run raise RunCancelled."""
+        self.deadline.cancel()
+
+    def finish(self, outcome="completed"):
+        """Prints and records the run's calls; `outcome` is "completed", "failed" or "cancelled"."""
+        rows = self.report.summary()
+        if rows:
+            print(f"📊 Model routing ({self.report.workflow}, {outcome}):\n{format_summary(rows)}")
+        try:
+            self.report.write(self.config.get("ROUTING_REPORT_FILE"), outcome)
+        except OSError as e:
+            print("❌ Could not write routing report:", e)
+        return rows
+
+
+def main(argv=None):
+    from utils.config import load_config
+
+    parser = argparse.ArgumentParser(description="Summarize recorded model routing.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    report_parser = sub.add_parser("report", help="Aggregate the routing report file")
+    report_parser.add_argument("--file", help="Defaults to ROUTING_REPORT_FILE")
+    args = parser.parse_args(argv)
+
+    path = args.file or load_config(use_streamlit_secrets=False)["ROUTING_REPORT_FILE"]
+    if not os.path.exists(path):
+        raise SystemExit(f"❌ No routing report at {path}")
+
+    reports, runs = {}, defaultdict(int)
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            run = json.loads(line)
+            runs[run["workflow"]] += 1
+            report = reports.setdefault(run["workflow"], RoutingReport(run["workflow"]))
+            report.calls.extend(run["calls"])
+            report.usage.extend(run.get("usage", []))
+
+    for workflow, report in reports.items():
+        rows = report.summary()
+        print(f"\n{workflow}: {runs[workflow]} runs, ${sum(r['cost_usd'] for r in rows):.4f} estimated, "
+              f"{sum(r['total_s'] for r in rows):.1f}s of LLM time")
+        print(format_summary(rows))
+
+
+if __name__ == "__main__":
+    main()
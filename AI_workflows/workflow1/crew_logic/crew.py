@@ -1,64 +1,92 @@
+import os
+import json
 import yaml
 import warnings
-from PyPDF2 import PdfReader
 
 import pysqlite3
 import sys
 sys.modules["sqlite3"] = sys.modules.pop("pysqlite3")
 
-from crewai import Agent, Task, Crew, LLM
+from crewai import Agent, Task, Crew
 from crewai.tools import BaseTool
 from tavily import TavilyClient
-import tempfile
-import requests
-import streamlit as st
+
+from AI_workflows.retrieval.case_index import get_case_index, format_similar_cases
+from AI_workflows.retrieval.knowledge_store import get_knowledge_store
+from AI_workflows.extraction.medications import normalize_medications
+from AI_workflows.extraction.pdf_text import AttachmentTooLarge, download_to_spool, extract_text, ingestion_limits, open_local
+from AI_workflows.extraction.urgency import classify_urgency
+from AI_workflows.extraction.lab_values import extract_lab_results, format_lab_table
+from AI_workflows.routing import ModelRouter, RunCancelled
+from utils import tracing
+from utils.assets import get_pdf_text, hash_for_url, save_pdf_text
+from utils.config import get_config
+from utils.db import get_db
+from utils.idempotency import hash_attachment
 
 warnings.filterwarnings('ignore')
 
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config')
+PDF_DOWNLOAD_TIMEOUT = (5, 30)  # connect, read
+
 # ----------------------------
 # STEP 1: ENV & API INIT
 # ----------------------------
-def initialize_api():
-    if not st.secrets.get("DEEPSEEK_API"):
-        raise ValueError("❌ DEEPSEEK_API key not found in secrets.toml")
-    if not st.secrets.get("TAVILY_API_KEY"):
-        raise ValueError("❌ TAVILY_API_KEY not found in secrets.toml")
+def initialize_api(config):
+    if not config.get("DEEPSEEK_API"):
+        raise ValueError("❌ DEEPSEEK_API key not found in configuration")
+    if not config.get("TAVILY_API_KEY"):
+        raise ValueError("❌ TAVILY_API_KEY not found in configuration")
 
 # ----------------------------
 # STEP 2: LLM INIT
 # ----------------------------
-def llm_initialization():
-    return LLM(
-        base_url="https://api.deepseek.com",
-        api_key=st.secrets["DEEPSEEK_API"],
-        model="deepseek/deepseek-chat"
-    )
+def llm_initialization(config):
+    # Per-agent models and latency budgets come from the `routing` blocks in agents.yaml
+    return ModelRouter(config, "workflow1")
 
 # ---------------------------
 # STEP 3i: TOOL INIT (PDF)
 # ----------------------------
-def tool_initialization():
+def tool_initialization(config):
     class PDFReaderTool(BaseTool):
         name: str = "PDF Reader"
         description: str = "Reads contents of a PDF and returns the text."
 
         def _run(self, pdf_path: str) -> str:
-        # If it's a URL, download it first
-            if pdf_path.startswith("http"):
-                response = requests.get(pdf_path)
-                if response.status_code != 200:
-                    raise ValueError("Failed to download PDF from Cloudinary")
-
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-                    tmp_file.write(response.content)
-                    tmp_path = tmp_file.name
-            else:
-                tmp_path = pdf_path
-
-            reader = PdfReader(tmp_path)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text()
+            # Appointments without a lab report go on without its text
+            if not pdf_path:
+                return ""
+
+            # A report uploaded before is known by its URL, so its text needs no download
+            db = get_db(config)
+            limits = ingestion_limits(config)
+            caps = (limits["max_pages"], limits["max_chars"])
+            content_hash = hash_for_url(db, pdf_path) if pdf_path.startswith("http") else None
+            text = get_pdf_text(db, content_hash, *caps) if content_hash else None
+            if text is not None:
+                return text
+
+            try:
+                # Streamed into a bounded spool and hashed on the way; local paths are only size-checked
+                if pdf_path.startswith("http"):
+                    with tracing.child("http GET lab_report"):
+                        file, content_hash = download_to_spool(pdf_path, limits["max_bytes"], limits["spool_bytes"], PDF_DOWNLOAD_TIMEOUT)
+                else:
+                    file = open_local(pdf_path, limits["max_bytes"])
+                    content_hash = hash_attachment(file)
+            except AttachmentTooLarge as e:
+                print("❌ Lab report not read:", e)
+                return f"The lab report was not read: {e}. The doctor can open it from the appointment."
+
+            with file:
+                # The same bytes under another URL (or a local path) reuse the text extracted before
+                text = get_pdf_text(db, content_hash, *caps)
+                if text is not None:
+                    return text
+
+                text = extract_text(file, *caps)
+            save_pdf_text(db, content_hash, text, *caps)
             return text
 
     return PDFReaderTool()
@@ -68,14 +96,15 @@ def tool_initialization():
 # STEP 3ii: GENERATE SEARCH QUERY
 # ----------------------------
 def generate_web_search_query(symptoms_text, llm):
+    # Symptoms go last so the instructions form a cacheable prefix
     prompt = f"""
-    You are a medical assistant. Based on the following user-entered symptoms, generate a concise and medically relevant search query to help find potential cures or diagnostic approaches.
-    
-    Symptoms: {symptoms_text}
+    You are a medical assistant. Based on the user-entered symptoms below, generate a concise and medically relevant search query to help find potential cures or diagnostic approaches.
 
     Generate a compact and keyword-based medical search query strictly under 300 characters. Avoid full sentences.
     
     Output just the search query string.
+
+    Symptoms: {symptoms_text}
     """
     response = llm.call(prompt)
     return response.strip().replace('"', '')[:380]
@@ -83,91 +112,303 @@ def generate_web_search_query(symptoms_text, llm):
 # ----------------------------
 # STEP 5: PERFORM WEB SEARCH
 # ----------------------------
-def perform_web_search(query, k=3):
-    client = TavilyClient(api_key=st.secrets["TAVILY_API_KEY"])
+def search_knowledge_store(query, config, k=3):
+    """Local BM25 results if they cover the query well enough, else None."""
+    try:
+        store = get_knowledge_store(config)
+        if store is None:
+            return None
+        hits, coverage = store.search(query, k=k)
+        if hits and coverage >= config["KNOWLEDGE_MIN_COVERAGE"]:
+            return "\n\n".join(passage["text"] for _, passage in hits)
+    except Exception as e:
+        print("❌ Knowledge store lookup failed:", e)
+    return None
+
+def remember_search_results(results, config):
+    # Live results feed the local store so similar queries stay local next time
+    try:
+        store = get_knowledge_store(config)
+        if store is not None:
+            store.add_documents([
+                {"title": res.get("title"), "url": res.get("url"), "text": res["content"], "source": "tavily"}
+                for res in results
+            ])
+    except Exception as e:
+        print("❌ Knowledge store ingest failed:", e)
+
+def perform_web_search(query, config, k=3):
+    local_results = search_knowledge_store(query, config, k=k)
+    if local_results is not None:
+        return local_results
+
+    client = TavilyClient(api_key=config["TAVILY_API_KEY"])
     results = client.search(query, search_depth="advanced", max_results=k)
+    remember_search_results(results['results'], config)
     return "\n\n".join([res['content'] for res in results['results']])
 
 # ----------------------------
-# STEP 4: LOAD AGENTS & TASKS
+# STEP 5ii: SIMILAR VALIDATED CASES
+# ----------------------------
+def find_similar_cases(config, appointment_inputs):
+    try:
+        index = get_case_index(config)
+        return index.query(appointment_inputs, k=config["SIMILAR_CASES_K"]) if index else []
+    except Exception as e:
+        print("❌ Similar-case lookup failed:", e)
+        return []
+
+def is_well_covered(similar_hits, config):
+    # Enough close, doctor-validated matches make the live web search redundant
+    close_hits = [score for score, _ in similar_hits if score >= config["SIMILAR_CASES_MIN_SCORE"]]
+    return len(close_hits) >= config["SIMILAR_CASES_SKIP_SEARCH_COUNT"]
+
 # ----------------------------
-def load_agents_and_tasks_and_create_crew(llm):
+# STEP 5iii: PRE-PARSE MEDICATIONS
+# ----------------------------
+def preparse_medications(medications_text, config):
+    """
+    Returns (structured items, text left for the LLM). Sentences naming a known
+    drug are parsed locally; only the rest goes to the medication task.
+    """
+    if not config["MEDICATION_NORMALIZER"]:
+        return [], medications_text
+    try:
+        items, unrecognized = normalize_medications(medications_text)
+        return items, "\n".join(unrecognized)
+    except Exception as e:
+        print("❌ Medication normalizer failed:", e)
+        return [], medications_text
+
+def format_preparsed_medications(items):
+    return json.dumps(items) if items else "none"
 
+# ----------------------------
+# STEP 5iv: PRE-PARSE LAB VALUES
+# ----------------------------
+def preparse_lab_report(lab_report_extracted_text, config):
+    """
+    Returns (lab table for the report task, text for the lab task or None when
+    every result line parsed, agreeing with the lab's own flags, and the lab
+    task can be skipped).
+    """
+    if not config["LAB_PARSER"]:
+        return "See the laboratory summary above.", lab_report_extracted_text
+    try:
+        rows, unparsed = extract_lab_results(lab_report_extracted_text)
+    except Exception as e:
+        print("❌ Lab value parser failed:", e)
+        return "See the laboratory summary above.", lab_report_extracted_text
+
+    if not rows:
+        return "See the laboratory summary above.", lab_report_extracted_text
+    table = format_lab_table(rows)
+    conflicts = [row["test"] for row in rows if row["flag_conflict"]]
+    if not unparsed and not conflicts:
+        return table, None
+    # Partially parsed or disputed: the lab agent gets the compact table plus what it has to resolve
+    lab_text = table
+    if unparsed:
+        lab_text += "\n\nUnparsed report lines:\n" + "\n".join(unparsed)
+    if conflicts:
+        lab_text += "\n\nThe lab's note and the reference range disagree for: " + ", ".join(conflicts)
+    return table, lab_text
+
+# ----------------------------
+# STEP 5v: FAST PATH (FUSED SUMMARIES)
+# ----------------------------
+SUMMARIZATION_TASKS = [
+    'Symptom_Summarization_Task',
+    'Recent_Medications_Summarization_Task',
+    'Regular_Medications_Summarization_Task',
+    'Laboratory_Diagnosis_Report_Summarization_Task',
+]
+MEDICATION_KEYS = ("medicine_name", "dosage", "frequency")
+FUSED_SUMMARIES_CONTEXT = "\n\nCase summaries (symptoms, medications and lab findings, as JSON): {case_summaries}\n"
+
+def use_fast_path(appointment_data, lab_report, medications, config):
+    """
+    Short, routine cases get their summaries and search query from one fused
+    call. Returns (eligible, reason).
+    """
+    if not config["FAST_PATH"]:
+        return False, "disabled"
+    inputs = appointment_data["inputs"]
+    level = (appointment_data.get("urgency") or {}).get("level") or classify_urgency(inputs)[0]
+    if level != "routine":
+        return False, f"triaged {level}"
+    size = sum(len(text or "") for text in (
+        inputs.get("symptoms"),
+        inputs.get("important_notes"),
+        medications["recent"][1],
+        medications["regular"][1],
+        lab_report[1],
+    ))
+    if size > config["FAST_PATH_MAX_INPUT_CHARS"]:
+        return False, f"{size} input characters"
+    return True, "routine and short"
+
+def render_task_prompt(task_config, inputs):
+    prompt = f"{task_config['description']}\n{task_config['expected_output']}"
+    for key, value in inputs.items():
+        prompt = prompt.replace("{" + key + "}", str(value))
+    return prompt
+
+def _check_medications(items, field):
+    if not isinstance(items, list):
+        raise ValueError(f"{field} is not a list")
+    for item in items:
+        if not isinstance(item, dict) or any(not isinstance(item.get(key), str) for key in MEDICATION_KEYS):
+            raise ValueError(f"{field} item lacks {', '.join(MEDICATION_KEYS)}")
+
+def parse_fused_summaries(raw):
+    """The fused call's JSON, checked against the schema in Fused_Summarization_Task; raises ValueError."""
+    text = (raw or "").strip()
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        raise ValueError("no JSON object in response")
+    summaries = json.loads(text[start:end + 1])  # JSONDecodeError is a ValueError
+
+    if not isinstance(summaries, dict):
+        raise ValueError("response is not an object")
+    symptoms = summaries.get("symptoms")
+    if not isinstance(symptoms, dict) or not symptoms or any(
+        not isinstance(values, list) or not all(isinstance(value, str) for value in values) for values in symptoms.values()
+    ):
+        raise ValueError("symptoms is not a non-empty object of string lists")
+    _check_medications(summaries.get("recent_medications"), "recent_medications")
+    _check_medications(summaries.get("regular_medications"), "regular_medications")
+    lab_findings = summaries.get("lab_findings")
+    if not isinstance(lab_findings, dict) or not all(isinstance(value, str) for value in lab_findings.values()):
+        raise ValueError("lab_findings is not an object of strings")
+    query = summaries.get("search_query")
+    if not isinstance(query, str) or not query.strip():
+        raise ValueError("search_query is missing")
+
+    summaries["search_query"] = query.strip().replace('"', '')[:380]
+    return {key: summaries[key] for key in ("symptoms", "recent_medications", "regular_medications", "lab_findings", "search_query")}
+
+def format_case_summaries(summaries):
+    return json.dumps({key: value for key, value in summaries.items() if key != "search_query"})
+
+def fused_summaries(llm, appointment_data, lab_report, medications):
+    """Summaries and search query from one call, or None when the call or its validation fails."""
+    task_config = load_agent_and_task_configs()['tasks']['Fused_Summarization_Task']
+    prompt = render_task_prompt(task_config, {
+        "symptoms": appointment_data["inputs"].get("symptoms"),
+        "recent_medications": medications["recent"][1] or "none",
+        "regular_medications": medications["regular"][1] or "none",
+        "lab_report_extracted_text": lab_report[1] or "none",
+    })
+    try:
+        return parse_fused_summaries(llm.call(prompt))
+    except ValueError as e:
+        print("❌ Fast path summaries failed validation, running the full crew:", e)
+        return None
+    except Exception as e:
+        # A cancelled run (or one past its deadline) stops every later call, so the full crew could not run either
+        if llm.deadline.cancelled.is_set():
+            raise
+        print("❌ Fast path call failed, running the full crew:", e)
+        return None
+
+# ----------------------------
+# STEP 4: LOAD AGENTS & TASKS
+# ----------------------------
+def load_agent_and_task_configs():
     # Loading Agent and Task YAML files
     files = {
-        'agents': 'AI_workflows/workflow1/config/agents_and_tasks/agents.yaml',
-        'tasks': 'AI_workflows/workflow1/config/agents_and_tasks/tasks.yaml'
+        'agents': os.path.join(CONFIG_DIR, 'agents_and_tasks', 'agents.yaml'),
+        'tasks': os.path.join(CONFIG_DIR, 'agents_and_tasks', 'tasks.yaml')
     }
 
     configs = {}
     for config_type, file_path in files.items():
         with open(file_path, 'r') as file :
             configs[config_type] = yaml.safe_load(file)
+    return configs
+
+def load_agents_and_tasks_and_create_crew(router, skip_tasks=(), fused=False):
+    """
+    skip_tasks: names of medication/lab tasks whose output was fully pre-parsed.
+    fused: the summaries come from the fast path's single call (passed as
+    {case_summaries}), so only the report generator runs.
+    """
+    configs = load_agent_and_task_configs()
 
     ## Assigning Loaded Configurations to specific variables
     agents_config = configs['agents']
     tasks_config = configs['tasks']
+
+    if fused:
+        skip_tasks = SUMMARIZATION_TASKS
+        tasks_config['Intermediate_Diagnostics_Report_Generation_Task']['description'] += FUSED_SUMMARIES_CONTEXT
+
+    # Pops each agent's routing block, which Agent(config=...) does not accept
+    llms = {name: router.for_agent(name, agent_config) for name, agent_config in agents_config.items()}
     
     # --------------------------------- Agent Initialization -----------------------------------------
 
     Symptom_Summarizer_Agent = Agent(
         config=agents_config['Symptom_Summarizer_Agent'],
-        llm=llm,
+        llm=llms['Symptom_Summarizer_Agent'],
         tools=[],
         verbose=True
     )
 
     Medications_Summarizer_Agent = Agent(
         config=agents_config['Medications_Summarizer_Agent'],
-        llm=llm,
+        llm=llms['Medications_Summarizer_Agent'],
         tools=[],
         verbose=True
     )
 
     Laboratory_Diagnosis_Report_Summarizer_Agent = Agent(
         config=agents_config['Laboratory_Diagnosis_Report_Summarizer_Agent'],
-        llm=llm,
+        llm=llms['Laboratory_Diagnosis_Report_Summarizer_Agent'],
         tools=[],
         verbose=True
     )
 
     Intermediate_Diagnostics_Report_Generator_Agent = Agent(
         config=agents_config['Intermediate_Diagnostics_Report_Generator_Agent'],
-        llm=llm,
+        llm=llms['Intermediate_Diagnostics_Report_Generator_Agent'],
         tools=[],
         verbose=True
     )
     
     # --------------------------------- Task Initialization -----------------------------------------
 
-    Symptom_Summarization_Task = Task(
-        config=tasks_config['Symptom_Summarization_Task'],
-        agent=Symptom_Summarizer_Agent,
-        tools=[],
-    )
-
-    Recent_Medications_Summarization_Task = Task(
-        config=tasks_config['Recent_Medications_Summarization_Task'],
-        agent=Medications_Summarizer_Agent,
-        tools=[],
-    )
-
-    Regular_Medications_Summarization_Task = Task(
-        config=tasks_config['Regular_Medications_Summarization_Task'],
-        agent=Medications_Summarizer_Agent,
-        tools=[],
-    )
-
-    Laboratory_Diagnosis_Report_Summarization_Task = Task(
-        config=tasks_config['Laboratory_Diagnosis_Report_Summarization_Task'],
-        agent=Laboratory_Diagnosis_Report_Summarizer_Agent,
-        tools=[],
-    )
+    symptom_tasks = [
+        Task(
+            config=tasks_config['Symptom_Summarization_Task'],
+            agent=Symptom_Summarizer_Agent,
+            tools=[],
+        )
+    ] if 'Symptom_Summarization_Task' not in skip_tasks else []
+
+    medication_tasks = [
+        Task(
+            config=tasks_config[name],
+            agent=Medications_Summarizer_Agent,
+            tools=[],
+        )
+        for name in ['Recent_Medications_Summarization_Task', 'Regular_Medications_Summarization_Task']
+        if name not in skip_tasks
+    ]
+
+    lab_tasks = [
+        Task(
+            config=tasks_config['Laboratory_Diagnosis_Report_Summarization_Task'],
+            agent=Laboratory_Diagnosis_Report_Summarizer_Agent,
+            tools=[],
+        )
+    ] if 'Laboratory_Diagnosis_Report_Summarization_Task' not in skip_tasks else []
 
     Intermediate_Diagnostics_Report_Generation_Task = Task(
         config=tasks_config['Intermediate_Diagnostics_Report_Generation_Task'],
         agent=Intermediate_Diagnostics_Report_Generator_Agent,
-        context=[Symptom_Summarization_Task, Recent_Medications_Summarization_Task, Regular_Medications_Summarization_Task, Laboratory_Diagnosis_Report_Summarization_Task],
+        context=[*symptom_tasks, *medication_tasks, *lab_tasks],
         tools=[],
     )
 
@@ -176,17 +417,16 @@ def load_agents_and_tasks_and_create_crew(llm):
     crew = Crew(
         
         agents=[
-            Symptom_Summarizer_Agent,
-            Medications_Summarizer_Agent,
-            Laboratory_Diagnosis_Report_Summarizer_Agent,
+            *([Symptom_Summarizer_Agent] if symptom_tasks else []),
+            *([Medications_Summarizer_Agent] if medication_tasks else []),
+            *([Laboratory_Diagnosis_Report_Summarizer_Agent] if lab_tasks else []),
             Intermediate_Diagnostics_Report_Generator_Agent,
         ],
         
         tasks=[
-            Symptom_Summarization_Task,
-            Recent_Medications_Summarization_Task,
-            Regular_Medications_Summarization_Task,
-            Laboratory_Diagnosis_Report_Summarization_Task,
+            *symptom_tasks,
+            *medication_tasks,
+            *lab_tasks,
             Intermediate_Diagnostics_Report_Generation_Task
         ],
 
@@ -196,7 +436,7 @@ def load_agents_and_tasks_and_create_crew(llm):
         
         # cache=True,  
         
-        output_log_file="AI_workflows/workflow1/config/outputs/logs.json",  
+        output_log_file=os.path.join(CONFIG_DIR, 'outputs', 'logs.json'),  
     )
 
     return crew
@@ -204,7 +444,12 @@ def load_agents_and_tasks_and_create_crew(llm):
 # ----------------------------
 # STEP 6: MAIN CREWAI RUNNER
 # ----------------------------
-def inputs_initialization(personal_data, appointment_data, lab_report_extracted_text, search_results):
+def inputs_initialization(personal_data, appointment_data, lab_report, search_results, similar_cases, medications, summaries=None):
+    """
+    lab_report: (lab table, text for the lab task) from preparse_lab_report.
+    medications: {"recent": (items, remaining_text), "regular": (items, remaining_text)} from preparse_medications.
+    summaries: the fast path's validated summaries, if it ran.
+    """
     inputs = {
         "name": personal_data.get("name"),
         "dob": personal_data.get("dob"),
@@ -212,10 +457,15 @@ def inputs_initialization(personal_data, appointment_data, lab_report_extracted_
         "weight": personal_data.get("weight"),
         "height": personal_data.get("height"),
         "symptoms": appointment_data["inputs"].get("symptoms"),
-        "recent_medications": appointment_data["inputs"].get("recent_medications"),
-        "regular_medications": appointment_data["inputs"].get("regular_medications"),
-        "lab_report_extracted_text": lab_report_extracted_text,
+        "recent_medications": medications["recent"][1],
+        "regular_medications": medications["regular"][1],
+        "recent_medications_parsed": format_preparsed_medications(medications["recent"][0]),
+        "regular_medications_parsed": format_preparsed_medications(medications["regular"][0]),
+        "lab_report_extracted_text": lab_report[1] or "",
+        "lab_results_table": lab_report[0],
         "websearch_results": search_results,
+        "similar_cases": similar_cases,
+        "case_summaries": format_case_summaries(summaries) if summaries else "",
     }
     return inputs
 
@@ -224,32 +474,79 @@ def inputs_initialization(personal_data, appointment_data, lab_report_extracted_
 # ----------------------------
 # STEP 6: MAIN CREWAI RUNNER
 # ----------------------------
-def run_crew_workflow1(personal_data, appointment_data):
+def run_crew_workflow1(personal_data, appointment_data, config=None):
     """
     This function takes an appointment_data dictionary,
     runs the AI agents, and returns the intermediate report.
+    `config` carries the API keys; it defaults to the process-wide configuration.
     """
+    router, outcome = None, "failed"
     try:
         # Setup
-        initialize_api()
-        llm = llm_initialization()
-
-        pdf_reader_tool = tool_initialization()
-        lab_report_extracted_text = pdf_reader_tool._run(pdf_path=appointment_data["inputs"].get("lab_report"))
-
-        symptoms_text = appointment_data["inputs"].get("symptoms")
-        search_query = generate_web_search_query(symptoms_text, llm)
-        search_results = perform_web_search(search_query)
-
-        crew = load_agents_and_tasks_and_create_crew(llm)
-        inputs = inputs_initialization(personal_data, appointment_data, lab_report_extracted_text, search_results)
+        config = config or get_config()
+        initialize_api(config)
+        router = llm_initialization(config)
+
+        pdf_reader_tool = tool_initialization(config)
+        with tracing.child("lab_report.read"):
+            lab_report_extracted_text = pdf_reader_tool._run(pdf_path=appointment_data["inputs"].get("lab_report"))
+
+        with tracing.child("similar_cases.search"):
+            similar_hits = find_similar_cases(config, appointment_data["inputs"])
+
+        medications = {
+            kind: preparse_medications(appointment_data["inputs"].get(f"{kind}_medications"), config)
+            for kind in ("recent", "regular")
+        }
+        lab_report = preparse_lab_report(lab_report_extracted_text, config)
+
+        # Short, routine cases: summaries and search query in one call, else (or if it fails validation) the full crew
+        summaries = None
+        fast_path, reason = use_fast_path(appointment_data, lab_report, medications, config)
+        if fast_path:
+            with tracing.child("fast_path.summarize") as span:
+                summaries = fused_summaries(router.for_stage("Fused_Summarization", model="fast"), appointment_data, lab_report, medications)
+                span.set(valid=summaries is not None)
+
+        if is_well_covered(similar_hits, config):
+            search_results = "Live web search skipped: this presentation is well covered by the similar validated cases provided."
+        else:
+            symptoms_text = appointment_data["inputs"].get("symptoms")
+            with tracing.child("web_search"):
+                if summaries:
+                    search_query = summaries["search_query"]
+                else:
+                    search_query = generate_web_search_query(symptoms_text, router.for_stage("Web_Search_Query", model="fast"))
+                search_results = perform_web_search(search_query, config)
+
+        if summaries:
+            skip_tasks = SUMMARIZATION_TASKS
+        else:
+            skip_tasks = [
+                f"{kind.capitalize()}_Medications_Summarization_Task"
+                for kind, (_, remaining_text) in medications.items()
+                if config["MEDICATION_NORMALIZER"] and not (remaining_text or "").strip()
+            ]
+            if lab_report[1] is None:
+                skip_tasks.append("Laboratory_Diagnosis_Report_Summarization_Task")
+
+        crew = load_agents_and_tasks_and_create_crew(router, skip_tasks=skip_tasks, fused=summaries is not None)
+        inputs = inputs_initialization(personal_data, appointment_data, lab_report, search_results, format_similar_cases(similar_hits), medications, summaries)
 
         # Run CrewAI workflow
-        result = crew.kickoff(inputs=inputs)
+        with tracing.child("crew.kickoff", skipped_tasks=len(skip_tasks), fast_path=summaries is not None, fast_path_reason=reason):
+            result = crew.kickoff(inputs=inputs)
+        outcome = "completed"
 
         # Post-processing or DB insert can be done here
         return result.raw
 
     except Exception as e:
+        if isinstance(e, RunCancelled):
+            outcome = "cancelled"
         print("❌ CrewAI workflow failed:", e)
         return None
+    finally:
+        # Failed, timed-out and cancelled runs are the tail the routing report is for
+        if router is not None:
+            router.finish(outcome)
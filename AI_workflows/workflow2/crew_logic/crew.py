@@ -1,3 +1,4 @@
+import os
 import yaml
 import warnings
 
@@ -5,37 +6,39 @@ import pysqlite3
 import sys
 sys.modules["sqlite3"] = sys.modules.pop("pysqlite3")
 
-from crewai import Agent, Task, Crew, LLM
-import streamlit as st
+from crewai import Agent, Task, Crew
+
+from AI_workflows.routing import ModelRouter, RunCancelled
+from utils import tracing
+from utils.config import get_config
 
 warnings.filterwarnings('ignore')
 
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config')
+
 # ----------------------------
 # STEP 1: ENV & API INIT
 # ----------------------------
-def initialize_api():
-    if not st.secrets.get("DEEPSEEK_API"):
-        raise ValueError("DEEPSEEK_API key not found in .env file")
+def initialize_api(config):
+    if not config.get("DEEPSEEK_API"):
+        raise ValueError("DEEPSEEK_API key not found in configuration")
 
 # ----------------------------
 # STEP 2: LLM INIT
 # ----------------------------
-def llm_initialization():
-    return LLM(
-        base_url="https://api.deepseek.com",
-        api_key=st.secrets["DEEPSEEK_API"],
-        model="deepseek/deepseek-chat"
-    )
+def llm_initialization(config, cancelled=None):
+    # Per-agent models and latency budgets come from the `routing` blocks in agents.yaml
+    return ModelRouter(config, "workflow2", cancelled=cancelled)
 
 # ----------------------------
 # STEP 3: LOAD AGENTS & TASKS
 # ----------------------------
-def load_agents_and_tasks_and_create_crew(llm):
+def load_agents_and_tasks_and_create_crew(router):
 
     # Loading Agent and Task YAML files
     files = {
-        'agents': 'AI_workflows/workflow2/config/agents_and_tasks/agents.yaml',
-        'tasks': 'AI_workflows/workflow2/config/agents_and_tasks/tasks.yaml'
+        'agents': os.path.join(CONFIG_DIR, 'agents_and_tasks', 'agents.yaml'),
+        'tasks': os.path.join(CONFIG_DIR, 'agents_and_tasks', 'tasks.yaml')
     }
 
     configs = {}
@@ -46,12 +49,15 @@ def load_agents_and_tasks_and_create_crew(llm):
     ## Assigning Loaded Configurations to specific variables
     agents_config = configs['agents']
     tasks_config = configs['tasks']
+
+    # Pops each agent's routing block, which Agent(config=...) does not accept
+    llms = {name: router.for_agent(name, agent_config) for name, agent_config in agents_config.items()}
     
     # --------------------------------- Agent Initialization -----------------------------------------
 
     Prescription_and_final_Diagnostics_Report_Generator_Agent = Agent(
         config=agents_config['Prescription_and_final_Diagnostics_Report_Generator_Agent'],
-        llm=llm,
+        llm=llms['Prescription_and_final_Diagnostics_Report_Generator_Agent'],
         tools=[],
         verbose=True
     )
@@ -82,7 +88,7 @@ def load_agents_and_tasks_and_create_crew(llm):
         
         # cache=True,  
         
-        output_log_file="AI_workflows/workflow2/config/outputs/logs.json",  
+        output_log_file=os.path.join(CONFIG_DIR, 'outputs', 'logs.json'),  
     )
 
     return crew
@@ -101,21 +107,30 @@ def inputs_initialization(intermediate_report, suggestions_for_modifications, do
 # ----------------------------
 # STEP 5: MAIN CREWAI RUNNER
 # ----------------------------
-def run_crew_workflow2(intermediate_report, suggestions_for_modifications, doctor_name):
-    
+def run_crew_workflow2(intermediate_report, suggestions_for_modifications, doctor_name, config=None, cancelled=None):
+    router, outcome = None, "failed"
     try:
         # Setup
-        initialize_api()
-        llm = llm_initialization()
-        crew = load_agents_and_tasks_and_create_crew(llm)
+        config = config or get_config()
+        initialize_api(config)
+        router = llm_initialization(config, cancelled)
+        crew = load_agents_and_tasks_and_create_crew(router)
         inputs = inputs_initialization(intermediate_report, suggestions_for_modifications, doctor_name)
 
         # Run CrewAI workflow
-        result = crew.kickoff(inputs=inputs)
+        with tracing.child("crew.kickoff"):
+            result = crew.kickoff(inputs=inputs)
+        outcome = "completed"
 
         # Post-processing or DB insert can be done here
         return result.raw
 
     except Exception as e:
+        if isinstance(e, RunCancelled):
+            outcome = "cancelled"
         print("❌ CrewAI workflow failed:", e)
         return None
+    finally:
+        # Failed, timed-out and cancelled runs are the tail the routing report is for
+        if router is not None:
+            router.finish(outcome)
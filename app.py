@@ -15,14 +15,11 @@ from signup.signup import signup_page
 from user_dashboard.home import user_dashboard
 from user_dashboard.new_appointment import new_appointment_page
 from doctor_dashboard.home import doctor_dashboard
+from utils import rerun_profiler
+from utils.config import get_config
+from utils.db import get_db, read_policy, routed_db
 
-# Validate session token with database
-def validate_auth_token(token):
-    from pymongo import MongoClient
-    MONGO_URI = st.secrets["MONGO_URI"]
-    client = MongoClient(MONGO_URI)
-    db = client.website_data
-
+def find_session(db, token):
     user = db.users.find_one({"session_token": token})
     if user:
         return {'type': 'user', 'data': user}
@@ -33,6 +30,14 @@ def validate_auth_token(token):
 
     return None
 
+# Validate session token with database
+def validate_auth_token(token):
+    session = find_session(routed_db("auth_token"), token)
+    # A token issued moments ago may not have reached the secondary yet
+    if session is None and read_policy("auth_token") != "primary":
+        session = find_session(get_db(), token)
+    return session
+
 # Main app logic
 def main():
     cookie_controller = CookieController()
@@ -40,12 +45,19 @@ def main():
     # Restore session from cookie if not already authenticated
     session_token = cookie_controller.get("session_token")
     if session_token and not st.session_state.get("authenticated"):
-        user_data = validate_auth_token(session_token)
+        with rerun_profiler.section("restore session"):
+            user_data = validate_auth_token(session_token)
         if user_data:
             st.session_state["authenticated"] = True
             st.session_state["user_type"] = user_data["type"]
             st.session_state["user_data"] = user_data["data"]
 
+    # Login/signup rerun right after setting the cookie, which can drop the component
+    # update; persist it again on the first authenticated render instead of sleeping
+    pending_token = st.session_state.pop("pending_session_cookie", None)
+    if pending_token:
+        cookie_controller.set("session_token", pending_token, max_age=86400)
+
     # Set default page
     if "page" not in st.session_state:
         st.session_state.page = "signup"
@@ -55,20 +67,31 @@ def main():
         if st.session_state["user_type"] == "user":
             # Check for dynamic routing to new appointment
             if st.session_state.get("current_page") == "new_appointment":
+                rerun_profiler.set_page("new_appointment")
                 new_appointment_page(st.session_state["user_data"], cookie_controller)
             else:
+                rerun_profiler.set_page("user_dashboard")
                 user_dashboard(st.session_state["user_data"], cookie_controller)
 
         elif st.session_state["user_type"] == "doctor":
+            rerun_profiler.set_page("doctor_dashboard")
             doctor_dashboard(st.session_state["user_data"], cookie_controller)
 
     # Handle unauthenticated views
     else:
+        rerun_profiler.set_page(st.session_state.page)
         if st.session_state.page == "signup":
             signup_page(cookie_controller)
         elif st.session_state.page == "login":
             login_page(cookie_controller)
 
-# Run the app
+# Run the app, profiling the rerun when RERUN_PROFILING is on
+def run():
+    config = get_config()
+    with rerun_profiler.profile_rerun(config) as profile:
+        main()
+    if profile is not None and rerun_profiler.is_admin(config, st.session_state.get("user_type"), st.session_state.get("user_data")):
+        rerun_profiler.render_panel(profile.record)
+
 if __name__ == "__main__":
-    main()
+    run()
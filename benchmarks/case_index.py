@@ -0,0 +1,99 @@
+"""
+Similar-case index: build and top-k query time on synthetic cases.
+
+Usage (from the project root):
+    python -m benchmarks.case_index --sizes 10000 100000 --dim 1024
+
+Cases are generated from a small clinical vocabulary so the token statistics
+resemble real submissions. Each size is built from scratch in a temporary
+directory, in batches as the sync command would.
+"""
+import argparse
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+from AI_workflows.retrieval.case_index import CaseIndex
+
+SYMPTOMS = [
+    "fever", "dry cough", "productive cough", "shortness of breath", "chest pain radiating to left arm",
+    "sweating", "dizziness", "severe headache", "nausea", "sensitivity to light", "joint pain",
+    "swelling in knees", "morning stiffness", "abdominal pain", "diarrhea", "loss of appetite",
+    "itchy red rash", "frequent urination", "excessive thirst", "weight loss", "sore throat",
+    "runny nose", "body aches", "fatigue", "vomiting", "back pain", "palpitations", "blurred vision",
+]
+MEDICATIONS = [
+    "Paracetamol 500mg twice daily", "Ibuprofen 400mg as needed", "Azithromycin 500mg once daily",
+    "Metformin 500mg twice daily", "Lisinopril 10mg once daily", "Atorvastatin 20mg at night",
+    "Levothyroxine 50mcg every morning", "Cetirizine 10mg at bedtime", "Aspirin 75mg once daily",
+]
+NOTES = [
+    "Known allergy to penicillin", "Family history of diabetes", "Recently traveled abroad",
+    "History of asthma", "Non-smoker", "Occasional alcohol", "Mild hypertension since 2022",
+]
+
+
+def synthetic_case(appointment_id, rng):
+    return {
+        "appointment_id": appointment_id,
+        "inputs": {
+            "symptoms": ", ".join(rng.sample(SYMPTOMS, rng.randint(2, 5))) + f" for {rng.randint(1, 14)} days",
+            "recent_medications": ". ".join(rng.sample(MEDICATIONS, rng.randint(0, 2))),
+            "regular_medications": ". ".join(rng.sample(MEDICATIONS, rng.randint(0, 2))),
+            "important_notes": ". ".join(rng.sample(NOTES, rng.randint(0, 2))),
+        },
+        "final_report": "Probable viral syndrome; supportive care advised.",
+    }
+
+
+def benchmark(size, dim, batch_size, queries, rng):
+    path = tempfile.mkdtemp(prefix="case_index_bench_")
+    try:
+        index = CaseIndex(path, dim=dim)
+        started = time.perf_counter()
+        for start in range(0, size, batch_size):
+            index.add_cases([synthetic_case(i, rng) for i in range(start, min(size, start + batch_size))])
+        build_seconds = time.perf_counter() - started
+
+        # Reopen so queries run against the memory-mapped file, as in production
+        index = CaseIndex(path)
+        latencies = []
+        for _ in range(queries):
+            inputs = synthetic_case(-1, rng)["inputs"]
+            started = time.perf_counter()
+            index.query(inputs, k=3)
+            latencies.append(time.perf_counter() - started)
+
+        latencies.sort()
+        return {
+            "size": size,
+            "build_s": build_seconds,
+            "cases_per_s": size / build_seconds,
+            "query_p50_ms": statistics.median(latencies) * 1000,
+            "query_p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+            "matrix_mb": size * dim * 4 / 1e6,
+        }
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--batch-size", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    print(f"{'cases':>8}{'build s':>10}{'cases/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'matrix MB':>11}")
+    for size in args.sizes:
+        r = benchmark(size, args.dim, args.batch_size, args.queries, rng)
+        print(f"{r['size']:>8}{r['build_s']:>10.1f}{r['cases_per_s']:>10.0f}{r['query_p50_ms']:>9.2f}{r['query_p95_ms']:>9.2f}{r['matrix_mb']:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
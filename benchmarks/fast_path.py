@@ -0,0 +1,181 @@
+"""
+workflow1 fast path: LLM calls and latency per case, full crew vs fused summaries,
+against local stub endpoints.
+
+Usage (from the project root):
+    python -m benchmarks.fast_path --fast-latency 0.4 --strong-latency 1.5
+    python -m benchmarks.fast_path --invalid-rate 0.5     # fused responses failing validation
+
+Cases are the `test runs/*` fixtures (inputs.txt blocks and the lab report PDF)
+plus a short synthetic one. For each case the calls a workflow1 run makes are
+replayed in order with the real prompts, routes and selection logic:
+    full   the web search query, every summarizer task not skipped by the
+           deterministic parsers, then the report generator
+    auto   use_fast_path() decides; an eligible case makes the fused call and the
+           report generator, and falls back to the full sequence when the fused
+           response fails validation (--invalid-rate of them)
+"""
+import argparse
+import copy
+import glob
+import json
+import os
+import random
+import time
+
+from AI_workflows.extraction.pdf_text import extract_text
+from AI_workflows.routing import ModelRouter
+from AI_workflows.workflow1.crew_logic.crew import (
+    FUSED_SUMMARIES_CONTEXT,
+    format_case_summaries,
+    fused_summaries,
+    load_agent_and_task_configs,
+    preparse_lab_report,
+    preparse_medications,
+    render_task_prompt,
+    use_fast_path,
+)
+from benchmarks.model_routing import stub_models_file
+from benchmarks.stub_llm_server import start_stub_server
+from utils.config import load_config
+
+FIXTURES_GLOB = os.path.join("test runs", "*", "inputs.txt")
+TASK_AGENTS = {
+    "Symptom_Summarization_Task": "Symptom_Summarizer_Agent",
+    "Recent_Medications_Summarization_Task": "Medications_Summarizer_Agent",
+    "Regular_Medications_Summarization_Task": "Medications_Summarizer_Agent",
+    "Laboratory_Diagnosis_Report_Summarization_Task": "Laboratory_Diagnosis_Report_Summarizer_Agent",
+}
+GENERATOR_TASK = "Intermediate_Diagnostics_Report_Generation_Task"
+GENERATOR_AGENT = "Intermediate_Diagnostics_Report_Generator_Agent"
+SHORT_CASE = {
+    "symptoms": "Runny nose and sneezing for three days, mild sore throat, no fever",
+    "recent_medications": "Cetirizine 10mg once at night",
+    "regular_medications": "",
+    "important_notes": "No known allergies.",
+}
+FUSED_RESPONSE = json.dumps({
+    "symptoms": {"respiratory": ["sore throat", "dry cough"], "general_symptoms": ["mild fever", "body aches"]},
+    "recent_medications": [{"medicine_name": "Paracetamol", "dosage": "500mg", "frequency": "twice daily"}],
+    "regular_medications": [],
+    "lab_findings": {"CRP": "6.2 mg/L, slightly raised"},
+    "search_query": "viral upper respiratory infection mild fever sore throat raised CRP management",
+})
+
+
+def load_cases(config):
+    cases = []
+    for path in sorted(glob.glob(FIXTURES_GLOB)):
+        folder = os.path.dirname(path)
+        with open(path, encoding="utf-8") as file:
+            blocks = [block.strip() for block in file.read().split("\n\n") if block.strip()]
+        inputs = dict(zip(("symptoms", "recent_medications", "regular_medications", "important_notes"), blocks))
+        lab_text = ""
+        for pdf_path in sorted(glob.glob(os.path.join(folder, "*.pdf"))):
+            if "lab" in os.path.basename(pdf_path).lower():
+                with open(pdf_path, "rb") as file:
+                    lab_text = extract_text(file, config["LAB_REPORT_MAX_PAGES"], config["LAB_REPORT_MAX_CHARS"])
+                break
+        cases.append((os.path.basename(folder), inputs, lab_text))
+    cases.append(("short", SHORT_CASE, ""))
+    return cases
+
+
+def prepare(inputs, lab_text, config):
+    medications = {kind: preparse_medications(inputs.get(f"{kind}_medications"), config) for kind in ("recent", "regular")}
+    lab_report = preparse_lab_report(lab_text, config)
+    prompt_inputs = dict(
+        inputs,
+        name="Benchmark Patient", age=40, weight=70, height=170,
+        recent_medications=medications["recent"][1],
+        regular_medications=medications["regular"][1],
+        recent_medications_parsed=json.dumps(medications["recent"][0]),
+        regular_medications_parsed=json.dumps(medications["regular"][0]),
+        lab_report_extracted_text=lab_report[1] or "",
+        lab_results_table=lab_report[0],
+        websearch_results="Supportive care is advised for uncomplicated viral infections.",
+        similar_cases="No similar validated cases found.",
+        case_summaries="",
+    )
+    return medications, lab_report, prompt_inputs
+
+
+def run_full(router, llms, tasks_config, medications, lab_report, prompt_inputs, config):
+    router.for_stage("Web_Search_Query", model="fast").call(f"Symptoms: {prompt_inputs['symptoms']}")
+    skipped = {
+        f"{kind.capitalize()}_Medications_Summarization_Task"
+        for kind, (_, remaining_text) in medications.items()
+        if config["MEDICATION_NORMALIZER"] and not (remaining_text or "").strip()
+    }
+    if lab_report[1] is None:
+        skipped.add("Laboratory_Diagnosis_Report_Summarization_Task")
+    for task, agent in TASK_AGENTS.items():
+        if task not in skipped:
+            llms[agent].call(render_task_prompt(tasks_config[task], prompt_inputs))
+    llms[GENERATOR_AGENT].call(render_task_prompt(tasks_config[GENERATOR_TASK], prompt_inputs))
+
+
+def run_case(mode, inputs, lab_text, configs, config):
+    medications, lab_report, prompt_inputs = prepare(inputs, lab_text, config)
+    router = ModelRouter(config, "workflow1")
+    llms = {name: router.for_agent(name, copy.deepcopy(agent_config)) for name, agent_config in configs["agents"].items()}
+    tasks_config = configs["tasks"]
+
+    started = time.perf_counter()
+    path = "full"
+    if mode == "auto" and use_fast_path({"inputs": inputs}, lab_report, medications, config)[0]:
+        summaries = fused_summaries(router.for_stage("Fused_Summarization", model="fast"), {"inputs": inputs}, lab_report, medications)
+        if summaries:
+            path = "fast"
+            generator_task = dict(tasks_config[GENERATOR_TASK])
+            generator_task["description"] += FUSED_SUMMARIES_CONTEXT
+            fused_inputs = dict(prompt_inputs, case_summaries=format_case_summaries(summaries))
+            llms[GENERATOR_AGENT].call(render_task_prompt(generator_task, fused_inputs))
+        else:
+            path = "fallback"
+    if path != "fast":
+        run_full(router, llms, tasks_config, medications, lab_report, prompt_inputs, config)
+    return path, len(router.report.calls), time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fast-latency", type=float, default=0.4)
+    parser.add_argument("--strong-latency", type=float, default=1.5)
+    parser.add_argument("--invalid-rate", type=float, default=0.0, help="Share of fused responses that fail validation")
+    parser.add_argument("--max-input-chars", type=int, help="Overrides FAST_PATH_MAX_INPUT_CHARS")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(0)
+
+    def respond(model, prompt):
+        if '"search_query"' not in prompt:
+            return None
+        return "Sorry, here is a summary of the case." if rng.random() < args.invalid_rate else FUSED_RESPONSE
+
+    server, base_url = start_stub_server({"stub-fast": args.fast_latency, "stub-strong": args.strong_latency}, respond=respond)
+    models_file = stub_models_file(base_url)
+    overrides = {"LLM_MODELS_FILE": models_file, "ROUTING_REPORT_FILE": "", "TRACE_FILE": "", "STUB_API_KEY": "stub", "LLM_HEDGING": False}
+    if args.max_input_chars is not None:
+        overrides["FAST_PATH_MAX_INPUT_CHARS"] = args.max_input_chars
+    config = load_config(overrides, use_streamlit_secrets=False)
+    configs = load_agent_and_task_configs()
+    try:
+        totals = {"full": [0, 0.0], "auto": [0, 0.0]}
+        print(f"{'case':<10}{'mode':<7}{'path':<10}{'calls':>6}{'seconds':>9}")
+        for name, inputs, lab_text in load_cases(config):
+            for mode in totals:
+                path, calls, seconds = run_case(mode, inputs, lab_text, configs, config)
+                totals[mode][0] += calls
+                totals[mode][1] += seconds
+                print(f"{name:<10}{mode:<7}{path:<10}{calls:>6}{seconds:>9.2f}")
+        print()
+        for mode, (calls, seconds) in totals.items():
+            print(f"{mode:<7}{calls:>4} calls {seconds:>8.2f}s")
+    finally:
+        server.shutdown()
+        os.remove(models_file)
+
+
+if __name__ == "__main__":
+    main()
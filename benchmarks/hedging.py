@@ -0,0 +1,72 @@
+"""
+Hedged LLM requests: call latency percentiles with and without hedging against
+a stub endpoint with a heavy tail.
+
+Usage (from the project root):
+    python -m benchmarks.hedging --latency 0.2 --tail-probability 0.05 --tail-latency 3 --calls 300
+
+Each mode makes --calls sequential calls to one stage on the `fast` profile.
+The first HEDGE_MIN_SAMPLES calls of the hedged run only build the latency
+history and are left out of its percentiles. "extra" is the share of calls
+that sent a duplicate request, i.e. the added provider load.
+"""
+import argparse
+import random
+
+from AI_workflows import routing
+from AI_workflows.routing import HEDGE_MIN_SAMPLES, LatencyHistory, ModelRouter
+from benchmarks.model_routing import stub_models_file
+from benchmarks.stub_llm_server import start_stub_server
+from utils.config import load_config
+
+PROMPT = [{"role": "user", "content": "Summarize: fever, dry cough and body aches for two days."}]
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[max(0, int(len(values) * pct / 100) - 1)]
+
+
+def run(config, calls, warmup):
+    routing._latency_history = LatencyHistory()
+    router = ModelRouter(config, "hedging-benchmark")
+    llm = router.for_stage("Hedging_Benchmark", model="fast")
+    for _ in range(calls):
+        llm.call(PROMPT)
+    measured = router.report.calls[warmup:]
+    latencies = [call["latency_s"] for call in measured]
+    return {
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "max": max(latencies),
+        "extra_pct": 100 * sum(bool(call.get("hedged")) for call in measured) / len(measured),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--tail-probability", type=float, default=0.05)
+    parser.add_argument("--tail-latency", type=float, default=3.0)
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    server, base_url = start_stub_server(
+        {"stub-fast": args.latency}, tails={"stub-fast": (args.tail_probability, args.tail_latency)}
+    )
+    overrides = {"LLM_MODELS_FILE": stub_models_file(base_url), "ROUTING_REPORT_FILE": "", "STUB_API_KEY": "stub"}
+    try:
+        print(f"{'mode':<10}{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}{'max s':>8}{'extra':>8}")
+        for mode, hedging in (("plain", False), ("hedged", True)):
+            config = load_config(dict(overrides, LLM_HEDGING=hedging), use_streamlit_secrets=False)
+            r = run(config, args.calls + HEDGE_MIN_SAMPLES, HEDGE_MIN_SAMPLES)
+            print(f"{mode:<10}{r['p50']:>8.2f}{r['p95']:>8.2f}{r['p99']:>8.2f}{r['max']:>8.2f}{r['extra_pct']:>7.1f}%")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
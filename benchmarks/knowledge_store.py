@@ -0,0 +1,106 @@
+"""
+Local knowledge store: bulk ingest rate, BM25 query latency and local hit rate.
+
+Usage (from the project root):
+    python -m benchmarks.knowledge_store --sizes 10000 100000
+
+Passages are generated from the same clinical vocabulary as the case-index
+benchmark. Each size is ingested from scratch in a temporary directory, in
+segments of --batch-size documents, then queried before and after compaction.
+"""
+import argparse
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+from AI_workflows.retrieval.knowledge_store import KnowledgeStore
+from benchmarks.case_index import MEDICATIONS, NOTES, SYMPTOMS
+
+TOPICS = [
+    "diagnosis", "treatment", "differential diagnosis", "first line therapy", "home care",
+    "when to see a doctor", "red flags", "lab tests", "prognosis", "complications",
+]
+
+
+def synthetic_document(rng):
+    symptoms = rng.sample(SYMPTOMS, rng.randint(2, 4))
+    sentences = [
+        f"{', '.join(symptoms).capitalize()}: {rng.choice(TOPICS)}.",
+        f"Commonly considered: {rng.choice(MEDICATIONS)}.",
+        f"{rng.choice(NOTES)} may change the {rng.choice(TOPICS)}.",
+    ]
+    return {"title": " ".join(symptoms), "text": " ".join(sentences) + f" Ref {rng.random():.12f}", "source": "synthetic"}
+
+
+def synthetic_query(rng):
+    return " ".join(rng.sample(SYMPTOMS, 2)) + " " + rng.choice(TOPICS)
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000
+
+
+def run_queries(store, queries, min_coverage):
+    latencies, local = [], 0
+    for query in queries:
+        started = time.perf_counter()
+        hits, coverage = store.search(query, k=3)
+        latencies.append(time.perf_counter() - started)
+        local += bool(hits) and coverage >= min_coverage
+    latencies.sort()
+    return statistics.median(latencies) * 1000, percentile(latencies, 0.95), local / len(queries)
+
+
+def benchmark(size, batch_size, queries, min_coverage, rng):
+    path = tempfile.mkdtemp(prefix="knowledge_store_bench_")
+    try:
+        store = KnowledgeStore(path)
+        started = time.perf_counter()
+        for start in range(0, size, batch_size):
+            store.add_documents([synthetic_document(rng) for _ in range(min(batch_size, size - start))])
+        ingest_seconds = time.perf_counter() - started
+
+        query_set = [synthetic_query(rng) for _ in range(queries)]
+        store = KnowledgeStore(path)
+        segmented = run_queries(store, query_set, min_coverage)
+        segments = len(store.segments)
+
+        started = time.perf_counter()
+        store.compact()
+        compact_seconds = time.perf_counter() - started
+        compacted = run_queries(store, query_set, min_coverage)
+        return {
+            "size": size,
+            "docs_per_s": size / ingest_seconds,
+            "segments": segments,
+            "segmented": segmented,
+            "compact_s": compact_seconds,
+            "compacted": compacted,
+        }
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--min-coverage", type=float, default=0.8)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    print(f"{'docs':>8}{'docs/s':>9}{'segs':>6}{'p50 ms':>9}{'p95 ms':>9}{'compact s':>11}{'p50 ms':>9}{'p95 ms':>9}{'local %':>9}")
+    for size in args.sizes:
+        r = benchmark(size, args.batch_size, args.queries, args.min_coverage, rng)
+        s_p50, s_p95, _ = r["segmented"]
+        c_p50, c_p95, local = r["compacted"]
+        print(f"{r['size']:>8}{r['docs_per_s']:>9.0f}{r['segments']:>6}{s_p50:>9.2f}{s_p95:>9.2f}"
+              f"{r['compact_s']:>11.1f}{c_p50:>9.2f}{c_p95:>9.2f}{local * 100:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
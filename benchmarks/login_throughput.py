@@ -0,0 +1,95 @@
+"""
+Login throughput: inline bcrypt.checkpw on request threads vs the bounded hashing pool.
+
+Usage (from the project root):
+    python -m benchmarks.login_throughput --users 32 --logins 4 --rounds 12 --pool-size 2
+
+Each simulated user is a thread (like a Streamlit script thread) performing
+`--logins` password checks. Besides logins/sec and latency percentiles, the
+benchmark measures how responsive the request threads stay: a probe thread
+records how late its 10 ms ticks fire while hashing runs.
+"""
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from utils import passwords
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def probe_scheduling_delay(stop_event, delays):
+    while not stop_event.is_set():
+        started = time.perf_counter()
+        time.sleep(0.01)
+        delays.append(time.perf_counter() - started - 0.01)
+
+
+def run(mode, password, password_hash, users, logins, config):
+    latencies = []
+    lock = threading.Lock()
+
+    def login():
+        for _ in range(logins):
+            started = time.perf_counter()
+            if mode == "inline":
+                ok = bcrypt.checkpw(password, password_hash)
+            else:
+                ok, _ = passwords.verify_password(password.decode(), password_hash, config)
+            assert ok
+            with lock:
+                latencies.append(time.perf_counter() - started)
+
+    stop_event, delays = threading.Event(), []
+    probe = threading.Thread(target=probe_scheduling_delay, args=(stop_event, delays), daemon=True)
+    probe.start()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as executor:
+        for _ in range(users):
+            executor.submit(login)
+    elapsed = time.perf_counter() - started
+
+    stop_event.set()
+    probe.join()
+
+    return {
+        "mode": mode,
+        "logins_per_sec": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "probe_delay_p95_ms": percentile(delays, 95) * 1000 if delays else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=32, help="Concurrent simulated users")
+    parser.add_argument("--logins", type=int, default=4, help="Logins per user")
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost factor")
+    parser.add_argument("--pool-size", type=int, default=2, help="Hashing processes")
+    args = parser.parse_args(argv)
+
+    config = {"BCRYPT_ROUNDS": args.rounds, "BCRYPT_POOL_SIZE": args.pool_size}
+    password = b"correct horse battery staple"
+    password_hash = bcrypt.hashpw(password, bcrypt.gensalt(args.rounds))
+
+    # Start the pool before timing so process spawn isn't counted
+    passwords.get_hashing_pool(config).submit(passwords._check, password, password_hash).result()
+
+    print(f"{args.users} users x {args.logins} logins, cost {args.rounds}, pool size {args.pool_size}")
+    print(f"{'mode':<8}{'logins/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'probe p95 ms':>14}")
+    for mode in ("inline", "pool"):
+        result = run(mode, password, password_hash, args.users, args.logins, config)
+        print(f"{result['mode']:<8}{result['logins_per_sec']:>10.1f}{result['p50_ms']:>10.0f}{result['p95_ms']:>10.0f}{result['probe_delay_p95_ms']:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Medication normalizer: field accuracy and latency on the `test runs` fixtures.
+
+Usage (from the project root):
+    python -m benchmarks.medication_normalizer --repeat 1000
+
+Each `test runs/*/inputs.txt` holds blank-line separated blocks: symptoms, recent
+medications, regular medications, notes. The medication blocks are normalized
+and compared field by field (medicine_name, dosage, frequency) against the
+hand-labelled expectations below. The fixtures are all well-formed current
+medications, so a separate set of sentences naming drugs the patient does not
+take (stopped, negated, past use, allergy) checks that none of them is parsed
+as a current medication.
+"""
+import argparse
+import glob
+import os
+import statistics
+import time
+
+from AI_workflows.extraction.medications import MedicationNormalizer
+
+FIXTURES_GLOB = os.path.join("test runs", "*", "inputs.txt")
+
+# Hand-labelled expectations, keyed by the generic name the patient's entry refers to
+EXPECTED = {
+    "Paracetamol": [("500mg", "twice daily"), ("500mg", "twice daily after meals")],
+    "Ibuprofen": [("400mg", "as needed")],
+    "Azithromycin": [("500mg", "once daily for 3 days")],
+    "Dextromethorphan": [("10ml", "once daily at night")],
+    "Amoxicillin": [("500mg", "three times daily for 5 days")],
+    "Cetirizine": [("10mg", "once daily at night")],
+    "Diphenhydramine (Benadryl)": [("10ml", "once daily at night")],
+    "Vitamin C": [("unknown", "once daily")],
+    "Metformin": [("500mg", "twice daily")],
+    "Lisinopril": [("10mg", "once daily")],
+    "Atorvastatin": [("20mg", "once daily at night"), ("10mg", "once daily at night")],
+    "Levothyroxine": [("50mcg", "once daily in the morning")],
+    "Insulin glargine": [("10 units", "once daily at night")],
+    "Aspirin": [("75mg", "once daily")],
+    "Telmisartan": [("40mg", "once daily")],
+    "Vitamin D3": [("60,000 IU", "once weekly")],
+}
+EXPECTED_COUNT = {"test1": 12, "test2": 12, "test3": 7}
+
+# (text, medicine names that may be parsed from it); any other parsed name is a false medication
+CAVEAT_CASES = [
+    ("Stopped aspirin last week", []),
+    ("Allergic to penicillin, no other medicines", []),
+    ("Not taking metformin anymore", []),
+    ("Penicillin allergy (rash)", []),
+    ("Never took insulin", []),
+    ("I don't take ibuprofen", []),
+    ("Used to take omeprazole 20mg every morning", []),
+    ("Took amoxicillin previously, caused rash", []),
+    ("Metformin 500mg twice daily, no longer on glimepiride", []),
+    ("Aspirin 75mg daily. Held clopidogrel before surgery.", ["Aspirin"]),
+    ("Discontinued lisinopril due to cough; now telmisartan 40mg once daily", ["Telmisartan"]),
+]
+
+
+def load_fixtures():
+    fixtures = []
+    for path in sorted(glob.glob(FIXTURES_GLOB)):
+        with open(path, encoding="utf-8") as file:
+            blocks = [block.strip() for block in file.read().split("\n\n") if block.strip()]
+        fixtures.append((os.path.basename(os.path.dirname(path)), blocks[1:3]))
+    return fixtures
+
+
+def score(fixtures, normalizer):
+    fields = correct = unrecognized = 0
+    for name, blocks in fixtures:
+        items = []
+        for block in blocks:
+            parsed, leftover = normalizer.normalize(block)
+            items += parsed
+            unrecognized += len(leftover)
+        for item in items:
+            fields += 3
+            expected = EXPECTED.get(item["medicine_name"], [])
+            correct += bool(expected)
+            correct += max((sum(a == b for a, b in zip(e, (item["dosage"], item["frequency"]))) for e in expected), default=0)
+        # Missed medications count as three wrong fields each
+        fields += 3 * max(0, EXPECTED_COUNT.get(name, 0) - len(items))
+    return correct / fields if fields else 0.0, unrecognized
+
+
+def score_caveats(normalizer):
+    """Number of CAVEAT_CASES parsed without a false medication."""
+    passed = 0
+    for text, allowed in CAVEAT_CASES:
+        items, _ = normalizer.normalize(text)
+        passed += all(item["medicine_name"] in allowed for item in items)
+    return passed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    normalizer = MedicationNormalizer()
+    build_ms = (time.perf_counter() - started) * 1000
+
+    fixtures = load_fixtures()
+    accuracy, unrecognized = score(fixtures, normalizer)
+    caveats_passed = score_caveats(normalizer)
+
+    blocks = [block for _, fixture_blocks in fixtures for block in fixture_blocks]
+    latencies = []
+    for _ in range(args.repeat):
+        for block in blocks:
+            started = time.perf_counter()
+            normalizer.normalize(block)
+            latencies.append(time.perf_counter() - started)
+    latencies.sort()
+
+    print(f"dictionary terms:     {len(normalizer.patterns)} (automaton built in {build_ms:.1f} ms)")
+    print(f"fixtures:             {len(fixtures)} ({len(blocks)} medication fields)")
+    print(f"field accuracy:       {accuracy * 100:.1f}%")
+    print(f"unrecognized phrases: {unrecognized} (would go to the LLM)")
+    print(f"not-taken sentences:  {caveats_passed}/{len(CAVEAT_CASES)} without a false medication")
+    print(f"latency per field:    p50 {statistics.median(latencies) * 1e6:.0f} µs, p95 {latencies[int(len(latencies) * 0.95)] * 1e6:.0f} µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Model routing: per-stage latency and cost split, and budget-triggered fallback,
+against local stub endpoints.
+
+Usage (from the project root):
+    python -m benchmarks.model_routing --fast-latency 0.2 --strong-latency 1.5 --runs 5
+    python -m benchmarks.model_routing --strong-latency 4 --budget-scale 0.02   # forces fallbacks
+
+Routes come from the workflows' agents.yaml; budgets are multiplied by
+--budget-scale so the stub latencies can stay short. Each run makes one call
+per agent, the way a workflow run does when no task is skipped.
+"""
+import argparse
+import copy
+import os
+import tempfile
+import time
+
+import yaml
+
+from AI_workflows.routing import ModelRouter, format_summary, load_profiles
+from benchmarks.stub_llm_server import start_stub_server
+from utils.config import load_config
+
+AGENT_FILES = {
+    "workflow1": os.path.join("AI_workflows", "workflow1", "config", "agents_and_tasks", "agents.yaml"),
+    "workflow2": os.path.join("AI_workflows", "workflow2", "config", "agents_and_tasks", "agents.yaml"),
+}
+PROMPT = [{"role": "user", "content": "Patient reports fever, dry cough and body aches for two days. " * 40}]
+
+
+def stub_models_file(base_url):
+    """Copies the real profiles, pointing every profile at the stub under its own model name."""
+    profiles = load_profiles({})
+    for name, profile in profiles.items():
+        profile.update(model=f"openai/stub-{name}", base_url=base_url, api_key="STUB_API_KEY")
+    handle, path = tempfile.mkstemp(suffix=".yaml", prefix="stub_models_")
+    with os.fdopen(handle, "w") as file:
+        yaml.safe_dump(profiles, file)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fast-latency", type=float, default=0.2)
+    parser.add_argument("--strong-latency", type=float, default=1.5)
+    parser.add_argument("--budget-scale", type=float, default=1.0)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    server, base_url = start_stub_server({"stub-fast": args.fast_latency, "stub-strong": args.strong_latency})
+    models_file = stub_models_file(base_url)
+    config = load_config({"LLM_MODELS_FILE": models_file, "ROUTING_REPORT_FILE": "", "STUB_API_KEY": "stub"}, use_streamlit_secrets=False)
+    try:
+        for workflow, path in AGENT_FILES.items():
+            with open(path) as file:
+                agents_config = yaml.safe_load(file)
+            for agent_config in agents_config.values():
+                route = agent_config.get("routing")
+                if route and route.get("latency_budget_s"):
+                    route["latency_budget_s"] *= args.budget_scale
+
+            router = ModelRouter(config, workflow)
+            llms = {name: router.for_agent(name, copy.deepcopy(agent_config)) for name, agent_config in agents_config.items()}
+            started = time.perf_counter()
+            for _ in range(args.runs):
+                for llm in llms.values():
+                    llm.call(PROMPT)
+            elapsed = time.perf_counter() - started
+
+            rows = router.report.summary()
+            print(f"\n{workflow}: {args.runs} runs in {elapsed:.1f}s ({elapsed / args.runs:.2f}s per run), "
+                  f"${sum(row['cost_usd'] for row in rows):.5f} estimated")
+            print(format_summary(rows))
+    finally:
+        server.shutdown()
+        os.remove(models_file)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Lab report ingestion: peak memory per concurrent job, buffered vs streamed.
+
+Usage (from the project root):
+    python -m benchmarks.pdf_ingestion --pages 300 --scan-kb 200 --jobs 4
+
+A synthetic report (--pages pages of lab result lines, each with a --scan-kb
+noise image standing in for a scanned page) is served over a local HTTP
+server. Each mode then reads it in --jobs concurrent threads inside a fresh
+process; the RSS it gains while reading (sampled every 5 ms) is reported per job:
+    buffered   response.content, a temporary file, PdfReader(path), every page
+    streamed   AI_workflows.extraction.pdf_text with the configured limits
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from fpdf import FPDF
+
+from utils.config import DEFAULTS
+
+TESTS = ["Hemoglobin", "WBC Count", "Platelet Count", "Fasting Glucose", "Creatinine", "TSH", "ALT", "AST"]
+
+
+# ----------------------------
+# FIXTURE
+# ----------------------------
+def noise_png(path, size_kb):
+    # Random grey pixels barely compress, so the page image keeps roughly size_kb bytes
+    side = max(8, int((size_kb * 1024) ** 0.5))
+    rows = b"".join(b"\x00" + os.urandom(side) for _ in range(side))
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    with open(path, "wb") as file:
+        file.write(b"\x89PNG\r\n\x1a\n")
+        file.write(chunk(b"IHDR", struct.pack(">IIBBBBB", side, side, 8, 0, 0, 0, 0)))
+        file.write(chunk(b"IDAT", zlib.compress(rows, 1)))
+        file.write(chunk(b"IEND", b""))
+
+
+def build_report(path, pages, scan_kb, workdir):
+    rng = random.Random(0)
+    pdf = FPDF()
+    pdf.set_font("Arial", size=10)
+    for number in range(pages):
+        pdf.add_page()
+        if scan_kb:
+            image_path = os.path.join(workdir, f"scan_{number}.png")
+            noise_png(image_path, scan_kb)
+            pdf.image(image_path, x=10, y=150, w=80)
+        for test in TESTS * 4:
+            pdf.cell(0, 3.5, f"{test}: {rng.uniform(1, 300):.1f} mg/dL (Normal)", ln=1)
+    pdf.output(path, "F")
+
+
+def serve(directory):
+    handler = partial(QuietHandler, directory=directory)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+# ----------------------------
+# MODES
+# ----------------------------
+def read_buffered(url, limits):
+    # The reader as it was before streaming: whole body, temporary file, every page
+    import requests
+    from PyPDF2 import PdfReader
+
+    response = requests.get(url, timeout=(5, 30))
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
+        tmp_file.write(response.content)
+        tmp_path = tmp_file.name
+    try:
+        text = ""
+        for page in PdfReader(tmp_path).pages:
+            text += page.extract_text()
+        return text
+    finally:
+        os.remove(tmp_path)
+
+
+def read_streamed(url, limits):
+    from AI_workflows.extraction.pdf_text import download_to_spool, extract_text
+
+    file, _ = download_to_spool(url, limits["max_bytes"], limits["spool_bytes"], (5, 30))
+    with file:
+        return extract_text(file, limits["max_pages"], limits["max_chars"])
+
+
+MODES = {"buffered": read_buffered, "streamed": read_streamed}
+
+
+def rss_mb():
+    with open("/proc/self/statm") as file:
+        return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+def sample_peak(stop, peak, interval=0.005):
+    # ru_maxrss would include the import-time peak, so RSS is sampled during the run instead
+    while not stop.wait(interval):
+        peak[0] = max(peak[0], rss_mb())
+
+
+def run_mode(mode, url, jobs, limits, results):
+    # Runs in a fresh process so each mode's peak RSS starts from the same baseline
+    import requests  # noqa: F401  (imported up front so module loading is not counted)
+    import PyPDF2  # noqa: F401
+    import AI_workflows.extraction.pdf_text  # noqa: F401
+
+    baseline = rss_mb()
+    peak, stop = [baseline], threading.Event()
+    sampler = threading.Thread(target=sample_peak, args=(stop, peak), daemon=True)
+    sampler.start()
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            texts = list(pool.map(lambda _: MODES[mode](url, limits), range(jobs)))
+    except Exception as e:
+        results.put({"mode": mode, "error": str(e)})
+        return
+    finally:
+        stop.set()
+        sampler.join()
+    results.put({
+        "mode": mode,
+        "seconds": time.perf_counter() - started,
+        "peak_mb": peak[0] - baseline,
+        "chars": len(texts[0]),
+    })
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--scan-kb", type=int, default=200, help="Noise image per page (0 for text only)")
+    parser.add_argument("--jobs", type=int, default=4, help="Concurrent reads per mode")
+    parser.add_argument("--max-mb", type=int, default=DEFAULTS["ATTACHMENT_MAX_MB"] * 10, help="Size cap for the streamed mode")
+    parser.add_argument("--max-pages", type=int, default=DEFAULTS["LAB_REPORT_MAX_PAGES"])
+    parser.add_argument("--max-chars", type=int, default=DEFAULTS["LAB_REPORT_MAX_CHARS"])
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="pdf_ingestion_")
+    server = None
+    try:
+        report_path = os.path.join(workdir, "report.pdf")
+        build_report(report_path, args.pages, args.scan_kb, workdir)
+        size_mb = os.path.getsize(report_path) / 2 ** 20
+        print(f"Report: {args.pages} pages, {size_mb:.1f} MB, {args.jobs} concurrent jobs per mode")
+
+        server = serve(workdir)
+        url = f"http://127.0.0.1:{server.server_address[1]}/report.pdf"
+        limits = {
+            "max_bytes": args.max_mb * 2 ** 20,
+            "spool_bytes": DEFAULTS["PDF_SPOOL_MB"] * 2 ** 20,
+            "max_pages": args.max_pages,
+            "max_chars": args.max_chars,
+        }
+
+        context = multiprocessing.get_context("spawn")
+        print(f"{'mode':<10} {'seconds':>8} {'peak MB':>8} {'MB/job':>8} {'chars':>8}")
+        for mode in MODES:
+            results = context.Queue()
+            process = context.Process(target=run_mode, args=(mode, url, args.jobs, limits, results))
+            process.start()
+            row = results.get()
+            process.join()
+            if "error" in row:
+                print(f"{mode:<10} ❌ {row['error']}")
+                continue
+            print(f"{row['mode']:<10} {row['seconds']:>8.2f} {row['peak_mb']:>8.1f} {row['peak_mb'] / args.jobs:>8.1f} {row['chars']:>8}")
+    finally:
+        if server is not None:
+            server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
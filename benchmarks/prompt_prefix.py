@@ -0,0 +1,103 @@
+"""
+Prompt prefix reuse: how much of each task prompt is byte-identical across
+appointments, i.e. cacheable by the provider's prefix cache.
+
+Usage (from the project root):
+    python -m benchmarks.prompt_prefix                      # current tasks.yaml
+    python -m benchmarks.prompt_prefix --compare-rev HEAD~1 # side by side with an older layout
+
+Each task's description + expected output is rendered for two different
+patients; the shared leading text is what a second appointment can reuse.
+Tokens are estimated at ~4 characters each; providers cache in 64-token units.
+"""
+import argparse
+import os
+import subprocess
+
+import yaml
+
+TASK_FILES = [
+    os.path.join("AI_workflows", "workflow1", "config", "agents_and_tasks", "tasks.yaml"),
+    os.path.join("AI_workflows", "workflow2", "config", "agents_and_tasks", "tasks.yaml"),
+]
+CACHE_UNIT_TOKENS = 64
+
+PATIENTS = [
+    {
+        "name": "Rahul Sharma", "age": 41, "weight": 78, "height": 172,
+        "symptoms": "Mild fever for the past two days, sore throat, slight body aches, and occasional dry cough",
+        "recent_medications": "Paracetamol 500mg twice a day after meals. Cough syrup (Benadryl) 10ml at night.",
+        "regular_medications": "Metformin 500mg twice daily. Telmisartan 40mg once daily.",
+        "lab_report_extracted_text": "Hemoglobin: 13.4 g/dL (Normal)\nCRP: 6.2 mg/L (Slightly Raised)",
+        "lab_results_table": "Test | Value | Unit | Reference | Flag | Lab note\nCRP | 6.2 | mg/L | 0-5 | !high | Slightly Raised",
+        "recent_medications_parsed": '[{"medicine_name": "Paracetamol", "dosage": "500mg", "frequency": "twice daily after meals"}]',
+        "regular_medications_parsed": '[{"medicine_name": "Metformin", "dosage": "500mg", "frequency": "twice daily"}]',
+        "websearch_results": "Viral upper respiratory infections are self-limiting; supportive care is advised.",
+        "similar_cases": "No similar validated cases found.",
+        "intermediate_report": "Probable viral URTI with mildly raised CRP; type 2 diabetes on metformin.",
+        "suggestions_for_modifications": "",
+        "doctor_name": "Sneha Kapoor",
+    },
+    {
+        "name": "Anita Rao", "age": 29, "weight": 61, "height": 160,
+        "symptoms": "Severe headache, nausea, and sensitivity to light",
+        "recent_medications": "Ibuprofen 400mg as needed for pain.",
+        "regular_medications": "None",
+        "lab_report_extracted_text": "Hemoglobin: 11.2 g/dL (Low)",
+        "lab_results_table": "Test | Value | Unit | Reference | Flag | Lab note\nHemoglobin | 11.2 | g/dL | 12-17.5 | !low | Low",
+        "recent_medications_parsed": '[{"medicine_name": "Ibuprofen", "dosage": "400mg", "frequency": "as needed"}]',
+        "regular_medications_parsed": "none",
+        "websearch_results": "Migraine with photophobia; triptans and NSAIDs are first-line options.",
+        "similar_cases": "Case #812 (similarity 0.71)\nPresenting symptoms: severe headache, nausea",
+        "intermediate_report": "Findings consistent with migraine without aura; mild anemia.",
+        "suggestions_for_modifications": "",
+        "doctor_name": "Sneha Kapoor",
+    },
+]
+
+
+def load_tasks(path, rev=None):
+    if rev:
+        text = subprocess.run(["git", "show", f"{rev}:{path.replace(os.sep, '/')}"], capture_output=True, text=True, check=True).stdout
+    else:
+        with open(path, encoding="utf-8") as file:
+            text = file.read()
+    return yaml.safe_load(text)
+
+
+def render(task, inputs):
+    prompt = f"{task['description']}\n{task['expected_output']}"
+    for key, value in inputs.items():
+        prompt = prompt.replace("{" + key + "}", str(value))
+    return prompt
+
+
+def prefix_stats(tasks):
+    rows = []
+    for name, task in tasks.items():
+        first, second = (render(task, patient) for patient in PATIENTS)
+        shared_tokens = len(os.path.commonprefix([first, second])) // 4
+        total_tokens = len(first) // 4
+        rows.append((name, shared_tokens // CACHE_UNIT_TOKENS * CACHE_UNIT_TOKENS, shared_tokens, total_tokens))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--compare-rev", help="git revision whose tasks.yaml to compare against")
+    args = parser.parse_args(argv)
+
+    header = f"{'task':<60}{'tokens':>8}{'shared':>8}{'cacheable':>11}"
+    print(header + (f"{'shared @' + args.compare_rev:>20}" if args.compare_rev else ""))
+    for path in TASK_FILES:
+        current = prefix_stats(load_tasks(path))
+        before = {name: shared for name, _, shared, _ in prefix_stats(load_tasks(path, args.compare_rev))} if args.compare_rev else {}
+        for name, cacheable, shared, total in current:
+            line = f"{name:<60}{total:>8}{shared:>8}{cacheable:>11}"
+            if args.compare_rev:
+                line += f"{before.get(name, 0):>20}"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Read routing against a replica set: which member serves each query site, and
+whether a session's reads move to the primary after it writes.
+
+Usage (from the project root):
+    python -m benchmarks.read_routing --start-local            # throwaway 3-member set, needs mongod on PATH
+    python -m benchmarks.read_routing --uri "mongodb://host1,host2,host3/?replicaSet=rs0"
+
+--start-local launches three mongod processes on --port and the next two ports
+with temporary data directories, initiates them as a replica set and removes
+them on exit. The check writes to a scratch database, never to website_data's
+collections: for every site in utils.db.READ_SITES it runs a find through
+routed_db() before and after note_write() and reports the member that served it.
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+from pymongo import MongoClient, monitoring
+
+from utils import db as db_utils
+from utils.config import DEFAULTS
+
+SCRATCH_DB = "read_routing_check"
+
+
+class ServedBy(monitoring.CommandListener):
+    """Remembers the member address each `find` was sent to."""
+
+    def __init__(self):
+        self.last = None
+
+    def started(self, event):
+        if event.command_name == "find":
+            self.last = event.connection_id
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def start_local_replica_set(port, members=3):
+    root = tempfile.mkdtemp(prefix="rogimitra-rs-")
+    processes = []
+    for i in range(members):
+        dbpath = os.path.join(root, f"member{i}")
+        os.makedirs(dbpath)
+        processes.append(subprocess.Popen(
+            ["mongod", "--replSet", "rs0", "--port", str(port + i), "--dbpath", dbpath, "--bind_ip", "127.0.0.1"],
+            stdout=subprocess.DEVNULL,
+        ))
+    time.sleep(2)
+    admin = MongoClient(f"mongodb://127.0.0.1:{port}/?directConnection=true").admin
+    admin.command("replSetInitiate", {
+        "_id": "rs0",
+        # Only the first member can be elected, so the primary is known
+        "members": [{"_id": i, "host": f"127.0.0.1:{port + i}", "priority": 1 if i == 0 else 0} for i in range(members)],
+    })
+    uri = ",".join(f"127.0.0.1:{port + i}" for i in range(members))
+    return f"mongodb://{uri}/?replicaSet=rs0", processes, root
+
+
+def wait_for_secondaries(client, members, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        states = [member["stateStr"] for member in client.admin.command("replSetGetStatus")["members"]]
+        if states.count("PRIMARY") == 1 and states.count("SECONDARY") == members - 1:
+            return
+        time.sleep(0.5)
+    raise TimeoutError("❌ Replica set did not elect a primary with healthy secondaries in time")
+
+
+def check(uri, members):
+    listener = ServedBy()
+    client = MongoClient(uri, event_listeners=[listener])
+    wait_for_secondaries(client, members)
+    primary = client.primary
+
+    # routed_db() resolves the client through get_client(); register ours under the URI
+    db_utils._clients[uri] = client
+    config = dict(DEFAULTS, MONGO_URI=uri)
+    client[SCRATCH_DB].probe.insert_one({"written_at": time.time()})
+    time.sleep(1)  # let the secondaries apply it
+
+    ok = True
+    session_state = {}
+    for label in ("before write", "after write"):
+        if label == "after write":
+            db_utils.note_write(session_state, config)
+        for site, key in db_utils.READ_SITES.items():
+            routed = db_utils.routed_db(site, session_state, config)
+            routed.client[SCRATCH_DB].get_collection("probe", read_preference=routed.read_preference).find_one()
+            expected = db_utils.read_policy(site, session_state, config)
+            on_primary = listener.last == primary
+            matches = on_primary == (expected == "primary")
+            ok &= matches
+            print(f"{'✅' if matches else '❌'} {label:<13}{site:<16}{config[key]:<11}-> "
+                  f"{'%s:%s' % listener.last} ({'primary' if on_primary else 'secondary'})")
+
+    client[SCRATCH_DB].probe.drop()
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--uri", help="Replica set connection string")
+    target.add_argument("--start-local", action="store_true", help="Start a throwaway local replica set")
+    parser.add_argument("--port", type=int, default=27117, help="First member's port with --start-local")
+    parser.add_argument("--members", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    processes, root = [], None
+    uri = args.uri
+    try:
+        if args.start_local:
+            uri, processes, root = start_local_replica_set(args.port, args.members)
+        ok = check(uri, args.members)
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+        if root:
+            shutil.rmtree(root, ignore_errors=True)
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
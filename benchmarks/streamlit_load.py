@@ -0,0 +1,467 @@
+"""
+Synthetic multi-user load on the Streamlit app, to find how many concurrent
+patients and doctors one process serves before reruns queue up.
+
+Usage (from the project root):
+    python -m benchmarks.streamlit_load --patients 50 --doctors 5
+    python -m benchmarks.streamlit_load --patients 200 --doctors 20 --think 2 --llm-latency 5
+    python -m benchmarks.streamlit_load --mongo-uri mongodb://127.0.0.1:27017   # throwaway mongod only
+
+Every virtual user is a browser session driving the real app.py through
+Streamlit's AppTest, in its own thread, like the server's script threads:
+    patient: signup -> (new session) open_login -> login -> open_form -> submit -> back -> history
+    doctor:  open_login -> login -> review (reload the pending list) -> finalize, until the cases are done
+A finalize click on a case another doctor took first counts as finalize_lost.
+Users start spread over --ramp seconds and wait a random 0.5-1.5x --think
+seconds between actions. Each action is one click and the reruns it triggers.
+
+Everything outside the process is replaced by a local stand-in: MongoDB by
+mongomock (or a local server with --mongo-uri; data goes to its website_data
+database), the Cloudinary upload by a --upload-latency sleep, the workflow1 and
+workflow2 crews by --llm-latency sleeps, and the browser cookie by a per-session
+jar. The workflow engine, bcrypt pool, report store and PDF rendering are the
+real ones. The run happens in a temporary working directory, so PDFs and traces
+never land in the checkout.
+
+Reported: count, errors and latency percentiles per action; process CPU
+(100% = one core; bcrypt runs in the hashing pool's own processes) and resident
+memory, sampled every 0.5 s; and how many submitted cases were completed.
+"""
+import argparse
+import contextlib
+import logging
+import os
+import random
+import secrets
+import sys
+import tempfile
+import threading
+import time
+import types
+from collections import defaultdict
+
+from bson import ObjectId
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOAD_MONGO_URI = "mongodb://load-test"
+STUB_KEYS = ["DEEPSEEK_API", "TAVILY_API_KEY", "CLOUDINARY_CLOUD_NAME", "CLOUDINARY_API_KEY", "CLOUDINARY_API_SECRET"]
+PASSWORD = "load-test-password"
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+# === Stand-ins ===
+class CookieJar:
+    """Stands in for streamlit_cookies_controller.CookieController: cookies live in the session's own state."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def get(self, name):
+        import streamlit as st
+        return st.session_state.get("_load_test_cookies", {}).get(name)
+
+    def set(self, name, value, max_age=None):
+        import streamlit as st
+        st.session_state.setdefault("_load_test_cookies", {})[name] = value
+
+
+def install_stand_ins(args):
+    """Must run before the app's modules read the configuration."""
+    for key in STUB_KEYS:
+        os.environ.setdefault(key, "load-test")
+    os.environ["MONGO_URI"] = args.mongo_uri or LOAD_MONGO_URI
+    os.environ["WORKFLOW_SERVICE_URL"] = ""
+    os.environ["CASE_INDEX_DIR"] = ""
+    os.environ["TRACE_FILE"] = ""
+    if args.bcrypt_rounds:
+        os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+
+    if not args.mongo_uri:
+        import mongomock
+        from utils import db as db_utils
+        db_utils._clients[LOAD_MONGO_URI] = mongomock.MongoClient()
+
+    cookies = types.ModuleType("streamlit_cookies_controller")
+    cookies.CookieController = CookieJar
+    sys.modules[cookies.__name__] = cookies
+
+    import cloudinary.uploader
+
+    def upload(file, folder="", resource_type="auto", **kwargs):
+        time.sleep(args.upload_latency)
+        return {"secure_url": f"https://load-test.invalid/{folder}/{secrets.token_hex(4)}"}
+    cloudinary.uploader.upload = upload
+
+    def run_crew_workflow1(personal_data, appointment_data, config=None):
+        time.sleep(args.llm_latency)
+        return f"## Intermediate Report\n\n**Patient:** {personal_data['name']}\n\n**Symptoms:** {appointment_data['inputs']['symptoms']}"
+
+    def run_crew_workflow2(intermediate_report, suggestions_for_modifications, doctor_name, config=None, cancelled=None):
+        time.sleep(args.llm_latency)
+        return f"{intermediate_report}\n\n## Final Report\n\n{suggestions_for_modifications}\n\nValidated by Dr. {doctor_name}"
+
+    for package, name, fn in (("workflow1", "run_crew_workflow1", run_crew_workflow1), ("workflow2", "run_crew_workflow2", run_crew_workflow2)):
+        module = types.ModuleType(f"AI_workflows.{package}.crew_logic.crew")
+        setattr(module, name, fn)
+        sys.modules[module.__name__] = module
+
+    patch_apptest()
+
+
+def patch_apptest():
+    """
+    AppTest is written for one test at a time. It sets up and tears down
+    process-wide state around every run, which breaks the other sessions'
+    reruns when hundreds run side by side; here that state is set up once and
+    shared, as in the server:
+    - the script cache (each rerun would otherwise compile app.py again,
+      concurrently, which CPython 3.11's compiler does not survive)
+    - the mock Runtime, the "appTest" config option and the pages-directory
+      flag (cleared or reset after each run; widgets then lose their state)
+    - the component registry (discovered again for every new session)
+    The caller also waits for a rerun on its shutdown event instead of
+    polling every millisecond, which would be most of the process's CPU.
+    """
+    from streamlit import config as streamlit_config
+    from streamlit.components.v2.component_manager import BidiComponentManager
+    from streamlit.runtime.pages_manager import PagesManager
+    from streamlit.runtime.runtime import Runtime
+    from streamlit.runtime.scriptrunner import ScriptRunnerEvent
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test, local_script_runner
+
+    shared_cache = ScriptCache()
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: shared_cache
+
+    streamlit_config.set_option("global.appTest", True)
+    app_test.patch_config_options = lambda options: contextlib.nullcontext()
+
+    # AppTest resets the flag on the class it imported; the runner reads the original
+    PagesManager.uses_pages_directory = os.path.isdir(os.path.join(PROJECT_ROOT, "pages"))
+    app_test.PagesManager = type("SessionPagesManager", (PagesManager,), {})
+
+    components = BidiComponentManager()
+    components.discover_and_register_components(start_file_watching=False)
+    original_init = app_test.AppTest.__init__
+
+    def init(self, *args, **kwargs):
+        original_init(self, *args, **kwargs)
+        self._bidi_component_manager = components
+    app_test.AppTest.__init__ = init
+
+    last = {}
+
+    def instance(cls):
+        runtime = cls._instance or last.get("runtime")
+        if runtime is None:
+            raise RuntimeError("Runtime hasn't been created!")
+        return runtime
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: cls._instance is not None or "runtime" in last)
+
+    def wait_for_rerun(runner, timeout=3):
+        if Runtime._instance is not None:
+            last["runtime"] = Runtime._instance
+        finished = threading.Event()
+
+        def on_event(sender, event, **kwargs):
+            if event == ScriptRunnerEvent.SHUTDOWN:
+                finished.set()
+
+        runner.on_event.connect(on_event, weak=False)
+        try:
+            if not runner.script_stopped() and not finished.wait(timeout):
+                runner.request_stop()
+                runner.join()
+                raise RuntimeError(f"AppTest script run timed out after {timeout}(s)")
+        finally:
+            runner.on_event.disconnect(on_event)
+
+    local_script_runner.require_widgets_deltas = wait_for_rerun
+
+
+# === Virtual users ===
+class ActionFailed(Exception):
+    pass
+
+
+class Session:
+    """One browser session on app.py; records the latency of every action."""
+
+    def __init__(self, results, timeout):
+        from streamlit.testing.v1 import AppTest
+        self.app = AppTest.from_file(os.path.join(PROJECT_ROOT, "app.py"), default_timeout=timeout)
+        self.results = results
+
+    def act(self, name, interact=None, outcome=None):
+        """Runs one action; `outcome(app)` may rename it once it is done, e.g. by what it achieved."""
+        started = time.perf_counter()
+        try:
+            if interact is not None:
+                interact(self.app)
+            self.app.run()
+        except Exception as e:
+            self.results.fail(name, e)
+            raise ActionFailed(name) from e
+        elapsed = time.perf_counter() - started
+        self.results.add(outcome(self.app) if outcome else name, elapsed)
+        if self.app.exception:
+            self.results.fail(name, self.app.exception[0].message)
+            raise ActionFailed(name)
+
+
+class Form:
+    """The widgets of one st.form on the current page."""
+
+    def __init__(self, app, form_id):
+        self.app = app
+        self.form_id = form_id
+
+    def __getattr__(self, kind):
+        widgets = [widget for widget in getattr(self.app, kind) if widget.form_id == self.form_id]
+        if not widgets:
+            raise ActionFailed(f"no {kind} in form {self.form_id}")
+        return widgets
+
+
+def button(app, label):
+    for candidate in app.button:
+        if candidate.label == label:
+            return candidate
+    raise ActionFailed(f"no button {label}")
+
+
+def think(args):
+    time.sleep(args.think * random.uniform(0.5, 1.5))
+
+
+def patient(index, args, results):
+    username = f"{args.tag}-patient-{index}"
+
+    def fill_signup(app):
+        form = Form(app, "user_signup_form")
+        form.text_input[0].input(username)
+        form.text_input[1].input(f"Patient {index}")
+        form.text_input[2].input(PASSWORD)
+        form.text_input[3].input(PASSWORD)
+        form.number_input[0].set_value(70.0)
+        form.number_input[1].set_value(172.0)
+        form.button[0].click()
+
+    def fill_login(app):
+        form = Form(app, "user_login_form")
+        form.text_input[0].input(username)
+        form.text_input[1].input(PASSWORD)
+        form.button[0].click()
+
+    def fill_appointment(n):
+        def fill(app):
+            form = Form(app, "new_appointment_form")
+            form.text_area[0].input(f"Fever and headache for {n + 2} days, case {index}.{n}")
+            form.text_area[1].input("Paracetamol 500 mg")
+            form.text_area[2].input("None")
+            form.text_area[3].input("No known allergies")
+            form.button[0].click()
+        return fill
+
+    try:
+        signup = Session(results, args.timeout)
+        signup.act("open_app")
+        think(args)
+        signup.act("signup", fill_signup)
+
+        # A returning visitor: a new browser session logs in
+        session = Session(results, args.timeout)
+        session.act("open_app")
+        session.act("open_login", lambda app: button(app, "🔐 Login").click())
+        think(args)
+        session.act("login", fill_login)
+        for n in range(args.appointments):
+            think(args)
+            session.act("open_form", lambda app: button(app, "➕ Start a New Appointment").click())
+            think(args)
+            session.act("submit", fill_appointment(n))
+            results.submitted()
+            think(args)
+            session.act("back", lambda app: button(app, "🔙 Back to Dashboard").click())
+            think(args)
+            session.act("history", lambda app: button(app, "📂 View Past Appointments").click())
+    except ActionFailed:
+        pass
+
+
+def doctor(index, args, results, stop, db):
+    username = f"{args.tag}-doctor-{index}"
+    name = f"Load Doctor {index}"
+
+    def finalized_by_me(appointment_id):
+        # A case another doctor finalized first is gone from the page the click reruns
+        def outcome(app):
+            appt = db.new_appointments.find_one({"_id": appointment_id}, {"doctor_name": 1})
+            return "finalize" if appt and appt.get("doctor_name") == name else "finalize_lost"
+        return outcome
+
+    def fill_login(app):
+        form = Form(app, "doctor_login_form")
+        form.text_input[0].input(username)
+        form.text_input[1].input(PASSWORD)
+        form.button[0].click()
+
+    try:
+        session = Session(results, args.timeout)
+        session.act("open_app")
+        session.act("open_login", lambda app: button(app, "🔐 Login").click())
+        think(args)
+        session.act("login", fill_login)
+        while not stop.is_set():
+            think(args)
+            session.act("review")
+            finalize = [candidate for candidate in session.app.button if (candidate.key or "").startswith("submit_")]
+            if finalize:
+                think(args)
+                choice = random.choice(finalize)
+                session.act("finalize", lambda app: choice.click(), finalized_by_me(ObjectId(choice.key[len("submit_"):])))
+    except ActionFailed:
+        pass
+
+
+# === Measurement ===
+class Results:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.first_errors = {}
+        self.submissions = 0
+        self.lock = threading.Lock()
+
+    def add(self, action, seconds):
+        with self.lock:
+            self.latencies[action].append(seconds)
+
+    def fail(self, action, error):
+        with self.lock:
+            self.errors[action] += 1
+            self.first_errors.setdefault(action, str(error).splitlines()[0][:200])
+
+    def submitted(self):
+        with self.lock:
+            self.submissions += 1
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def monitor(stop, samples, interval=0.5):
+    """Process CPU % (of one core) and RSS, every `interval` seconds."""
+    last_wall, last_cpu = time.perf_counter(), time.process_time()
+    while not stop.wait(interval):
+        wall, cpu = time.perf_counter(), time.process_time()
+        samples.append((100 * (cpu - last_cpu) / (wall - last_wall), rss_mb()))
+        last_wall, last_cpu = wall, cpu
+
+
+def open_cases(db):
+    return db.new_appointments.count_documents({"status": {"$ne": "completed"}})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--patients", type=int, default=50, help="Concurrent patient sessions")
+    parser.add_argument("--doctors", type=int, default=5, help="Concurrent doctor sessions")
+    parser.add_argument("--appointments", type=int, default=1, help="Appointments each patient submits")
+    parser.add_argument("--think", type=float, default=1.0, help="Mean seconds between a user's actions")
+    parser.add_argument("--ramp", type=float, default=10.0, help="Seconds over which sessions start")
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="Seconds each stubbed crew run takes")
+    parser.add_argument("--upload-latency", type=float, default=0.1, help="Seconds each stubbed Cloudinary upload takes")
+    parser.add_argument("--bcrypt-rounds", type=int, help="Defaults to BCRYPT_ROUNDS")
+    parser.add_argument("--mongo-uri", help="Local MongoDB to use instead of mongomock")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds before a rerun counts as hung")
+    parser.add_argument("--drain-timeout", type=float, default=120.0, help="Seconds doctors keep reviewing after the patients finish")
+    args = parser.parse_args(argv)
+    args.tag = f"load-{secrets.token_hex(3)}"
+
+    # Relative paths (PDFs, data/) resolve inside a scratch directory, not the checkout
+    sys.path.insert(0, PROJECT_ROOT)
+    workdir = tempfile.TemporaryDirectory(prefix="rogimitra-load-")
+    os.chdir(workdir.name)
+    install_stand_ins(args)
+
+    from services.workflow_service import get_local_service
+    from utils.config import get_config
+    from utils.db import get_db
+    from utils.passwords import hash_password
+
+    config = get_config()
+    # Session threads touch Streamlit outside a script run; that warning is expected here
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").setLevel(logging.ERROR)
+    db = get_db(config)
+    password_hash = hash_password(PASSWORD, config)
+    db.doctors.insert_many([
+        {"username": f"{args.tag}-doctor-{i}", "name": f"Load Doctor {i}", "password_hash": password_hash, "dp": None}
+        for i in range(args.doctors)
+    ])
+
+    results, samples = Results(), []
+    stop_monitor, stop_doctors = threading.Event(), threading.Event()
+    threading.Thread(target=monitor, args=(stop_monitor, samples), name="load_monitor", daemon=True).start()
+    rss_start = rss_mb()
+
+    users = [threading.Thread(target=doctor, args=(i, args, results, stop_doctors, db), name=f"doctor-{i}", daemon=True) for i in range(args.doctors)]
+    patients = [threading.Thread(target=patient, args=(i, args, results), name=f"patient-{i}", daemon=True) for i in range(args.patients)]
+    print(f"{args.patients} patients x {args.appointments} appointments, {args.doctors} doctors, "
+          f"{'MongoDB at ' + args.mongo_uri if args.mongo_uri else 'mongomock'}, LLM stub {args.llm_latency:.1f} s, think {args.think:.1f} s")
+
+    started = time.perf_counter()
+    order = users + patients
+    random.shuffle(order)
+    for thread in order:
+        thread.start()
+        time.sleep(args.ramp / max(len(order), 1))
+    for thread in patients:
+        thread.join()
+
+    drain_deadline = time.perf_counter() + args.drain_timeout
+    while open_cases(db) and time.perf_counter() < drain_deadline:
+        time.sleep(1)
+    stop_doctors.set()
+    for thread in users:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    stop_monitor.set()
+    # Workflows still queued would write into the scratch directory as it is removed
+    get_local_service(config).shutdown(wait=True, cancel_futures=True)
+
+    print(f"\n{'action':<15}{'count':>7}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for action in sorted(set(results.latencies) | set(results.errors)):
+        latencies = results.latencies[action] or [0.0]
+        print(f"{action:<15}{len(results.latencies[action]):>7}{results.errors[action]:>8}"
+              f"{percentile(latencies, 50) * 1000:>9.0f}{percentile(latencies, 95) * 1000:>9.0f}"
+              f"{percentile(latencies, 99) * 1000:>9.0f}{max(latencies) * 1000:>9.0f}")
+    for action, error in results.first_errors.items():
+        print(f"❌ {action}: {error}")
+
+    actions = sum(len(latencies) for latencies in results.latencies.values())
+    cpu = [sample[0] for sample in samples] or [0.0]
+    rss = [sample[1] for sample in samples if sample[1] is not None]
+    print(f"\n{actions} actions in {elapsed:.1f} s ({actions / elapsed:.1f}/s)")
+    print(f"CPU: mean {sum(cpu) / len(cpu):.0f}%, p95 {percentile(cpu, 95):.0f}%, peak {max(cpu):.0f}% of one core")
+    if rss:
+        print(f"RSS: {rss_start:.0f} MB at start, peak {max(rss):.0f} MB")
+    completed = db.new_appointments.count_documents({"status": "completed"})
+    still_open = open_cases(db)
+    print(f"Cases: {results.submissions} submitted, {completed} completed, {still_open} still open"
+          f"{' (workflow backlog: raise --drain-timeout or WORKFLOW_WORKERS)' if still_open else ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Local OpenAI-compatible chat endpoint with per-model latency, for exercising
+model routing and latency budgets without calling a real provider. Usage
+includes DeepSeek-style prefix-cache counters: the longest prefix shared with
+an earlier prompt, in 64-token units, is reported as cache hits. A tail can be
+added per model: with the given probability a request takes the tail latency.
+
+Usage (from the project root):
+    python -m benchmarks.stub_llm_server --port 8055 --latency stub-fast=0.2 --latency stub-strong=3
+    python -m benchmarks.stub_llm_server --latency stub-fast=0.2 --tail stub-fast=0.05:4
+
+Point a profile in a models file at it, e.g.
+    model: openai/stub-fast
+    base_url: http://127.0.0.1:8055/v1
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+
+CACHE_UNIT_TOKENS = 64
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def cached_prefix_tokens(prompt, previous_prompts):
+    shared = max((len(os.path.commonprefix([prompt, earlier])) for earlier in previous_prompts), default=0)
+    return shared // 4 // CACHE_UNIT_TOKENS * CACHE_UNIT_TOKENS
+
+
+def make_handler(latencies, default_latency, tails=None, respond=None):
+    previous_prompts = deque(maxlen=256)
+    lock = threading.Lock()
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self.send_error(404)
+                return
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            model = body.get("model", "")
+            tail_probability, tail_latency = (tails or {}).get(model, (0, 0))
+            time.sleep(tail_latency if random.random() < tail_probability else latencies.get(model, default_latency))
+
+            prompt = "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+            with lock:
+                cached = cached_prefix_tokens(prompt, previous_prompts)
+                previous_prompts.append(prompt)
+            prompt_tokens = max(len(prompt) // 4, cached)
+            content = (respond(model, prompt) if respond else None) or f"Thought: I now know the final answer\nFinal Answer: stub response from {model}"
+            payload = json.dumps({
+                "id": "stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": len(content) // 4,
+                    "total_tokens": prompt_tokens + len(content) // 4,
+                    "prompt_cache_hit_tokens": cached,
+                    "prompt_cache_miss_tokens": prompt_tokens - cached,
+                },
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    return StubHandler
+
+
+def start_stub_server(latencies, port=0, default_latency=0.1, tails=None, respond=None):
+    """
+    Starts the server in a daemon thread; returns (server, base_url).
+    `tails` maps a model to (probability, latency) of a slow response.
+    `respond(model, prompt)` may return the content to answer with (None for the default).
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(latencies, default_latency, tails, respond))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8055)
+    parser.add_argument("--latency", action="append", default=[], metavar="MODEL=SECONDS")
+    parser.add_argument("--tail", action="append", default=[], metavar="MODEL=PROBABILITY:SECONDS")
+    parser.add_argument("--default-latency", type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    latencies = {model: float(seconds) for model, seconds in (item.split("=", 1) for item in args.latency)}
+    tails = {model: tuple(map(float, tail.split(":", 1))) for model, tail in (item.split("=", 1) for item in args.tail)}
+    server, url = start_stub_server(latencies, args.port, args.default_latency, tails)
+    print(f"Stub LLM endpoint at {url} (latencies: {latencies or 'default'})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Urgency triage: level accuracy and latency on hand-labelled examples.
+
+Usage (from the project root):
+    python -m benchmarks.urgency_triage --repeat 1000
+
+Each example is a symptoms text and the level it must be triaged at. They
+cover current red flags, negations and clause boundaries, relatives'
+conditions and the patient's own past episodes, which must not count.
+Mismatches are listed and make the command exit with status 1.
+"""
+import argparse
+import statistics
+import sys
+import time
+
+from AI_workflows.extraction.urgency import classify_urgency
+
+# (symptoms, expected level)
+CASES = [
+    # Current red flags
+    ("Chest pain radiating to left arm, sweating", "emergency"),
+    ("Sudden weakness on the left side and slurred speech", "emergency"),
+    ("Had a stroke this morning, face drooping", "emergency"),
+    ("Choking on food right now, can't breathe", "emergency"),
+    ("Seizure an hour ago, still drowsy", "emergency"),
+    ("High fever 103 F for two days", "urgent"),
+    ("Severe abdominal pain since night", "urgent"),
+    ("Mild cough and runny nose", "routine"),
+    # Negation stays inside its clause
+    ("No chest pain, but shortness of breath", "emergency"),
+    ("Denies chest pain, has severe headache", "urgent"),
+    ("No fever, no vomiting, mild sore throat", "routine"),
+    # Relatives' conditions
+    ("Mother had a stroke last month, I have mild headache", "routine"),
+    ("Family history of heart attack, mild acidity", "routine"),
+    # The patient's own past history
+    ("History of stroke 5 years ago", "routine"),
+    ("Past history of seizures in childhood", "routine"),
+    ("h/o fainting, currently only mild knee pain", "routine"),
+    ("Had chest pain a few years ago, now mild cough", "routine"),
+    ("Mild heat stroke last summer, fine now", "routine"),
+    ("Sunstroke as a child", "routine"),
+    ("Choking on food yesterday, fine now", "routine"),
+    ("Passed out yesterday but recovered", "routine"),
+    # Past history must not hide a current red flag in another clause
+    ("History of asthma. Now severe shortness of breath", "emergency"),
+    ("Stroke 5 years ago, now sudden numbness in one side", "emergency"),
+    ("Severe headache since morning, history of migraine years ago", "urgent"),
+]
+
+
+def score():
+    mismatches = []
+    for text, expected in CASES:
+        level, reasons = classify_urgency({"symptoms": text})
+        if level != expected:
+            mismatches.append((text, expected, level, reasons))
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    mismatches = score()
+    latencies = []
+    for _ in range(args.repeat):
+        for text, _ in CASES:
+            started = time.perf_counter()
+            classify_urgency({"symptoms": text})
+            latencies.append(time.perf_counter() - started)
+    latencies.sort()
+
+    for text, expected, level, reasons in mismatches:
+        print(f"❌ {text!r}: expected {expected}, got {level} {reasons}")
+    print(f"examples:          {len(CASES) - len(mismatches)}/{len(CASES)} triaged as expected")
+    print(f"latency per text:  p50 {statistics.median(latencies) * 1e6:.0f} µs, p95 {latencies[int(len(latencies) * 0.95)] * 1e6:.0f} µs")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,110 +1,32 @@
 import time
 import streamlit as st
-from pymongo import MongoClient
-from datetime import datetime, date
-import os
-import threading
-
-from fpdf import FPDF
-import cloudinary
-import cloudinary.uploader
-from AI_workflows.workflow2.crew_logic.crew import run_crew_workflow2
-import unicodedata
-import re
+
+from AI_workflows.extraction.urgency import urgency_rank
+from services import client as workflow_client
+from utils import tracing
+from utils.cloudinary_utils import configure_cloudinary
+from utils.config import get_config
+from utils.db import get_db, note_write, routed_db
+from utils.profile import get_profile_view, get_profile_views, render_profile_card
+from utils.report_store import attach_reports
+from utils.rerun_profiler import section
 
 # === Cloudinary Configuration ===
-cloudinary.config(
-    cloud_name=st.secrets["CLOUDINARY_CLOUD_NAME"],
-    api_key=st.secrets["CLOUDINARY_API_KEY"],
-    api_secret=st.secrets["CLOUDINARY_API_SECRET"],
-    secure=True
-)
+config = get_config()
+configure_cloudinary(config)
+tracing.configure_tracing(config, service="web")
 
 # === MongoDB Setup ===
-MONGO_URI = st.secrets["MONGO_URI"]
-client = MongoClient(MONGO_URI)
-db = client.website_data
+db = get_db(config)
 appointments_collection = db.new_appointments
 users_collection = db.users
 
-
-# === Helper Functions ===
-
-def calculate_age(born):
-    today = date.today()
-    return today.year - born.year - ((today.month, today.day) < (born.month, born.day))
-
-def markdown_to_plain_text(md):
-    # Remove markdown links and formatting
-    plain_text = re.sub(r'!\[.*?\]\(.*?\)', '', md)  # remove images
-    plain_text = re.sub(r'\[([^\]]+)\]\([^)]+\)', r'\1', plain_text)  # convert links to text
-    plain_text = re.sub(r'[>#*_`]', '', plain_text)  # strip markdown symbols
-    plain_text = re.sub(r'\n{2,}', '\n\n', plain_text)  # normalize line breaks
-    return plain_text.strip()
-
-def sanitize_text(text):
-    return unicodedata.normalize("NFKD", text).encode("latin-1", "ignore").decode("latin-1")
-
-def generate_pdf(markdown_text, appointment_id):
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=12)
-
-    plain_text = markdown_to_plain_text(markdown_text)
-    clean_text = sanitize_text(plain_text)
-
-    for line in clean_text.split('\n'):
-        pdf.multi_cell(0, 10, line)
-
-    os.makedirs("temp_reports", exist_ok=True)
-    file_path = f"temp_reports/report_{appointment_id}.pdf"
-    pdf.output(file_path)
-    return file_path
-
-def upload_pdf_to_cloudinary(file_path, folder="reports"):
-    result = cloudinary.uploader.upload(
-        file_path,
-        folder=folder,
-        resource_type="raw"
-    )
-    return result.get("secure_url")
-
-
-# === Async CrewAI Final Workflow ===
-def run_final_report_async(appt, suggestions, doctor_name):
-    try:
-        final_markdown = run_crew_workflow2(
-            intermediate_report=appt.get("intermediate_report"),
-            suggestions_for_modifications=suggestions,
-            doctor_name = doctor_name
-        )
-
-        pdf_path = generate_pdf(final_markdown, appt['appointment_id'])
-        pdf_url = upload_pdf_to_cloudinary(pdf_path, folder=f"appointments/{appt['appointment_id']}/final_report")
-
-        appointments_collection.update_one(
-            {"_id": appt['_id']},
-            {
-                "$set": {
-                    "final_report": final_markdown,
-                    "final_report_pdf_url": pdf_url,
-                    "status": "completed"
-                }
-            }
-        )
-        print(f"✅ Final report saved for Appointment #{appt['appointment_id']}")
-
-    except Exception as e:
-        print("❌ Final report generation error:", e)
-        appointments_collection.update_one(
-            {"_id": appt['_id']},
-            {"$set": {"status": "error_finalizing"}}
-        )
+URGENCY_BADGES = {"emergency": "🚨 ", "urgent": "⚠️ "}
 
 
 # === Main Dashboard ===
 def doctor_dashboard(doctor, cookie_controller):
-    with st.sidebar:
+    with st.sidebar, section("sidebar"):
 
         st.markdown(
             """
@@ -120,35 +42,8 @@ def doctor_dashboard(doctor, cookie_controller):
         st.markdown("---")
 
 
-        if doctor.get('dp'):
-            profile_url = doctor['dp']
-        else:
-            profile_url = "https://via.placeholder.com/150"
-
         # Centered and interactive doctor profile card
-        st.markdown(f"""
-            <div style='
-                display: flex;
-                flex-direction: column;
-                align-items: center;
-                justify-content: center;
-                margin-top: 30px;
-                margin-bottom: 20px;
-            '>
-                <div style='
-                    width: 120px;
-                    height: 120px;
-                    border-radius: 50%;
-                    overflow: hidden;
-                    border: 3px solid #10B981;
-                    box-shadow: 0 0 10px rgba(16, 185, 129, 0.4);
-                    transition: transform 0.3s ease;
-                '>
-                    <img src="{profile_url}" style='width: 100%; height: 100%; object-fit: cover;' alt="Profile Picture">
-                </div>
-                <h4 style='margin-top: 10px;'>Dr. {doctor['name']}</h4>
-            </div>
-        """, unsafe_allow_html=True)
+        render_profile_card(get_profile_view(doctor, kind="doctor"))
 
         st.markdown("---")
         # Centered Logout button
@@ -163,28 +58,49 @@ def doctor_dashboard(doctor, cookie_controller):
 
     st.title("🩺 Pending Appointments to Review")
 
-    pending_appointments = list(appointments_collection.find({
-        "status": "pending_doctor_review"
-    }))
+    # The pending list may come from a secondary, except right after this doctor finalized a case
+    reads = routed_db("doctor_pending", st.session_state, config)
+    with section("pending list"):
+        pending_appointments = list(reads.new_appointments.find({
+            "status": "pending_doctor_review"
+        }))
+        # Most urgent first, oldest first within a level
+        pending_appointments.sort(key=lambda appt: (urgency_rank((appt.get("urgency") or {}).get("level")), appt.get("appointment_id", 0)))
 
     if not pending_appointments:
         st.info("🎉 No pending appointments")
         return
 
+    with section("reports and profiles"):
+        # Report bodies live in the report store; fetch all pending ones in one query
+        attach_reports(reads, pending_appointments, "intermediate")
+
+        # Patient profiles come from the shared cache; only unseen patients are fetched, in one query
+        patients = get_profile_views(reads.users, [appt['user_id'] for appt in pending_appointments])
+
+    with section("cases"):
+        render_pending_appointments(doctor, pending_appointments, patients)
+
+
+def render_pending_appointments(doctor, pending_appointments, patients):
     for appt in pending_appointments:
-        user = users_collection.find_one({"_id": appt['user_id']})
+        user = patients.get(appt['user_id'])
         if not user:
             continue
 
-        with st.expander(f"Appointment - {user['name']}"):
-            dob_date = datetime.strptime(user['dob'], '%Y-%m-%d').date()
-
+        urgency = appt.get("urgency") or {}
+        badge = URGENCY_BADGES.get(urgency.get("level"), "")
+        with st.expander(f"{badge}Appointment - {user['name']}"):
+            if urgency.get("reasons"):
+                st.caption(f"Triage: {urgency['level']} ({', '.join(urgency['reasons'])})")
             st.markdown("### 🧍 User Details")
             st.write(f"**Name:** {user['name']}")
-            st.write(f"**Age:** {calculate_age(dob_date)}")
+            st.write(f"**Age:** {user['age']}")
             st.write(f"**Gender:** {user['gender']}")
             st.write(f"**Height:** {user['height']} cm")
             st.write(f"**Weight:** {user['weight']} kg")
+            if user['bmi']:
+                st.write(f"**BMI:** {user['bmi']}")
 
             st.markdown("---")
             st.markdown("### 📋 User Inputs")
@@ -227,24 +143,20 @@ def doctor_dashboard(doctor, cookie_controller):
             )
 
             if st.button("✅ Validate and Finalize", key=f"submit_{appt['_id']}"):
-                appointments_collection.update_one(
-                    {"_id": appt['_id']},
-                    {
-                        "$set": {
-                            "suggestions_for_modifications": suggestions,
-                            "doctor_comments": comments,
-                            "status": "generating_final_report",
-                            "finalized_at": datetime.utcnow()
-                        }
-                    }
-                )
-
-                threading.Thread(
-                    target=run_final_report_async,
-                    args=(appt, suggestions, doctor['name']),
-                    daemon=True
-                ).start()
-
-                st.success("🧠 Suggestions saved! Final report is being generated in background...")
+                # Joins the trace started when the patient submitted the case
+                with tracing.span("appointment.finalize", parent=appt.get("traceparent"), appointment_id=appt['appointment_id']):
+                    started = workflow_client.finalize_appointment(
+                        config,
+                        appt['appointment_id'],
+                        suggestions,
+                        comments,
+                        doctor['name']
+                    )
+                note_write(st.session_state, config)
+
+                if started:
+                    st.success("🧠 Suggestions saved! Final report is being generated in background...")
+                else:
+                    st.warning("This appointment has already been finalized.")
                 time.sleep(2)
                 st.rerun()
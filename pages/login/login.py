@@ -1,29 +1,34 @@
 import streamlit as st
-from pymongo import MongoClient
-import bcrypt
 import secrets
-import time
+
+from utils.db import get_db
+from utils.passwords import verify_password, rehash_in_background
 
 # ------------------ AUTH HELPERS ------------------ #
+def _authenticate(collection, username, password):
+    account = collection.find_one({"username": username})
+    if not account:
+        return None
+
+    matches, needs_rehash = verify_password(password, account['password_hash'])
+    if not matches:
+        return None
+    if needs_rehash:
+        rehash_in_background(collection, account['_id'], password)
+    return account
+
+
 def authenticate_user(users_collection, username, password):
-    user = users_collection.find_one({"username": username})
-    if user and bcrypt.checkpw(password.encode(), user['password_hash']):
-        return user
-    return None
+    return _authenticate(users_collection, username, password)
 
 
 def authenticate_doctor(doctors_collection, username, password):
-    doctor = doctors_collection.find_one({"username": username})
-    if doctor and bcrypt.checkpw(password.encode(), doctor['password_hash']):
-        return doctor
-    return None
+    return _authenticate(doctors_collection, username, password)
 
 
 # ------------------ MAIN LOGIN PAGE ------------------ #
 def login_page(cookie_controller):
-    MONGO_URI = st.secrets["MONGO_URI"]
-    client = MongoClient(MONGO_URI)
-    db = client.website_data
+    db = get_db()
     users_collection = db.users
     doctors_collection = db.doctors
 
@@ -58,8 +63,7 @@ def login_page(cookie_controller):
                         {"$set": {"session_token": session_token}}
                     )
                     cookie_controller.set("session_token", session_token, max_age=86400)  # 1 day
-
-                    time.sleep(1)
+                    st.session_state["pending_session_cookie"] = session_token
                     st.session_state["authenticated"] = True
                     st.session_state["user_type"] = "user"
                     st.session_state["user_data"] = user
@@ -81,6 +85,7 @@ def login_page(cookie_controller):
                         {"$set": {"session_token": session_token}}
                     )
                     cookie_controller.set("session_token", session_token, max_age=86400)  # 1 day
+                    st.session_state["pending_session_cookie"] = session_token
                     st.session_state["authenticated"] = True
                     st.session_state["user_type"] = "doctor"
                     st.session_state["user_data"] = doctor
@@ -1,35 +1,17 @@
 import streamlit as st
-from pymongo import MongoClient
-import bcrypt
 from datetime import datetime, date
 import secrets
-import time
-import cloudinary
-import cloudinary.uploader
 
-# Cloudinary config
-cloudinary.config(
-    cloud_name=st.secrets["CLOUDINARY_CLOUD_NAME"],
-    api_key=st.secrets["CLOUDINARY_API_KEY"],
-    api_secret=st.secrets["CLOUDINARY_API_SECRET"],
-    secure=True
-)
+from utils.cloudinary_utils import configure_cloudinary, upload_dp_to_cloudinary
+from utils.config import get_config
+from utils.db import get_db
+from utils.passwords import hash_password
 
-# Upload DP
-def upload_dp_to_cloudinary(file, username):
-    if file:
-        result = cloudinary.uploader.upload(
-            file,
-            folder=f"profile_pictures/{username}",
-            resource_type="image"
-        )
-        return result.get("secure_url")
-    return None
+# Cloudinary config
+configure_cloudinary(get_config())
 
 def signup_page(cookie_controller):
-    MONGO_URI = st.secrets["MONGO_URI"]
-    client = MongoClient(MONGO_URI)
-    db = client.website_data
+    db = get_db()
     users_collection = db.users
     doctors_collection = db.doctors
 
@@ -72,7 +54,7 @@ def signup_page(cookie_controller):
                 elif users_collection.find_one({"username": username}):
                     st.error("❌ Username already exists.")
                 else:
-                    dp_url = upload_dp_to_cloudinary(dp, username)
+                    dp_url = upload_dp_to_cloudinary(dp, username, db=db)
                     session_token = secrets.token_urlsafe(32)
                     user_doc = {
                         "username": username,
@@ -81,15 +63,14 @@ def signup_page(cookie_controller):
                         "gender": gender,
                         "weight": weight,
                         "height": height,
-                        "password_hash": bcrypt.hashpw(password.encode(), bcrypt.gensalt()),
+                        "password_hash": hash_password(password),
                         "dp": dp_url,
                         "created_at": datetime.utcnow(),
                         "session_token": session_token
                     }
                     users_collection.insert_one(user_doc)
                     cookie_controller.set("session_token", session_token, max_age=86400)
-
-                    time.sleep(1)
+                    st.session_state["pending_session_cookie"] = session_token
                     st.session_state["authenticated"] = True
                     st.session_state["user_type"] = "user"
                     st.session_state["user_data"] = user_doc
@@ -111,20 +92,19 @@ def signup_page(cookie_controller):
                 elif doctors_collection.find_one({"username": username}):
                     st.error("❌ Username already exists.")
                 else:
-                    dp_url = upload_dp_to_cloudinary(dp, username)
+                    dp_url = upload_dp_to_cloudinary(dp, username, db=db)
                     session_token = secrets.token_urlsafe(32)
                     doctor_doc = {
                         "username": username,
                         "name": name,
-                        "password_hash": bcrypt.hashpw(password.encode(), bcrypt.gensalt()),
+                        "password_hash": hash_password(password),
                         "dp": dp_url,
                         "created_at": datetime.utcnow(),
                         "session_token": session_token
                     }
                     doctors_collection.insert_one(doctor_doc)
                     cookie_controller.set("session_token", session_token, max_age=86400)
-
-                    time.sleep(1)
+                    st.session_state["pending_session_cookie"] = session_token
                     st.session_state["authenticated"] = True
                     st.session_state["user_type"] = "doctor"
                     st.session_state["user_data"] = doctor_doc
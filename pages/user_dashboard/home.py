@@ -1,19 +1,17 @@
 import streamlit as st
-from pymongo import MongoClient
-from datetime import datetime, date
 from dotenv import load_dotenv
 
+from utils.db import get_db, routed_db
+from utils.profile import get_profile_view, render_profile_card
+from utils.report_store import attach_reports
+from utils.rerun_profiler import section
+from utils.tiering import find_past_appointments
+
 # MongoDB setup
-MONGO_URI = st.secrets["MONGO_URI"]
-client = MongoClient(MONGO_URI)
-db = client.website_data
+db = get_db()
 appointments_collection = db.new_appointments
 users_collection = db.users
 
-def calculate_age(born):
-    today = date.today()
-    return today.year - born.year - ((today.month, today.day) < (born.month, born.day))
-
 def user_dashboard(user, cookie_controller):
     # Sidebar
     with st.sidebar:
@@ -31,45 +29,8 @@ def user_dashboard(user, cookie_controller):
 
         st.markdown("---")
 
-        if user.get('dp'):
-            profile_url = user['dp']
-        else:
-            profile_url = "https://via.placeholder.com/150"
-
         # Centered and interactive user profile card
-
-        # Calculate age
-        dob_date = datetime.strptime(user['dob'], '%Y-%m-%d').date()
-        user_age = calculate_age(dob_date)
-
-        st.markdown(f"""
-            <div style='
-                display: flex;
-                flex-direction: column;
-                align-items: center;
-                justify-content: center;
-                margin-top: 30px;
-                margin-bottom: 20px;
-            '>
-                <div style='
-                    width: 120px;
-                    height: 120px;
-                    border-radius: 50%;
-                    overflow: hidden;
-                    border: 3px solid #3B82F6;
-                    box-shadow: 0 0 10px rgba(59, 130, 246, 0.4);
-                    transition: transform 0.3s ease;
-                '>
-                    <img src="{profile_url}" style='width: 100%; height: 100%; object-fit: cover;' alt="Profile Picture">
-                </div>
-                <h4 style='margin-top: 10px;'>{user['name']}</h4>
-                <p style='margin: 0; font-size: 13px; color: #666;'>DOB: {user['dob']}</p>
-                <p style='margin: 0; font-size: 13px; color: #666;'>Age: {user_age} years</p>
-                <p style='margin: 0; font-size: 13px; color: #666;'>Gender: {user['gender']}</p>
-                <p style='margin: 0; font-size: 13px; color: #666;'>Height: {user['height']} cm</p>
-                <p style='margin: 0; font-size: 13px; color: #666;'>Weight: {user['weight']} kg</p>
-            </div>
-        """, unsafe_allow_html=True)
+        render_profile_card(get_profile_view(user))
 
         st.markdown("---")
         # Centered Logout button
@@ -105,11 +66,11 @@ def user_dashboard(user, cookie_controller):
     # 📜 View past history
     st.markdown("### 📜 View Your Medical History")
     if st.button("📂 View Past Appointments", use_container_width=True):
-        past_appointments = list(appointments_collection.find({
-            "user_id": user['_id'],
-            "status": "completed"
-        }))
-        display_past_appointments(past_appointments)
+        # Older cases live in the archive tier
+        with section("history"):
+            reads = routed_db("user_history", st.session_state)
+            past_appointments = find_past_appointments(reads, user['_id'])
+            display_past_appointments(attach_reports(reads, past_appointments, "final"))
 
 
 
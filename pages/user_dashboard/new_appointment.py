@@ -1,59 +1,28 @@
 import streamlit as st
-from pymongo import MongoClient
-from datetime import datetime, date
-from bson.objectid import ObjectId
-import cloudinary
-import cloudinary.uploader
-import threading
+
+from AI_workflows.extraction.pdf_text import MB
+from services import client as workflow_client
+from utils import tracing
+from utils.appointments import allocate_appointment_ids
+from utils.cloudinary_utils import configure_cloudinary, upload_to_cloudinary
+from utils.config import get_config
+from utils.db import get_db, note_write
+from utils.idempotency import claim_submission, compute_fingerprint, find_duplicate, hash_attachment, release_submission
+from utils.profile import get_profile_view, render_profile_card
+from utils.rerun_profiler import section
 
 # === Cloudinary Configuration ===
-cloudinary.config(
-    cloud_name=st.secrets["CLOUDINARY_CLOUD_NAME"],
-    api_key=st.secrets["CLOUDINARY_API_KEY"],
-    api_secret=st.secrets["CLOUDINARY_API_SECRET"],
-    secure=True
-)
+config = get_config()
+configure_cloudinary(config)
+tracing.configure_tracing(config, service="web")
 
 # === MongoDB Setup ===
-MONGO_URI = st.secrets["MONGO_URI"]
-client = MongoClient(MONGO_URI)
-db = client.website_data
+db = get_db(config)
 appointments_collection = db["new_appointments"]
 
 # === Helper Functions ===
-def calculate_age(born):
-    today = date.today()
-    return today.year - born.year - ((today.month, today.day) < (born.month, born.day))
-
 def get_next_appointment_id():
-    last_appt = appointments_collection.find_one(sort=[("appointment_id", -1)])
-    return (last_appt["appointment_id"] + 1) if last_appt else 1
-
-def upload_to_cloudinary(file, folder="appointments", resource_type="auto"):
-    result = cloudinary.uploader.upload(
-        file,
-        folder=folder,
-        resource_type=resource_type
-    )
-    return result.get("secure_url")
-
-# === Async CrewAI Execution ===
-def run_crew_async(personal_data, appointment_data, inserted_id):
-    try:
-        from AI_workflows.workflow1.crew_logic.crew import run_crew_workflow1
-        output = run_crew_workflow1(personal_data, appointment_data)
-
-        appointments_collection.update_one(
-            {"_id": inserted_id},
-            {
-                "$set": {
-                    "intermediate_report": output,
-                    "status": "pending_doctor_review"
-                }
-            }
-        )
-    except Exception as e:
-        print("❌ Error running CrewAI workflow in background:", e)
+    return allocate_appointment_ids(db, 1)[0]
 
 # === Main Appointment Page ===
 def new_appointment_page(user, cookie_controller):
@@ -73,45 +42,8 @@ def new_appointment_page(user, cookie_controller):
 
         st.markdown("---")
 
-        if user.get('dp'):
-            profile_url = user['dp']
-        else:
-            profile_url = "https://via.placeholder.com/150"
-
         # Centered and interactive user profile card
-
-        # Calculate age
-        dob_date = datetime.strptime(user['dob'], '%Y-%m-%d').date()
-        user_age = calculate_age(dob_date)
-
-        st.markdown(f"""
-            <div style='
-                display: flex;
-                flex-direction: column;
-                align-items: center;
-                justify-content: center;
-                margin-top: 30px;
-                margin-bottom: 20px;
-            '>
-                <div style='
-                    width: 120px;
-                    height: 120px;
-                    border-radius: 50%;
-                    overflow: hidden;
-                    border: 3px solid #3B82F6;
-                    box-shadow: 0 0 10px rgba(59, 130, 246, 0.4);
-                    transition: transform 0.3s ease;
-                '>
-                    <img src="{profile_url}" style='width: 100%; height: 100%; object-fit: cover;' alt="Profile Picture">
-                </div>
-                <h4 style='margin-top: 10px;'>{user['name']}</h4>
-                <p style='margin: 0; font-size: 13px; color: #666;'>DOB: {user['dob']}</p>
-                <p style='margin: 0; font-size: 13px; color: #666;'>Age: {user_age} years</p>
-                <p style='margin: 0; font-size: 13px; color: #666;'>Gender: {user['gender']}</p>
-                <p style='margin: 0; font-size: 13px; color: #666;'>Height: {user['height']} cm</p>
-                <p style='margin: 0; font-size: 13px; color: #666;'>Weight: {user['weight']} kg</p>
-            </div>
-        """, unsafe_allow_html=True)
+        render_profile_card(get_profile_view(user))
 
         st.markdown("---")
         # Centered Logout button
@@ -140,50 +72,72 @@ def new_appointment_page(user, cookie_controller):
         visual_symptoms = st.file_uploader('Visual Symptoms', type=['png', 'jpg', 'jpeg'], accept_multiple_files=True)
 
         if st.form_submit_button('Submit Appointment'):
-            appt_id = get_next_appointment_id()
-
-            # Upload files to Cloudinary
-            lab_report_url = upload_to_cloudinary(lab_report, folder=f"appointments/{appt_id}", resource_type="raw") if lab_report else None
-            visual_symptom_urls = [upload_to_cloudinary(img, folder=f"appointments/{appt_id}/images") for img in visual_symptoms] if visual_symptoms else []
-
-            # Prepare appointment data
-            appointment_data = {
-                "appointment_id": appt_id,
-                "user_id": user['_id'],
-                "created_at": datetime.utcnow(),
-                "status": "pending",  # will change after AI runs
-                "inputs": {
-                    "symptoms": symptoms,
-                    "recent_medications": recent_medications,
-                    "regular_medications": regular_medications,
-                    "important_notes": important_notes,
-                    "lab_report": lab_report_url,
-                    "visual_symptoms": visual_symptom_urls
-                }
-            }
-
-            # Insert appointment to DB
-            insert_result = appointments_collection.insert_one(appointment_data)
-            inserted_id = insert_result.inserted_id
-
-            # Prepare personal data for Crew
-            personal_data = {
-                "name": user["name"],
-                "dob": user["dob"],
-                "age": calculate_age(dob_date),
-                "weight": user["weight"],
-                "height": user["height"]
-            }
-
-            # Start CrewAI in background
-            threading.Thread(
-                target=run_crew_async,
-                args=(personal_data, appointment_data, inserted_id),
-                daemon=True
-            ).start()
-
-            # ✅ Immediate Confirmation
-            st.success(f"✅ Appointment #{appt_id} submitted successfully! AI workflow is now running.")
-            st.markdown("---")
-            st.info("Our AI system is generating your diagnostic report. A doctor will review it and update your dashboard shortly.")
-            st.info("Note: Features like diagnosis generation may take time due to server load.")
+            with section("submit"):
+                # Oversized files are refused before an id is allocated or anything is uploaded
+                oversized = [file.name for file in [lab_report, *(visual_symptoms or [])] if file and file.size > config["ATTACHMENT_MAX_MB"] * MB]
+                if oversized:
+                    st.error(f"❌ Files larger than {config['ATTACHMENT_MAX_MB']} MB can't be attached: {', '.join(oversized)}")
+                    return
+
+                # Collapse double clicks and resubmits onto the earlier appointment before any id, upload or AI work
+                lab_report_hash = hash_attachment(lab_report) if lab_report else None
+                image_hashes = [hash_attachment(img) for img in visual_symptoms or []]
+                fingerprint = compute_fingerprint(
+                    user['_id'],
+                    {
+                        "symptoms": symptoms,
+                        "recent_medications": recent_medications,
+                        "regular_medications": regular_medications,
+                        "important_notes": important_notes
+                    },
+                    lab_report_hash=lab_report_hash,
+                    image_hashes=image_hashes
+                )
+                window_seconds = config["SUBMISSION_DEDUP_WINDOW_SECONDS"]
+                duplicate_of = find_duplicate(db, fingerprint, window_seconds)
+                if duplicate_of is None:
+                    appt_id = get_next_appointment_id()
+                    duplicate_of = claim_submission(db, fingerprint, appt_id, window_seconds)
+
+                if duplicate_of is not None:
+                    existing = workflow_client.get_status(config, duplicate_of)
+                    st.info(f"ℹ️ This appointment was already submitted as #{duplicate_of} (status: {existing['status'] if existing else 'pending'}). No new request was created.")
+                else:
+                    try:
+                        # The appointment's trace starts here and follows it to the final PDF
+                        with tracing.span("appointment.submit", appointment_id=appt_id, images=len(visual_symptoms or [])):
+                            # Upload files to Cloudinary; files this patient uploaded before (same bytes) are reused
+                            lab_report_url = upload_to_cloudinary(lab_report, folder=f"appointments/{appt_id}", resource_type="raw", db=db, content_hash=lab_report_hash, owner=str(user['_id'])) if lab_report else None
+                            visual_symptom_urls = [
+                                upload_to_cloudinary(img, folder=f"appointments/{appt_id}/images", db=db, content_hash=img_hash, owner=str(user['_id']))
+                                for img, img_hash in zip(visual_symptoms or [], image_hashes)
+                            ]
+
+                            # Hand the appointment to the workflow engine (in-process or remote service)
+                            workflow_client.submit_appointment(
+                                config,
+                                user['_id'],
+                                {
+                                    "symptoms": symptoms,
+                                    "recent_medications": recent_medications,
+                                    "regular_medications": regular_medications,
+                                    "important_notes": important_notes,
+                                    "lab_report": lab_report_url,
+                                    "visual_symptoms": visual_symptom_urls
+                                },
+                                appointment_id=appt_id,
+                                claimed_fingerprint=fingerprint
+                            )
+                    except Exception as e:
+                        # Free the claim so a retry isn't sent to an appointment that was never created
+                        release_submission(db, fingerprint, appt_id)
+                        st.error(f"❌ Appointment could not be submitted, please try again: {e}")
+                        return
+
+                    note_write(st.session_state, config)
+
+                    # ✅ Immediate Confirmation
+                    st.success(f"✅ Appointment #{appt_id} submitted successfully! AI workflow is now running.")
+                    st.markdown("---")
+                    st.info("Our AI system is generating your diagnostic report. A doctor will review it and update your dashboard shortly.")
+                    st.info("Note: Features like diagnosis generation may take time due to server load.")
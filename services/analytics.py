@@ -0,0 +1,320 @@
+"""
+Columnar analytics export of appointments and LLM pipeline metrics.
+
+Usage (from the project root):
+    python -m services.analytics export            # incremental, e.g. from cron
+    python -m services.analytics report [--since 2025-07-01]
+    python -m services.analytics compact           # drop superseded appointment rows
+
+Appointments changed since the last export (by `updated_at`, from both the hot
+and the archive tier, read from a secondary when one is available) are
+flattened to ids, status, urgency, timings and sizes - no free text and no
+report bodies - and appended as Parquet files partitioned by creation date:
+    <ANALYTICS_EXPORT_DIR>/appointments/date=2025-07-14/part-<run>.parquet
+Calls recorded in ROUTING_REPORT_FILE are appended the same way under
+llm_calls/, partitioned by run date. An appointment that changed again shows
+up in a later part as well; readers keep the row with the latest updated_at.
+Reports are computed with Arrow compute kernels over the files only, so they
+never touch MongoDB. Requires pyarrow.
+"""
+import argparse
+import glob
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pymongo import ReadPreference
+
+# Re-read a few minutes before the high-water mark: replicas' clocks and
+# in-flight writes may stamp updated_at slightly out of order
+HWM_OVERLAP = timedelta(minutes=5)
+BATCH_SIZE = 5000
+
+APPOINTMENT_SCHEMA = pa.schema([
+    ("appointment_id", pa.int64()),
+    ("user_id", pa.string()),
+    ("source", pa.string()),
+    ("status", pa.string()),
+    ("urgency", pa.string()),
+    ("doctor_name", pa.string()),
+    ("created_at", pa.timestamp("ms")),
+    ("finalized_at", pa.timestamp("ms")),
+    ("updated_at", pa.timestamp("ms")),
+    ("has_lab_report", pa.bool_()),
+    ("visual_symptoms", pa.int32()),
+    ("intermediate_report_chars", pa.int64()),
+    ("final_report_chars", pa.int64()),
+    ("has_final_pdf", pa.bool_()),
+    ("archived", pa.bool_()),
+])
+LLM_CALL_SCHEMA = pa.schema([
+    ("workflow", pa.string()),
+    ("finished_at", pa.timestamp("ms", tz="UTC")),
+    ("stage", pa.string()),
+    ("profile", pa.string()),
+    ("model", pa.string()),
+    ("latency_s", pa.float64()),
+    ("fallback", pa.bool_()),
+    ("timed_out", pa.bool_()),
+    ("over_budget", pa.bool_()),
+    ("hedged", pa.bool_()),
+    ("input_tokens", pa.int64()),
+    ("output_tokens", pa.int64()),
+    ("cost_usd", pa.float64()),
+])
+
+
+# === State ===
+def _state_path(export_dir):
+    return os.path.join(export_dir, "state.json")
+
+
+def load_state(export_dir):
+    try:
+        with open(_state_path(export_dir), encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {"appointments_hwm": None, "routing_report_offset": 0}
+
+
+def save_state(export_dir, state):
+    tmp_path = _state_path(export_dir) + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(state, file)
+    os.replace(tmp_path, _state_path(export_dir))
+
+
+def write_partitions(table, root, date_column, run_id):
+    """Appends `table` as one Parquet file per date=YYYY-MM-DD partition of `date_column`."""
+    if table.num_rows == 0:
+        return
+    days = pc.strftime(table[date_column], format="%Y-%m-%d").to_numpy(zero_copy_only=False)
+    for day in np.unique(days.astype(str)):
+        partition = os.path.join(root, f"date={day}")
+        os.makedirs(partition, exist_ok=True)
+        pq.write_table(table.filter(pa.array(days == day)), os.path.join(partition, f"part-{run_id}.parquet"), compression="zstd")
+
+
+# === Appointments ===
+def _report_chars(appt, kind):
+    ref = (appt.get("reports") or {}).get(kind)
+    if ref is not None:
+        return ref.get("size")
+    inline = appt.get(f"{kind}_report")
+    return len(inline) if isinstance(inline, str) else None
+
+
+def flatten_appointment(appt):
+    inputs = appt.get("inputs") or {}
+    return {
+        "appointment_id": appt["appointment_id"],
+        "user_id": str(appt.get("user_id")),
+        "source": appt.get("source") or "web",
+        "status": appt.get("status"),
+        "urgency": (appt.get("urgency") or {}).get("level"),
+        "doctor_name": appt.get("doctor_name"),
+        "created_at": appt.get("created_at"),
+        "finalized_at": appt.get("finalized_at"),
+        "updated_at": appt.get("updated_at") or appt.get("finalized_at") or appt.get("created_at"),
+        "has_lab_report": bool(inputs.get("lab_report")),
+        "visual_symptoms": len(inputs.get("visual_symptoms") or []),
+        "intermediate_report_chars": _report_chars(appt, "intermediate"),
+        "final_report_chars": _report_chars(appt, "final"),
+        "has_final_pdf": bool(appt.get("final_report_pdf_url")),
+        "archived": "archived_at" in appt,
+    }
+
+
+def export_appointments(db, export_dir, state, run_id):
+    hwm = state.get("appointments_hwm")
+    query = {"updated_at": {"$gte": datetime.fromisoformat(hwm) - HWM_OVERLAP}} if hwm else {}
+    projection = {field: 0 for field in ("intermediate_report", "final_report", "speculative_final_report", "fingerprint")}
+    root = os.path.join(export_dir, "appointments")
+
+    exported, latest = 0, None
+    for collection in (db.new_appointments, db.archived_appointments):
+        cursor = collection.with_options(read_preference=ReadPreference.SECONDARY_PREFERRED).find(query, projection)
+        rows = []
+        for appt in cursor.batch_size(BATCH_SIZE):
+            row = flatten_appointment(appt)
+            rows.append(row)
+            if row["updated_at"] and (latest is None or row["updated_at"] > latest):
+                latest = row["updated_at"]
+            if len(rows) >= BATCH_SIZE:
+                write_partitions(pa.Table.from_pylist(rows, schema=APPOINTMENT_SCHEMA), root, "created_at", f"{run_id}-{exported}")
+                exported += len(rows)
+                rows = []
+        write_partitions(pa.Table.from_pylist(rows, schema=APPOINTMENT_SCHEMA), root, "created_at", f"{run_id}-{exported}")
+        exported += len(rows)
+
+    if latest is not None:
+        state["appointments_hwm"] = max(latest, datetime.fromisoformat(hwm)).isoformat() if hwm else latest.isoformat()
+    return exported
+
+
+# === LLM calls ===
+def export_llm_calls(report_path, export_dir, state, run_id):
+    """Appends calls from routing report lines written since the last export."""
+    if not report_path or not os.path.exists(report_path):
+        return 0
+    offset = state.get("routing_report_offset", 0)
+    if os.path.getsize(report_path) < offset:
+        offset = 0  # the report file was rotated
+    with open(report_path, "rb") as file:
+        file.seek(offset)
+        data = file.read()
+    complete = data[:data.rfind(b"\n") + 1]  # a run still being appended is picked up next time
+
+    rows = []
+    for line in complete.splitlines():
+        run = json.loads(line)
+        finished_at = datetime.fromisoformat(run["finished_at"])
+        for call in run["calls"]:
+            rows.append({
+                "workflow": run["workflow"],
+                "finished_at": finished_at,
+                **{field: call.get(field) for field in LLM_CALL_SCHEMA.names[2:]},
+                # Only set on calls where they happened
+                **{flag: bool(call.get(flag)) for flag in ("timed_out", "over_budget", "hedged")},
+            })
+    write_partitions(pa.Table.from_pylist(rows, schema=LLM_CALL_SCHEMA), os.path.join(export_dir, "llm_calls"), "finished_at", run_id)
+    state["routing_report_offset"] = offset + len(complete)
+    return len(rows)
+
+
+def export(db, config):
+    export_dir = config["ANALYTICS_EXPORT_DIR"]
+    os.makedirs(export_dir, exist_ok=True)
+    state = load_state(export_dir)
+    run_id = str(int(time.time() * 1000))
+    appointments = export_appointments(db, export_dir, state, run_id)
+    llm_calls = export_llm_calls(config.get("ROUTING_REPORT_FILE"), export_dir, state, run_id)
+    save_state(export_dir, state)
+    return appointments, llm_calls
+
+
+# === Reading ===
+def read_dataset(export_dir, name, since=None):
+    root = os.path.join(export_dir, name)
+    if not os.path.isdir(root):
+        return None
+    dataset = ds.dataset(root, format="parquet", partitioning="hive")
+    return dataset.to_table(filter=(ds.field("date") >= since) if since else None)
+
+
+def latest_appointments(table):
+    """One row per appointment: the most recently updated one."""
+    table = table.sort_by([("appointment_id", "ascending"), ("updated_at", "descending")])
+    ids = table["appointment_id"].to_numpy()
+    return table.filter(pa.array(np.r_[True, ids[1:] != ids[:-1]]))
+
+
+def compact(export_dir):
+    """Rewrites each appointment partition as a single file without superseded rows."""
+    run_id = str(int(time.time() * 1000))
+    for partition in sorted(glob.glob(os.path.join(export_dir, "appointments", "date=*"))):
+        parts = glob.glob(os.path.join(partition, "part-*.parquet"))
+        if len(parts) < 2:
+            continue
+        table = latest_appointments(pa.concat_tables([pq.read_table(part, schema=APPOINTMENT_SCHEMA) for part in parts]))
+        pq.write_table(table, os.path.join(partition, f"part-{run_id}-compacted.parquet"), compression="zstd")
+        for part in parts:
+            os.remove(part)
+
+
+# === Reports ===
+def _percentiles(table, keys, column):
+    return table.group_by(keys).aggregate([
+        (column, "count"),
+        (column, "tdigest", pc.TDigestOptions(q=[0.5, 0.95])),
+    ])
+
+
+def daily_volume(appointments):
+    day = pc.cast(appointments["created_at"], pa.date32())
+    table = pa.table({
+        "day": day,
+        "submitted": pa.array(np.ones(len(appointments), dtype=np.int64)),
+        "completed": pc.cast(pc.equal(appointments["status"], "completed"), pa.int64()),
+        "errors": pc.cast(pc.equal(appointments["status"], "error_finalizing"), pa.int64()),
+        "emergency": pc.cast(pc.fill_null(pc.equal(appointments["urgency"], "emergency"), False), pa.int64()),
+    })
+    return table.group_by("day").aggregate([(column, "sum") for column in ("submitted", "completed", "errors", "emergency")]).sort_by("day")
+
+
+def turnaround(appointments):
+    """Minutes from submission to finalization by urgency, for finalized appointments."""
+    finalized = appointments.filter(pc.is_valid(appointments["finalized_at"]))
+    minutes = pc.divide(pc.cast(pc.subtract(finalized["finalized_at"], finalized["created_at"]), pa.int64()), 60000.0)
+    table = pa.table({"urgency": pc.fill_null(finalized["urgency"], "unknown"), "minutes": minutes})
+    return _percentiles(table, ["urgency"], "minutes").sort_by("urgency")
+
+
+def llm_stage_latency(calls):
+    return calls.group_by(["workflow", "stage"]).aggregate([
+        ("latency_s", "count"),
+        ("latency_s", "tdigest", pc.TDigestOptions(q=[0.5, 0.95])),
+        ("cost_usd", "sum"),
+        ("hedged", "sum"),
+        ("timed_out", "sum"),
+    ]).sort_by([("workflow", "ascending"), ("stage", "ascending")])
+
+
+def print_reports(export_dir, since=None):
+    appointments = read_dataset(export_dir, "appointments", since)
+    if appointments is not None and appointments.num_rows:
+        appointments = latest_appointments(appointments)
+        print(f"Appointments per day ({appointments.num_rows} appointments)")
+        print(f"{'day':<12}{'submitted':>10}{'completed':>10}{'errors':>8}{'error %':>9}{'emergency':>10}")
+        for row in daily_volume(appointments).to_pylist():
+            finished = row["completed_sum"] + row["errors_sum"]
+            error_pct = 100 * row["errors_sum"] / finished if finished else 0
+            print(f"{row['day']!s:<12}{row['submitted_sum']:>10}{row['completed_sum']:>10}{row['errors_sum']:>8}{error_pct:>8.1f}%{row['emergency_sum']:>10}")
+
+        print("\nSubmission to finalization (minutes)")
+        print(f"{'urgency':<12}{'cases':>8}{'p50':>10}{'p95':>10}")
+        for row in turnaround(appointments).to_pylist():
+            p50, p95 = row["minutes_tdigest"]
+            print(f"{row['urgency']:<12}{row['minutes_count']:>8}{p50:>10.1f}{p95:>10.1f}")
+
+    calls = read_dataset(export_dir, "llm_calls", since)
+    if calls is not None and calls.num_rows:
+        print(f"\nLLM calls per stage ({calls.num_rows} calls)")
+        print(f"{'workflow':<12}{'stage':<60}{'calls':>7}{'p50 s':>8}{'p95 s':>8}{'hedged':>8}{'t/o':>5}{'cost $':>10}")
+        for row in llm_stage_latency(calls).to_pylist():
+            p50, p95 = row["latency_s_tdigest"]
+            print(f"{row['workflow']:<12}{row['stage']:<60}{row['latency_s_count']:>7}{p50:>8.2f}{p95:>8.2f}"
+                  f"{row['hedged_sum'] or 0:>8}{row['timed_out_sum'] or 0:>5}{row['cost_usd_sum'] or 0:>10.4f}")
+
+
+def main(argv=None):
+    from utils.config import load_config
+    from utils.db import get_db
+
+    parser = argparse.ArgumentParser(description="Analytics export and reports.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("export", help="Append appointments and LLM calls changed since the last export")
+    report_parser = sub.add_parser("report", help="Aggregate reports over the exported files")
+    report_parser.add_argument("--since", help="First partition date to include, YYYY-MM-DD")
+    sub.add_parser("compact", help="Rewrite appointment partitions without superseded rows")
+    args = parser.parse_args(argv)
+
+    config = load_config(use_streamlit_secrets=False)
+    if args.command == "export":
+        appointments, llm_calls = export(get_db(config), config)
+        print(f"✅ Exported {appointments} appointments and {llm_calls} LLM calls to {config['ANALYTICS_EXPORT_DIR']}")
+    elif args.command == "report":
+        print_reports(config["ANALYTICS_EXPORT_DIR"], args.since)
+    else:
+        compact(config["ANALYTICS_EXPORT_DIR"])
+        print("✅ Compacted appointment partitions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+"""
+Bulk appointment intake for partner clinics.
+
+Usage (from the project root):
+    python -m services.batch_intake manifest.csv [--dry-run] [--strict] [--no-run]
+    python -m services.batch_intake --resume      # queue batch appointments left pending
+
+The manifest is a CSV or JSON file with one case per row:
+    username, symptoms, recent_medications, regular_medications,
+    important_notes, lab_report, visual_symptoms
+
+`lab_report` is a path to a PDF and `visual_symptoms` a list of image paths
+(";"-separated in CSV). Relative paths are resolved against the manifest's folder.
+
+Inserted appointments are handed to the workflow engine (the service at
+WORKFLOW_SERVICE_URL, else an in-process one), so they share its urgency
+queues and LLM capacity with the app's own submissions.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from AI_workflows.extraction.pdf_text import MB
+from AI_workflows.extraction.urgency import classify_urgency
+from services import client as workflow_client
+from services.workflow_service import get_local_service
+from utils import tracing
+from utils.appointments import allocate_appointment_ids
+from utils.cloudinary_utils import configure_cloudinary, upload_to_cloudinary
+from utils.config import DEFAULTS, load_config
+from utils.db import get_db
+from utils.idempotency import claim_submission, compute_fingerprint, find_duplicate, hash_attachment, release_submission
+
+MANIFEST_FIELDS = [
+    "username", "symptoms", "recent_medications", "regular_medications",
+    "important_notes", "lab_report", "visual_symptoms"
+]
+REQUIRED_FIELDS = ["username", "symptoms"]
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+# ----------------------------
+# STEP 1: LOAD MANIFEST
+# ----------------------------
+def load_manifest(manifest_path):
+    if manifest_path.lower().endswith(".json"):
+        with open(manifest_path, "r", encoding="utf-8") as file:
+            rows = json.load(file)
+        if isinstance(rows, dict):
+            rows = rows.get("appointments", [])
+    else:
+        with open(manifest_path, "r", encoding="utf-8-sig", newline="") as file:
+            rows = list(csv.DictReader(file))
+
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    cases = []
+    for row in rows:
+        case = {field: (row.get(field) or "") for field in MANIFEST_FIELDS}
+        for field in MANIFEST_FIELDS:
+            if isinstance(case[field], str):
+                case[field] = case[field].strip()
+
+        images = case["visual_symptoms"]
+        if isinstance(images, str):
+            images = [img.strip() for img in images.split(";") if img.strip()]
+        case["visual_symptoms"] = [os.path.join(base_dir, img) for img in images]
+        if case["lab_report"]:
+            case["lab_report"] = os.path.join(base_dir, case["lab_report"])
+        cases.append(case)
+    return cases
+
+# ----------------------------
+# STEP 2: VALIDATE MANIFEST
+# ----------------------------
+def validate_manifest(cases, users_collection, max_attachment_mb=DEFAULTS["ATTACHMENT_MAX_MB"]):
+    """
+    Returns (valid_cases, errors). Each valid case gets its user document
+    attached; users are resolved with a single $in query.
+    """
+    max_bytes = max_attachment_mb * MB
+    usernames = list({case["username"] for case in cases if case["username"]})
+    users = {
+        user["username"]: user
+        for user in users_collection.find({"username": {"$in": usernames}})
+    }
+
+    valid_cases, errors = [], []
+    for row_number, case in enumerate(cases, start=1):
+        row_errors = []
+        for field in REQUIRED_FIELDS:
+            if not case[field]:
+                row_errors.append(f"missing '{field}'")
+
+        if case["username"] and case["username"] not in users:
+            row_errors.append(f"unknown user '{case['username']}'")
+
+        lab_report = case["lab_report"]
+        if lab_report:
+            if not lab_report.lower().endswith(".pdf"):
+                row_errors.append(f"lab report is not a PDF: {lab_report}")
+            elif not os.path.isfile(lab_report):
+                row_errors.append(f"lab report not found: {lab_report}")
+            elif os.path.getsize(lab_report) > max_bytes:
+                row_errors.append(f"lab report larger than {max_bytes // MB} MB: {lab_report}")
+
+        for img in case["visual_symptoms"]:
+            if not img.lower().endswith(IMAGE_EXTENSIONS):
+                row_errors.append(f"unsupported image type: {img}")
+            elif not os.path.isfile(img):
+                row_errors.append(f"image not found: {img}")
+            elif os.path.getsize(img) > max_bytes:
+                row_errors.append(f"image larger than {max_bytes // MB} MB: {img}")
+
+        if row_errors:
+            errors.append((row_number, row_errors))
+        else:
+            valid_cases.append(dict(case, user=users[case["username"]]))
+
+    return valid_cases, errors
+
+# ----------------------------
+# STEP 3: DROP DUPLICATES
+# ----------------------------
+def claim_cases(db, cases, window_seconds):
+    """
+    Fingerprints each case (user, normalized text, attachment hashes) and keeps
+    only those not already submitted within the window, in this manifest or before.
+    Appointment ids are allocated for the kept cases only; returns (cases, ids).
+    """
+    fresh_cases, fingerprints = [], set()
+    for case in cases:
+        # The hashes are kept for the upload step, which reuses files stored before
+        case["lab_report_hash"] = hash_attachment(case["lab_report"]) if case["lab_report"] else None
+        case["image_hashes"] = [hash_attachment(img) for img in case["visual_symptoms"]]
+        case["fingerprint"] = compute_fingerprint(
+            case["user"]["_id"],
+            case,
+            lab_report_hash=case["lab_report_hash"],
+            image_hashes=case["image_hashes"]
+        )
+        if case["fingerprint"] in fingerprints:
+            print(f"↩️ Skipping duplicate case for '{case['username']}' (repeated in this manifest)")
+            continue
+        duplicate_of = find_duplicate(db, case["fingerprint"], window_seconds)
+        if duplicate_of is not None:
+            print(f"↩️ Skipping duplicate case for '{case['username']}' (already appointment #{duplicate_of})")
+            continue
+        fingerprints.add(case["fingerprint"])
+        fresh_cases.append(case)
+
+    claimed_cases, claimed_ids = [], []
+    appt_ids = allocate_appointment_ids(db, len(fresh_cases)) if fresh_cases else []
+    for case, appt_id in zip(fresh_cases, appt_ids):
+        # Another session may have claimed the same submission since the check above
+        duplicate_of = claim_submission(db, case["fingerprint"], appt_id, window_seconds)
+        if duplicate_of is not None:
+            print(f"↩️ Skipping duplicate case for '{case['username']}' (already appointment #{duplicate_of})")
+            continue
+        claimed_cases.append(case)
+        claimed_ids.append(appt_id)
+    return claimed_cases, claimed_ids
+
+# ----------------------------
+# STEP 4: UPLOAD ATTACHMENTS
+# ----------------------------
+def upload_attachments(cases, appt_ids, max_workers=8, db=None):
+    """
+    Uploads every lab report and image of the batch concurrently and returns
+    one {"lab_report": url, "visual_symptoms": [urls]} dict per case. A file
+    that appears several times for the same patient is uploaded once; with
+    `db`, files that patient uploaded before are not uploaded again.
+    """
+    uploads = [{"lab_report": None, "visual_symptoms": [None] * len(case["visual_symptoms"])} for case in cases]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures, by_content = [], {}
+
+        def upload(path, folder, resource_type, content_hash, owner):
+            # Never shared between patients: the URL points into the owner's appointment folder
+            key = (owner, content_hash, resource_type)
+            if key not in by_content:
+                by_content[key] = executor.submit(upload_to_cloudinary, path, folder=folder, resource_type=resource_type, db=db, content_hash=content_hash, owner=owner)
+            return by_content[key]
+
+        for index, (case, appt_id) in enumerate(zip(cases, appt_ids)):
+            owner = str(case["user"]["_id"])
+            if case["lab_report"]:
+                future = upload(case["lab_report"], f"appointments/{appt_id}", "raw", case["lab_report_hash"], owner)
+                futures.append((future, (index, "lab_report", None)))
+            for img_index, (img, img_hash) in enumerate(zip(case["visual_symptoms"], case["image_hashes"])):
+                future = upload(img, f"appointments/{appt_id}/images", "auto", img_hash, owner)
+                futures.append((future, (index, "visual_symptoms", img_index)))
+
+        for future, (index, kind, img_index) in futures:
+            url = future.result()
+            if kind == "lab_report":
+                uploads[index]["lab_report"] = url
+            else:
+                uploads[index]["visual_symptoms"][img_index] = url
+
+    return uploads
+
+# ----------------------------
+# STEP 5: INSERT APPOINTMENTS
+# ----------------------------
+def build_appointment_documents(cases, appt_ids, uploads):
+    created_at = datetime.utcnow()
+    documents = []
+    for case, appt_id, upload in zip(cases, appt_ids, uploads):
+        # Each case gets its own trace; workflow1 and finalization record into it
+        with tracing.span("appointment.intake", appointment_id=appt_id, source="batch_intake") as span:
+            traceparent = span.traceparent
+        documents.append({
+            "appointment_id": appt_id,
+            "user_id": case["user"]["_id"],
+            "created_at": created_at,
+            "updated_at": created_at,
+            "status": "pending",  # will change after AI runs
+            "source": "batch_intake",
+            "fingerprint": case["fingerprint"],
+            "urgency": dict(zip(("level", "reasons"), classify_urgency(case))),
+            "traceparent": traceparent,
+            "inputs": {
+                "symptoms": case["symptoms"],
+                "recent_medications": case["recent_medications"],
+                "regular_medications": case["regular_medications"],
+                "important_notes": case["important_notes"],
+                "lab_report": upload["lab_report"],
+                "visual_symptoms": upload["visual_symptoms"]
+            }
+        })
+    return documents
+
+# ----------------------------
+# STEP 6: ENQUEUE WORKFLOW 1
+# ----------------------------
+def enqueue_workflows(config, appt_ids):
+    """
+    Queues workflow1 for each inserted appointment on the workflow engine,
+    which orders them by urgency. Returns the number queued.
+    """
+    queued = 0
+    for appt_id in appt_ids:
+        try:
+            if workflow_client.enqueue_appointment(config, appt_id):
+                queued += 1
+            else:
+                print(f"❌ Appointment #{appt_id} is no longer pending, not queued")
+        except Exception as e:
+            print(f"❌ Could not queue appointment #{appt_id}:", e)
+    print(f"✅ Queued workflow1 for {queued}/{len(appt_ids)} appointments")
+    return queued
+
+
+def wait_for_local_workflows(config):
+    # Without a service the engine runs in this process, which must not exit before the queue drains
+    if not config.get("WORKFLOW_SERVICE_URL"):
+        print("Running workflow1 in-process; waiting for the queue to drain...")
+        get_local_service(config).shutdown(wait=True)
+
+
+def pending_batch_appointments(db):
+    """Ids of batch-intake appointments still waiting for workflow1 (e.g. inserted with --no-run)."""
+    cursor = db.new_appointments.find({"status": "pending", "source": "batch_intake"}, {"appointment_id": 1}).sort("appointment_id", 1)
+    return [appt["appointment_id"] for appt in cursor]
+
+# ----------------------------
+# STEP 7: MAIN RUNNER
+# ----------------------------
+def run_batch_intake(db, manifest_path, strict=False, dry_run=False, run_workflows=True, upload_workers=8, config=None):
+    started = time.perf_counter()
+    cases = load_manifest(manifest_path)
+    valid_cases, errors = validate_manifest(cases, db.users, max_attachment_mb=(config or DEFAULTS)["ATTACHMENT_MAX_MB"])
+
+    for row_number, row_errors in errors:
+        print(f"❌ Row {row_number}: " + "; ".join(row_errors))
+
+    if errors and strict:
+        print("❌ Manifest has invalid rows, nothing was submitted (--strict).")
+        return []
+    if dry_run or not valid_cases:
+        print(f"{len(valid_cases)} valid / {len(errors)} invalid rows. Nothing submitted.")
+        return []
+
+    window_seconds = (config or DEFAULTS)["SUBMISSION_DEDUP_WINDOW_SECONDS"]
+    valid_cases, appt_ids = claim_cases(db, valid_cases, window_seconds)
+    if not valid_cases:
+        print("Every case was a duplicate. Nothing submitted.")
+        return []
+
+    try:
+        uploads = upload_attachments(valid_cases, appt_ids, max_workers=upload_workers, db=db)
+        documents = build_appointment_documents(valid_cases, appt_ids, uploads)
+        db.new_appointments.insert_many(documents)
+    except Exception:
+        # Cases left without an appointment can be resubmitted by rerunning the manifest
+        for case, appt_id in zip(valid_cases, appt_ids):
+            release_submission(db, case["fingerprint"], appt_id)
+        raise
+    print(f"✅ Inserted appointments #{appt_ids[0]}-#{appt_ids[-1]} in {time.perf_counter() - started:.1f}s")
+
+    if run_workflows:
+        enqueue_workflows(config or load_config(), appt_ids)
+
+    return appt_ids
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Submit many appointments from a CSV/JSON manifest.")
+    parser.add_argument("manifest", nargs="?", help="Path to the CSV or JSON manifest")
+    parser.add_argument("--strict", action="store_true", help="Abort if any row is invalid")
+    parser.add_argument("--dry-run", action="store_true", help="Only validate the manifest")
+    parser.add_argument("--no-run", action="store_true", help="Insert appointments without starting workflow1 (queue them later with --resume)")
+    parser.add_argument("--resume", action="store_true", help="Queue workflow1 for batch appointments still pending, instead of reading a manifest")
+    parser.add_argument("--upload-workers", type=int, default=8, help="Concurrent Cloudinary uploads")
+    args = parser.parse_args(argv)
+    if not args.manifest and not args.resume:
+        parser.error("a manifest is required unless --resume is given")
+
+    config = load_config()
+    configure_cloudinary(config)
+    tracing.configure_tracing(config, service="batch-intake")
+    db = get_db(config)
+
+    if args.resume:
+        appt_ids = pending_batch_appointments(db)
+        queued = enqueue_workflows(config, appt_ids)
+        wait_for_local_workflows(config)
+        return 0 if queued == len(appt_ids) else 1
+
+    appt_ids = run_batch_intake(
+        db,
+        args.manifest,
+        strict=args.strict,
+        dry_run=args.dry_run,
+        run_workflows=not args.no_run,
+        upload_workers=args.upload_workers,
+        config=config
+    )
+    if appt_ids and not args.no_run:
+        wait_for_local_workflows(config)
+    return 0 if appt_ids or args.dry_run else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
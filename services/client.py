@@ -0,0 +1,98 @@
+"""
+Thin client used by the Streamlit pages to talk to the workflow engine.
+
+When WORKFLOW_SERVICE_URL is configured, calls go to the remote service over
+HTTP; otherwise the engine runs in-process in a shared bounded worker pool.
+"""
+import requests
+
+from services.workflow_service import get_local_service
+from utils import tracing
+
+REQUEST_TIMEOUT = 10
+
+
+def _headers(config):
+    token = config.get("WORKFLOW_SERVICE_TOKEN")
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    # The service continues the caller's trace
+    return tracing.inject(headers)
+
+
+def submit_appointment(config, user_id, inputs, appointment_id=None, claimed_fingerprint=None):
+    """Returns the appointment_id the submission ended up on (an earlier one if it was a duplicate)."""
+    service_url = config.get("WORKFLOW_SERVICE_URL")
+    if not service_url:
+        return get_local_service(config).submit_appointment(
+            user_id, inputs, appointment_id=appointment_id, claimed_fingerprint=claimed_fingerprint
+        )["appointment_id"]
+
+    with tracing.child("http POST /appointments"):
+        response = requests.post(
+            f"{service_url.rstrip('/')}/appointments",
+            json={
+                "user_id": str(user_id),
+                "inputs": inputs,
+                "appointment_id": appointment_id,
+                "source": "web",
+                "fingerprint": claimed_fingerprint
+            },
+            headers=_headers(config),
+            timeout=REQUEST_TIMEOUT
+        )
+    response.raise_for_status()
+    return response.json()["appointment_id"]
+
+
+def enqueue_appointment(config, appointment_id):
+    """Queues workflow1 for an inserted pending appointment; False if it is no longer pending."""
+    service_url = config.get("WORKFLOW_SERVICE_URL")
+    if not service_url:
+        return get_local_service(config).enqueue_appointment(appointment_id) is not None
+
+    with tracing.child("http POST /enqueue"):
+        response = requests.post(
+            f"{service_url.rstrip('/')}/appointments/{appointment_id}/enqueue",
+            json={},
+            headers=_headers(config),
+            timeout=REQUEST_TIMEOUT
+        )
+    if response.status_code == 409:
+        return False
+    response.raise_for_status()
+    return True
+
+
+def finalize_appointment(config, appointment_id, suggestions, comments, doctor_name):
+    """Returns True when finalization was started, False if the case was no longer pending review."""
+    service_url = config.get("WORKFLOW_SERVICE_URL")
+    if not service_url:
+        return get_local_service(config).finalize_appointment(appointment_id, suggestions, comments, doctor_name) is not None
+
+    with tracing.child("http POST /finalize"):
+        response = requests.post(
+            f"{service_url.rstrip('/')}/appointments/{appointment_id}/finalize",
+            json={"suggestions": suggestions, "comments": comments, "doctor_name": doctor_name},
+            headers=_headers(config),
+            timeout=REQUEST_TIMEOUT
+        )
+    if response.status_code == 409:
+        return False
+    response.raise_for_status()
+    return True
+
+
+def get_status(config, appointment_id):
+    service_url = config.get("WORKFLOW_SERVICE_URL")
+    if not service_url:
+        return get_local_service(config).get_status(appointment_id)
+
+    response = requests.get(
+        f"{service_url.rstrip('/')}/appointments/{appointment_id}",
+        headers=_headers(config),
+        timeout=REQUEST_TIMEOUT
+    )
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return response.json()
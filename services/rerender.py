@@ -0,0 +1,235 @@
+"""
+Batch re-render of final report PDFs, e.g. after a template or font change.
+
+Usage (from the project root):
+    python -m services.rerender [--workers 4] [--upload-workers 8] [--batch-size 64]
+    python -m services.rerender --dry-run --limit 200     # render only, measure throughput
+    python -m services.rerender --restart                 # ignore the checkpoint
+    python -m services.rerender --allow-missing-devanagari   # render with a font without Devanagari
+
+Completed appointments are streamed from both tiers in appointment_id order, a
+batch at a time, with their final report text fetched from the report store in
+one query per batch. PDFs are rendered by generate_pdf in a process pool (FPDF
+is pure Python and CPU-bound); each finished PDF is uploaded from a thread
+pool while the rest of the batch renders, and the batch's new URLs are written
+in one bulk update. After every batch the last appointment_id done per tier is
+checkpointed to RERENDER_STATE_FILE, so an interrupted run resumes where it
+stopped. Appointments that failed are kept in the checkpoint and retried first.
+Without a report font that has Devanagari glyphs, every Hindi name in the
+history would be re-uploaded as "?", so the run refuses to start unless told to.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+from utils.cloudinary_utils import configure_cloudinary, upload_pdf_to_cloudinary
+from utils.pdf_generator import DEVANAGARI_SAMPLE, find_report_font, generate_pdf
+from utils.report_store import attach_reports
+
+TIERS = ("new_appointments", "archived_appointments")
+PROJECTION = {"appointment_id": 1, "reports.final": 1, "final_report": 1}
+
+# ----------------------------
+# STEP 1: CHECKPOINT
+# ----------------------------
+def new_state():
+    return {"last_id": {tier: 0 for tier in TIERS}, "failed": {tier: [] for tier in TIERS}, "done": 0}
+
+
+def load_state(path):
+    try:
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return new_state()
+
+
+def save_state(path, state):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(state, file)
+    os.replace(tmp_path, path)
+
+# ----------------------------
+# STEP 2: STREAM APPOINTMENTS
+# ----------------------------
+def stream_batches(db, tier, state, batch_size):
+    """Batches of completed appointments after the checkpoint, retried failures first."""
+    collection = db[tier]
+    failed = state["failed"][tier]
+    if failed:
+        yield list(collection.find({"appointment_id": {"$in": failed}, "status": "completed"}, PROJECTION))
+
+    cursor = collection.find(
+        {"status": "completed", "appointment_id": {"$gt": state["last_id"][tier]}},
+        PROJECTION,
+        sort=[("appointment_id", 1)],
+        batch_size=batch_size
+    )
+    batch = []
+    for appt in cursor:
+        batch.append(appt)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# ----------------------------
+# STEP 3: RENDER + UPLOAD
+# ----------------------------
+def render(final_markdown, appointment_id, font_file):
+    # Runs in the render processes; the file name keeps it apart from a live finalization's PDF
+    return generate_pdf(final_markdown, f"{appointment_id}_rerender", font_file=font_file)
+
+
+def upload(pdf_path, appointment_id):
+    try:
+        return upload_pdf_to_cloudinary(pdf_path, folder=f"appointments/{appointment_id}/final_report")
+    finally:
+        os.remove(pdf_path)
+
+
+def process_batch(db, tier, batch, render_pool, upload_pool, font_file, dry_run=False):
+    """Renders and uploads one batch; returns (done ids, failed ids)."""
+    attach_reports(db, batch, "final")
+    done, failed, updates = [], [], []
+
+    renders = {}
+    for appt in batch:
+        if appt.get("final_report"):
+            renders[render_pool.submit(render, appt["final_report"], appt["appointment_id"], font_file)] = appt
+        else:
+            print(f"❌ Appointment #{appt['appointment_id']} has no final report text, skipped")
+            done.append(appt["appointment_id"])
+
+    uploads = {}
+    for future in as_completed(renders):
+        appt = renders[future]
+        try:
+            pdf_path = future.result()
+        except Exception as e:
+            print(f"❌ Render failed for appointment #{appt['appointment_id']}:", e)
+            failed.append(appt["appointment_id"])
+            continue
+        if dry_run:
+            os.remove(pdf_path)
+            done.append(appt["appointment_id"])
+        else:
+            uploads[upload_pool.submit(upload, pdf_path, appt["appointment_id"])] = appt
+
+    for future in as_completed(uploads):
+        appt = uploads[future]
+        try:
+            pdf_url = future.result()
+        except Exception as e:
+            print(f"❌ Upload failed for appointment #{appt['appointment_id']}:", e)
+            failed.append(appt["appointment_id"])
+            continue
+        updates.append(UpdateOne(
+            {"_id": appt["_id"]},
+            {"$set": {"final_report_pdf_url": pdf_url, "final_report_pdf_rendered_at": datetime.utcnow()}}
+        ))
+        done.append(appt["appointment_id"])
+
+    if updates:
+        db[tier].bulk_write(updates, ordered=False)
+    return done, failed
+
+# ----------------------------
+# STEP 4: MAIN RUNNER
+# ----------------------------
+def rerender_reports(db, config, workers=4, upload_workers=8, batch_size=64, limit=None, dry_run=False, restart=False, allow_missing_devanagari=False):
+    font_file = find_report_font(config["PDF_FONT_FILE"], DEVANAGARI_SAMPLE)
+    if font_file is None:
+        if not allow_missing_devanagari:
+            raise ValueError("❌ No report font with Devanagari glyphs found: set PDF_FONT_FILE (e.g. NotoSansDevanagari-Regular.ttf) or pass --allow-missing-devanagari")
+        font_file = find_report_font(config["PDF_FONT_FILE"])
+    state_path = config["RERENDER_STATE_FILE"]
+    state = new_state() if restart or dry_run else load_state(state_path)
+    print(f"Rendering with {font_file or 'the built-in latin-1 font'}, {workers} render processes")
+
+    started = time.perf_counter()
+    processed = failures = 0
+    render_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    upload_pool = ThreadPoolExecutor(max_workers=upload_workers)
+    try:
+        for tier in TIERS:
+            for batch in stream_batches(db, tier, state, batch_size):
+                if limit is not None:
+                    batch = batch[:limit - processed]
+                if not batch:
+                    break
+                retried = set(state["failed"][tier])
+                done, failed = process_batch(db, tier, batch, render_pool, upload_pool, font_file, dry_run)
+                processed += len(batch)
+                failures += len(failed)
+
+                # Only ids past the checkpoint move it; retried ones just leave the failed list when they succeed
+                state["failed"][tier] = sorted((retried - set(done)) | set(failed))
+                fresh = [appt["appointment_id"] for appt in batch if appt["appointment_id"] not in retried]
+                if fresh:
+                    state["last_id"][tier] = max(state["last_id"][tier], max(fresh))
+                state["done"] += len(done)
+                if not dry_run:
+                    save_state(state_path, state)
+
+                elapsed = time.perf_counter() - started
+                print(f"{tier}: up to #{state['last_id'][tier]}, {processed} reports in {elapsed:.1f}s ({processed / elapsed:.1f} reports/s)")
+                if limit is not None and processed >= limit:
+                    break
+            if limit is not None and processed >= limit:
+                break
+    finally:
+        render_pool.shutdown(cancel_futures=True)
+        upload_pool.shutdown()
+
+    elapsed = time.perf_counter() - started
+    rate = processed / elapsed if elapsed else 0.0
+    print(f"✅ {processed - failures} re-rendered, {failures} failed in {elapsed:.1f}s ({rate:.1f} reports/s)")
+    return processed - failures, failures
+
+
+def main(argv=None):
+    from utils.config import load_config
+    from utils.db import get_db
+
+    parser = argparse.ArgumentParser(description="Re-render and re-upload final report PDFs.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Render processes")
+    parser.add_argument("--upload-workers", type=int, default=8, help="Concurrent Cloudinary uploads")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--limit", type=int, help="Stop after this many appointments")
+    parser.add_argument("--dry-run", action="store_true", help="Render only: no upload, no update, no checkpoint")
+    parser.add_argument("--restart", action="store_true", help="Start from the first appointment, ignoring the checkpoint")
+    parser.add_argument("--allow-missing-devanagari", action="store_true", help="Re-render even if no report font has Devanagari glyphs")
+    args = parser.parse_args(argv)
+
+    config = load_config(use_streamlit_secrets=False)
+    configure_cloudinary(config)
+    try:
+        _, failures = rerender_reports(
+            get_db(config),
+            config,
+            workers=args.workers,
+            upload_workers=args.upload_workers,
+            batch_size=args.batch_size,
+            limit=args.limit,
+            dry_run=args.dry_run,
+            restart=args.restart,
+            allow_missing_devanagari=args.allow_missing_devanagari
+        )
+    except ValueError as e:
+        raise SystemExit(str(e))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""
+Urgency-aware scheduler for the AI workflow jobs.
+
+Jobs wait in one FIFO queue per urgency level (see
+AI_workflows.extraction.urgency.LEVELS, most urgent first) and a fixed set of
+worker threads always starts the job with the best effective priority: its
+level, promoted by one level for every `aging_seconds` it has waited, so a
+stream of urgent cases cannot starve routine ones. Ties go to the more urgent
+queue, then to the older job.
+
+The interface mirrors ThreadPoolExecutor, with the priority as the first
+argument of submit(). Wait times (submit to start) are kept per queue.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from AI_workflows.extraction.urgency import LEVELS
+
+WAIT_HISTORY_SIZE = 1000
+
+
+class PriorityScheduler:
+    def __init__(self, workers, aging_seconds, levels=LEVELS, thread_name_prefix="scheduler"):
+        self.levels = levels
+        self.aging_seconds = aging_seconds
+        self.queues = [deque() for _ in levels]
+        self.waits = [deque(maxlen=WAIT_HISTORY_SIZE) for _ in levels]
+        self.started = [0] * len(levels)
+        self.condition = threading.Condition()
+        self.shutting_down = False
+        self.threads = [
+            threading.Thread(target=self._worker, name=f"{thread_name_prefix}_{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, priority, fn, *args, **kwargs):
+        """Queues fn(*args, **kwargs) at `priority` (an index into levels); returns a Future."""
+        future = Future()
+        with self.condition:
+            if self.shutting_down:
+                raise RuntimeError("cannot schedule new jobs after shutdown")
+            self.queues[priority].append((time.monotonic(), future, fn, args, kwargs))
+            self.condition.notify()
+        return future
+
+    def _effective_priority(self, level, enqueued, now):
+        if not self.aging_seconds:
+            return level
+        return level - int((now - enqueued) / self.aging_seconds)
+
+    def _next_job(self):
+        # Caller holds the condition; each queue's head is its oldest job
+        now = time.monotonic()
+        _, level = min(
+            ((self._effective_priority(level, queue[0][0], now), level, queue[0][0]), level)
+            for level, queue in enumerate(self.queues) if queue
+        )
+        job = self.queues[level].popleft()
+        self.waits[level].append(now - job[0])
+        self.started[level] += 1
+        return job
+
+    def _worker(self):
+        while True:
+            with self.condition:
+                while not any(self.queues) and not self.shutting_down:
+                    self.condition.wait()
+                if not any(self.queues):
+                    return
+                _, future, fn, args, kwargs = self._next_job()
+
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def metrics(self):
+        """Per queue: jobs waiting, jobs started, and wait-time percentiles over recent starts."""
+        now = time.monotonic()
+        with self.condition:
+            rows = {}
+            for level, name in enumerate(self.levels):
+                waits = sorted(self.waits[level])
+                queue = self.queues[level]
+                rows[name] = {
+                    "queued": len(queue),
+                    "started": self.started[level],
+                    "oldest_waiting_s": now - queue[0][0] if queue else 0.0,
+                    "wait_p50_s": waits[len(waits) // 2] if waits else None,
+                    "wait_p95_s": waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else None,
+                    "wait_max_s": waits[-1] if waits else None,
+                }
+        return rows
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        with self.condition:
+            self.shutting_down = True
+            if cancel_futures:
+                for queue in self.queues:
+                    while queue:
+                        queue.popleft()[1].cancel()
+            self.condition.notify_all()
+        if wait:
+            for thread in self.threads:
+                thread.join()
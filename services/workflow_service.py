@@ -0,0 +1,484 @@
+"""
+Headless diagnostic engine with a small HTTP API.
+
+Usage (from the project root):
+    python -m services.workflow_service --port 8080 --workers 4
+
+Configuration is read from environment variables (or an injected dict when
+embedded); no Streamlit runtime is needed. Appointment state lives in MongoDB,
+so several replicas can run behind a load balancer and answer each other's polls.
+
+    POST /appointments                    submit an appointment, returns 202
+    POST /appointments/<id>/enqueue       run workflow1 for an inserted pending appointment
+    GET  /appointments/<id>               poll status
+    GET  /appointments/<id>/report        fetch intermediate/final report
+    POST /appointments/<id>/finalize      doctor validation, starts workflow2
+    GET  /scheduler                       per-urgency queue depth and wait times
+    GET  /health
+"""
+import argparse
+import hmac
+import ipaddress
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bson.objectid import ObjectId
+
+from AI_workflows.extraction.urgency import classify_urgency, urgency_rank
+from services.scheduler import PriorityScheduler
+from utils import tracing
+from utils.appointments import (
+    adopt_speculation, allocate_appointment_ids, build_personal_data, complete_final_report, likely_finalizing_doctor,
+    run_crew_async, run_final_report_async, run_speculative_final_report, trace_parent
+)
+from utils.cloudinary_utils import configure_cloudinary
+from utils.config import load_config, require, REQUIRED_KEYS
+from utils.db import get_db
+from utils.assets import hash_for_url
+from utils.idempotency import claim_submission, compute_fingerprint, find_duplicate, release_submission
+from utils.report_store import KINDS, get_report
+from utils.tiering import find_appointment
+
+STATUS_FIELDS = {"_id": 0, "appointment_id": 1, "status": 1, "urgency": 1, "created_at": 1, "finalized_at": 1}
+REPORT_FIELDS = {"_id": 0, "appointment_id": 1, "status": 1, "reports": 1, "intermediate_report": 1, "final_report": 1, "final_report_pdf_url": 1}
+INPUT_FIELDS = ["symptoms", "recent_medications", "regular_medications", "important_notes", "lab_report", "visual_symptoms"]
+DEFAULT_HOST = "127.0.0.1"
+
+
+# === Appointment Operations ===
+def create_appointment(db, user_id, inputs, appointment_id=None, source="web", fingerprint=None):
+    level, reasons = classify_urgency(inputs)
+    now = datetime.utcnow()
+    appointment_data = {
+        "appointment_id": appointment_id or allocate_appointment_ids(db, 1)[0],
+        "user_id": user_id,
+        "created_at": now,
+        "updated_at": now,
+        "status": "pending",  # will change after AI runs
+        "source": source,
+        "fingerprint": fingerprint,
+        "urgency": {"level": level, "reasons": reasons},
+        # Later steps, in any process, record their spans into this trace
+        "traceparent": tracing.current_traceparent(),
+        "inputs": {field: inputs.get(field) for field in INPUT_FIELDS}
+    }
+    appointment_data["inputs"]["visual_symptoms"] = appointment_data["inputs"]["visual_symptoms"] or []
+    db.new_appointments.insert_one(appointment_data)
+    return appointment_data
+
+
+def mark_for_finalization(db, appointment_id, suggestions, comments, doctor_name=None):
+    # Only a case waiting for review can be finalized; a double click finds nothing to update
+    return db.new_appointments.find_one_and_update(
+        {"appointment_id": appointment_id, "status": "pending_doctor_review"},
+        {
+            "$set": {
+                "suggestions_for_modifications": suggestions,
+                "doctor_comments": comments,
+                "doctor_name": doctor_name,
+                "status": "generating_final_report",
+                "finalized_at": datetime.utcnow(),
+                "updated_at": datetime.utcnow()
+            }
+        }
+    )
+
+
+def _traced_job(fn, name):
+    """fn, run in the submitter's trace context, recording how long it waited for a worker."""
+    queued_ns = time.time_ns()
+    parent = tracing.current_traceparent()
+    bound = tracing.bind(fn)
+
+    def job(*args, **kwargs):
+        tracing.record("queued", queued_ns, time.time_ns(), parent=parent, job=name)
+        return bound(*args, **kwargs)
+    return job
+
+
+def _draft_result(future):
+    # A cancelled or failed draft only means the final report is generated from scratch
+    if future.cancelled() or future.exception() is not None:
+        return None
+    return future.result()
+
+
+def _lower_thread_priority():
+    # Linux applies nice values per thread; elsewhere drafts simply run at normal priority
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+    except (AttributeError, OSError):
+        pass
+
+
+class WorkflowService:
+    """
+    Runs workflow1/workflow2 for appointments in a bounded worker pool, most
+    urgent cases first (with aging, so routine ones still progress).
+    Once a case reaches doctor review, its no-suggestion final report is drafted
+    in a small low-priority pool so an unchanged approval completes instantly.
+    """
+
+    def __init__(self, config, workers=None):
+        self.config = config
+        self.db = get_db(config)
+        self.executor = PriorityScheduler(
+            workers or config["WORKFLOW_WORKERS"],
+            config["SCHEDULER_AGING_SECONDS"],
+            thread_name_prefix="workflow"
+        )
+        self.speculation_executor = ThreadPoolExecutor(
+            max_workers=config["SPECULATIVE_WORKERS"],
+            thread_name_prefix="speculative",
+            initializer=_lower_thread_priority
+        )
+        self.speculations = {}  # appointment_id -> (Future of a draft still running, Event that cancels it)
+        self.queued = set()  # appointment_ids whose workflow1 is queued or running here
+        self.queued_lock = threading.Lock()
+        configure_cloudinary(config)
+        tracing.configure_tracing(config)
+
+    def submit_appointment(self, user_id, inputs, appointment_id=None, source="web", claimed_fingerprint=None):
+        """
+        Creates the appointment and queues workflow1. Callers that already
+        claimed a fingerprint (the Streamlit page, batch intake) pass it in;
+        otherwise the submission is fingerprinted here, and a duplicate within
+        the dedup window returns the earlier appointment with `duplicate=True`.
+        """
+        with tracing.span("workflow_service.submit", source=source) as span:
+            user = self.db.users.find_one({"_id": user_id})
+            if not user:
+                raise LookupError(f"Unknown user {user_id}")
+
+            fingerprint, owns_claim = claimed_fingerprint, False
+            if fingerprint is None:
+                fingerprint = compute_fingerprint(
+                    user_id,
+                    inputs,
+                    self._content_hash(inputs.get("lab_report")),
+                    [self._content_hash(url) for url in inputs.get("visual_symptoms") or []]
+                )
+                window_seconds = self.config["SUBMISSION_DEDUP_WINDOW_SECONDS"]
+                duplicate_of = find_duplicate(self.db, fingerprint, window_seconds)
+                if duplicate_of is None:
+                    appointment_id = appointment_id or allocate_appointment_ids(self.db, 1)[0]
+                    duplicate_of = claim_submission(self.db, fingerprint, appointment_id, window_seconds)
+                    owns_claim = duplicate_of is None
+                if duplicate_of is not None:
+                    span.set(appointment_id=duplicate_of, duplicate=True)
+                    existing = self.get_status(duplicate_of) or {"appointment_id": duplicate_of, "status": "pending"}
+                    return dict(existing, duplicate=True)
+
+            try:
+                appointment_data = create_appointment(self.db, user_id, inputs, appointment_id, source, fingerprint)
+            except Exception:
+                if owns_claim:
+                    release_submission(self.db, fingerprint, appointment_id)
+                raise
+            span.set(appointment_id=appointment_data["appointment_id"], urgency=appointment_data["urgency"]["level"])
+            self._queue_workflow1(user, appointment_data)
+            return appointment_data
+
+    def enqueue_appointment(self, appointment_id):
+        """
+        Queues workflow1 for an appointment already inserted as `pending`
+        (batch intake, or one whose run was lost with a stopped process), in
+        the same urgency queues as submissions. Returns the appointment, or
+        None when it is not pending. One already queued here is not queued again.
+        """
+        appt = self.db.new_appointments.find_one({"appointment_id": appointment_id, "status": "pending"})
+        if appt is None:
+            return None
+        with tracing.span("workflow_service.enqueue", parent=trace_parent(appt), appointment_id=appointment_id) as span:
+            user = self.db.users.find_one({"_id": appt["user_id"]})
+            if not user:
+                raise LookupError(f"Unknown user {appt['user_id']}")
+            if not (appt.get("urgency") or {}).get("level"):
+                level, reasons = classify_urgency(appt.get("inputs") or {})
+                appt["urgency"] = {"level": level, "reasons": reasons}
+            span.set(urgency=appt["urgency"]["level"])
+            self._queue_workflow1(user, appt)
+        return appt
+
+    def _queue_workflow1(self, user, appointment_data):
+        with self.queued_lock:
+            if appointment_data["appointment_id"] in self.queued:
+                return
+            self.queued.add(appointment_data["appointment_id"])
+        priority = urgency_rank(appointment_data["urgency"]["level"])
+        self.executor.submit(priority, _traced_job(self._run_workflow1, "workflow1"), build_personal_data(user), appointment_data)
+
+    def _content_hash(self, url):
+        # Attachments arrive as URLs in per-appointment folders; their content hash is what repeats
+        return (hash_for_url(self.db, url) or url) if url else None
+
+    def _run_workflow1(self, personal_data, appointment_data):
+        try:
+            output = run_crew_async(self.db.new_appointments, personal_data, appointment_data, appointment_data["_id"], self.config)
+        finally:
+            with self.queued_lock:
+                self.queued.discard(appointment_data["appointment_id"])
+        if output and self.config["SPECULATIVE_FINAL_REPORT"]:
+            self.speculate(appointment_data["appointment_id"])
+
+    def speculate(self, appointment_id):
+        """Queues the no-suggestion draft of a case pending review."""
+        appt = self.db.new_appointments.find_one({"appointment_id": appointment_id, "status": "pending_doctor_review"})
+        doctor_name = likely_finalizing_doctor(self.db.new_appointments)
+        if appt is None or doctor_name is None:
+            return None
+        cancelled = threading.Event()
+        future = self.speculation_executor.submit(
+            _traced_job(run_speculative_final_report, "final_report.speculative"), self.db.new_appointments, appt, doctor_name, self.config, cancelled
+        )
+        self.speculations[appointment_id] = (future, cancelled)
+        future.add_done_callback(lambda done: self._forget_speculation(appointment_id, done))
+        return future
+
+    def _forget_speculation(self, appointment_id, future):
+        # A finished draft is on the appointment (if it was still pending review); _finalize reads it from there
+        if self.speculations.get(appointment_id, (None, None))[0] is future:
+            self.speculations.pop(appointment_id, None)
+
+    def finalize_appointment(self, appointment_id, suggestions, comments, doctor_name):
+        appt = mark_for_finalization(self.db, appointment_id, suggestions, comments, doctor_name)
+        if appt is None:
+            return None
+        with tracing.span("workflow_service.finalize", parent=trace_parent(appt), appointment_id=appointment_id):
+            return self._finalize(appt, suggestions, doctor_name)
+
+    def _finalize(self, appt, suggestions, doctor_name):
+        appointment_id = appt["appointment_id"]
+        priority = urgency_rank((appt.get("urgency") or {}).get("level"))
+        # A finished draft is read from the appointment; only one still running is in self.speculations
+        future, cancelled = self.speculations.pop(appointment_id, (None, None))
+        speculation = appt.get("speculative_final_report")
+        if (suggestions or "").strip():
+            # The draft is discarded; one already running stops at its next LLM call
+            if future is not None:
+                future.cancel()
+                cancelled.set()
+            speculation = None
+        elif future is not None and not future.cancel():
+            if not future.done():
+                # Draft in flight: finish from it rather than generating the report twice
+                final_report_job = _traced_job(run_final_report_async, "final_report")
+                future.add_done_callback(lambda done: self.executor.submit(
+                    priority, final_report_job, self.db.new_appointments, appt, suggestions, doctor_name, self.config, _draft_result(done)
+                ))
+                return appt
+            # Finished between the doctor's click and now: too late to be stored on the appointment
+            speculation = speculation or _draft_result(future)
+
+        final_markdown, pdf_url, report = adopt_speculation(self.db, speculation, doctor_name)
+        if report is not None:
+            complete_final_report(self.db.new_appointments, appt, final_markdown, pdf_url, self.config, report)
+        else:
+            self.executor.submit(priority, _traced_job(run_final_report_async, "final_report"), self.db.new_appointments, appt, suggestions, doctor_name, self.config, speculation)
+        return appt
+
+    def get_status(self, appointment_id):
+        return find_appointment(self.db, {"appointment_id": appointment_id}, STATUS_FIELDS)
+
+    def get_report(self, appointment_id):
+        appt = find_appointment(self.db, {"appointment_id": appointment_id}, REPORT_FIELDS)
+        if appt is None:
+            return None
+        for kind in KINDS:
+            appt[f"{kind}_report"] = get_report(self.db, appt, kind)
+        appt.pop("reports", None)
+        return appt
+
+    def scheduler_metrics(self):
+        return self.executor.metrics()
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.speculation_executor.shutdown(wait=False, cancel_futures=True)
+        self.executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+
+# === HTTP API ===
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat() + "Z"
+    return str(value)
+
+
+def make_handler(service):
+
+    class WorkflowRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, status, payload):
+            body = json.dumps(payload, default=_json_default).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_json(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(payload, dict):
+                raise ValueError("body must be a JSON object")
+            return payload
+
+        def _authorized(self):
+            token = service.config.get("WORKFLOW_SERVICE_TOKEN")
+            supplied = self.headers.get("Authorization") or ""
+            if token and not hmac.compare_digest(supplied.encode(), f"Bearer {token}".encode()):
+                self._send(401, {"error": "unauthorized"})
+                return False
+            return True
+
+        def do_GET(self):
+            if self.path == "/health":
+                return self._send(200, {"status": "ok"})
+            if not self._authorized():
+                return
+            if self.path == "/scheduler":
+                return self._send(200, service.scheduler_metrics())
+
+            match = re.fullmatch(r"/appointments/(\d+)(/report)?", self.path)
+            if not match:
+                return self._send(404, {"error": "not found"})
+
+            appointment_id = int(match.group(1))
+            doc = service.get_report(appointment_id) if match.group(2) else service.get_status(appointment_id)
+            if doc is None:
+                return self._send(404, {"error": f"appointment {appointment_id} not found"})
+            self._send(200, doc)
+
+        def do_POST(self):
+            # Continue the caller's trace (the Streamlit page sends its traceparent)
+            with tracing.span(f"POST {self.path}", parent=self.headers.get("traceparent")) as span:
+                self._post()
+                span.set(status_code=getattr(self, "status_code", None))
+
+        def send_response(self, code, message=None):
+            self.status_code = code
+            super().send_response(code, message)
+
+        def _post(self):
+            if not self._authorized():
+                return
+            try:
+                payload = self._read_json()
+            except ValueError:
+                return self._send(400, {"error": "body must be a JSON object"})
+
+            if self.path == "/appointments":
+                if not ObjectId.is_valid(payload.get("user_id", "")):
+                    return self._send(400, {"error": "user_id must be a valid ObjectId"})
+                appointment_id = payload.get("appointment_id")
+                if appointment_id is not None and (type(appointment_id) is not int or appointment_id <= 0):
+                    return self._send(400, {"error": "appointment_id must be a positive integer"})
+                if not isinstance(payload.get("inputs", {}), dict):
+                    return self._send(400, {"error": "inputs must be a JSON object"})
+                try:
+                    appt = service.submit_appointment(
+                        ObjectId(payload["user_id"]),
+                        payload.get("inputs", {}),
+                        appointment_id=appointment_id,
+                        source=payload.get("source", "api"),
+                        claimed_fingerprint=payload.get("fingerprint")
+                    )
+                except LookupError as e:
+                    return self._send(404, {"error": str(e)})
+                return self._send(200 if appt.get("duplicate") else 202, {
+                    "appointment_id": appt["appointment_id"],
+                    "status": appt["status"],
+                    "duplicate": bool(appt.get("duplicate")),
+                    "status_url": f"/appointments/{appt['appointment_id']}"
+                })
+
+            match = re.fullmatch(r"/appointments/(\d+)/enqueue", self.path)
+            if match:
+                try:
+                    appt = service.enqueue_appointment(int(match.group(1)))
+                except LookupError as e:
+                    return self._send(404, {"error": str(e)})
+                if appt is None:
+                    return self._send(409, {"error": "appointment is not pending"})
+                return self._send(202, {"appointment_id": appt["appointment_id"], "status": appt["status"]})
+
+            match = re.fullmatch(r"/appointments/(\d+)/finalize", self.path)
+            if match:
+                appt = service.finalize_appointment(
+                    int(match.group(1)),
+                    payload.get("suggestions", ""),
+                    payload.get("comments", ""),
+                    payload.get("doctor_name", "")
+                )
+                if appt is None:
+                    return self._send(409, {"error": "appointment is not pending doctor review"})
+                return self._send(202, {"appointment_id": appt["appointment_id"], "status": "generating_final_report"})
+
+            self._send(404, {"error": "not found"})
+
+        def log_message(self, format, *args):
+            print(f"[workflow-service] {self.address_string()} - {format % args}")
+
+    return WorkflowRequestHandler
+
+
+def is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def serve(config, host=DEFAULT_HOST, port=8080, workers=None):
+    require(config, *REQUIRED_KEYS)
+    # Reports and finalization must not be reachable from the network without auth
+    if not is_loopback(host) and not config.get("WORKFLOW_SERVICE_TOKEN"):
+        raise ValueError(f"❌ Refusing to listen on {host} without WORKFLOW_SERVICE_TOKEN")
+    tracing.configure_tracing(config, service="workflow-service")
+    service = WorkflowService(config, workers=workers)
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    print(f"✅ Workflow service listening on {host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+# === Shared in-process instance (used when no WORKFLOW_SERVICE_URL is set) ===
+_local_service = None
+_local_service_lock = threading.Lock()
+
+
+def get_local_service(config):
+    global _local_service
+    if _local_service is None:
+        with _local_service_lock:
+            if _local_service is None:
+                _local_service = WorkflowService(config)
+    return _local_service
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the RogiMitra.AI workflow service.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Non-loopback hosts require WORKFLOW_SERVICE_TOKEN")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=None, help="Concurrent crew runs (default WORKFLOW_WORKERS)")
+    args = parser.parse_args(argv)
+
+    serve(load_config(use_streamlit_secrets=False), host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+from datetime import date, datetime
+from pymongo import ReturnDocument
+
+from utils import tracing
+from utils.pdf_generator import generate_pdf
+from utils.cloudinary_utils import upload_pdf_to_cloudinary
+from utils.config import get_config
+from utils.report_store import get_report, load_reports, save_report
+from utils.tiering import max_appointment_id
+
+# === Helper Functions ===
+def calculate_age(born):
+    today = date.today()
+    return today.year - born.year - ((today.month, today.day) < (born.month, born.day))
+
+def build_personal_data(user):
+    dob_date = datetime.strptime(user['dob'], '%Y-%m-%d').date()
+    return {
+        "name": user["name"],
+        "dob": user["dob"],
+        "age": calculate_age(dob_date),
+        "weight": user["weight"],
+        "height": user["height"]
+    }
+
+# === Appointment ID Allocation ===
+def allocate_appointment_ids(db, count=1):
+    """
+    Reserves `count` consecutive appointment ids with a single atomic $inc on
+    the counters collection, so concurrent submitters never share an id.
+    The counter is seeded from the highest existing appointment_id (in either tier) on first use.
+    """
+    counter = db.counters.find_one_and_update(
+        {"_id": "appointment_id"},
+        {"$inc": {"seq": count}},
+        return_document=ReturnDocument.AFTER
+    )
+    if counter is None:
+        db.counters.update_one(
+            {"_id": "appointment_id"},
+            {"$max": {"seq": max_appointment_id(db)}},
+            upsert=True
+        )
+        counter = db.counters.find_one_and_update(
+            {"_id": "appointment_id"},
+            {"$inc": {"seq": count}},
+            return_document=ReturnDocument.AFTER
+        )
+
+    last_id = counter["seq"]
+    return list(range(last_id - count + 1, last_id + 1))
+
+# === Tracing ===
+def trace_parent(appt):
+    # The caller's span when there is one (same request or bound thread), else the appointment's trace
+    return tracing.current_traceparent() or appt.get("traceparent")
+
+# === Async CrewAI Execution ===
+def run_crew_async(appointments_collection, personal_data, appointment_data, inserted_id, config=None):
+    with tracing.span("workflow1", parent=trace_parent(appointment_data), appointment_id=appointment_data["appointment_id"]) as span:
+        try:
+            from AI_workflows.workflow1.crew_logic.crew import run_crew_workflow1
+            output = run_crew_workflow1(personal_data, appointment_data, config=config)
+            span.set(produced_report=bool(output))
+
+            update = {"status": "pending_doctor_review", "updated_at": datetime.utcnow()}
+            if output:
+                # The body goes to the report store; the appointment keeps a reference
+                update["reports.intermediate"] = save_report(appointments_collection.database, appointment_data["appointment_id"], "intermediate", output)
+            appointments_collection.update_one({"_id": inserted_id}, {"$set": update})
+            return output
+        except Exception as e:
+            span.fail(e)
+            print("❌ Error running CrewAI workflow in background:", e)
+            return None
+
+# === Similar-Case Index ===
+def index_completed_case(db, appt, final_markdown, config=None):
+    # Best effort: a failed index update must never fail the finalization
+    try:
+        from AI_workflows.retrieval.case_index import get_case_index, with_patient_names
+        index = get_case_index(config or get_config())
+        if index is not None:
+            # `appt` may be the copy read before finalization recorded the doctor
+            doctor = appt.get("doctor_name") or (db.new_appointments.find_one({"_id": appt["_id"]}, {"doctor_name": 1}) or {}).get("doctor_name")
+            index.add_cases(with_patient_names(db, [dict(appt, final_report=final_markdown, doctor_name=doctor)]))
+    except Exception as e:
+        print("❌ Could not add case to similar-case index:", e)
+
+# === Final Report Completion ===
+def complete_final_report(appointments_collection, appt, final_markdown, pdf_url, config=None, report=None):
+    """`report` is an already stored revision of `final_markdown` (an adopted draft); otherwise it is saved here."""
+    with tracing.span("appointment.complete", parent=trace_parent(appt), appointment_id=appt['appointment_id'], adopted_draft=report is not None):
+        report = report or save_report(appointments_collection.database, appt['appointment_id'], "final", final_markdown)
+        appointments_collection.update_one(
+            {"_id": appt['_id']},
+            {
+                "$set": {
+                    "reports.final": report,
+                    "final_report_pdf_url": pdf_url,
+                    "status": "completed",
+                    "updated_at": datetime.utcnow()
+                },
+                "$unset": {"speculative_final_report": "", "final_report": ""}
+            }
+        )
+    print(f"✅ Final report saved for Appointment #{appt['appointment_id']}")
+    index_completed_case(appointments_collection.database, appt, final_markdown, config)
+
+# === Speculative Final Report ===
+def likely_finalizing_doctor(appointments_collection):
+    # Reviews are not assigned, so the doctor who finalized most recently is the best guess
+    last = appointments_collection.find_one(
+        {"doctor_name": {"$nin": [None, ""]}},
+        {"doctor_name": 1},
+        sort=[("finalized_at", -1)]
+    )
+    return last["doctor_name"] if last else None
+
+def run_speculative_final_report(appointments_collection, appt, doctor_name, config=None, cancelled=None):
+    """
+    Pre-generates the no-suggestion final report and its PDF while the case
+    waits for review. The draft is saved as a draft revision of the final
+    report and referenced from the appointment only while it is still pending
+    review; it is returned (with its text) either way. Setting the `cancelled`
+    event stops the draft at its next LLM call.
+    """
+    with tracing.span("final_report.speculative", parent=trace_parent(appt), appointment_id=appt['appointment_id']) as span:
+        try:
+            from AI_workflows.workflow2.crew_logic.crew import run_crew_workflow2
+            final_markdown = run_crew_workflow2(
+                intermediate_report=get_report(appointments_collection.database, appt, "intermediate"),
+                suggestions_for_modifications="",
+                doctor_name=doctor_name,
+                config=config,
+                cancelled=cancelled
+            )
+            if not final_markdown:
+                return None
+
+            # Own file name, so a concurrent regeneration never uploads a half-written draft
+            pdf_path = generate_pdf(final_markdown, f"{appt['appointment_id']}_speculative")
+            pdf_url = upload_pdf_to_cloudinary(pdf_path, folder=f"appointments/{appt['appointment_id']}/final_report")
+
+            speculation = {
+                "report": save_report(appointments_collection.database, appt['appointment_id'], "final", final_markdown, draft=True),
+                "final_report_pdf_url": pdf_url,
+                "doctor_name": doctor_name,
+                "created_at": datetime.utcnow()
+            }
+            appointments_collection.update_one(
+                {"_id": appt['_id'], "status": "pending_doctor_review"},
+                {"$set": {"speculative_final_report": speculation, "updated_at": datetime.utcnow()}}
+            )
+            return dict(speculation, final_report=final_markdown)
+        except Exception as e:
+            span.fail(e)
+            print("❌ Speculative final report failed:", e)
+            return None
+
+def adopt_speculation(db, speculation, doctor_name):
+    """
+    (final_markdown, pdf_url, report) from a no-suggestion draft, or all None
+    when it can't be used. A draft signed by another doctor is discarded: the
+    LLM places the signature anywhere in the text, and replacing the name
+    would also rewrite any other mention of it in the report body.
+    """
+    if not speculation:
+        return None, None, None
+    text = speculation.get("final_report") or load_reports(db, [speculation["report"]]).get(speculation["report"]["id"])
+    if not text:
+        return None, None, None
+    if speculation["doctor_name"] != doctor_name:
+        return None, None, None
+    return text, speculation["final_report_pdf_url"], speculation["report"]
+
+# === Async CrewAI Final Workflow ===
+def run_final_report_async(appointments_collection, appt, suggestions, doctor_name, config=None, speculation=None):
+    with tracing.span("final_report", parent=trace_parent(appt), appointment_id=appt['appointment_id'], with_suggestions=bool((suggestions or "").strip())) as span:
+        try:
+            final_markdown, pdf_url, report = None, None, None
+            if not (suggestions or "").strip():
+                final_markdown, pdf_url, report = adopt_speculation(appointments_collection.database, speculation, doctor_name)
+                span.set(adopted_draft=final_markdown is not None)
+
+            if final_markdown is None:
+                from AI_workflows.workflow2.crew_logic.crew import run_crew_workflow2
+                final_markdown = run_crew_workflow2(
+                    intermediate_report=get_report(appointments_collection.database, appt, "intermediate"),
+                    suggestions_for_modifications=suggestions,
+                    doctor_name=doctor_name,
+                    config=config
+                )
+
+            if pdf_url is None:
+                pdf_path = generate_pdf(final_markdown, appt['appointment_id'])
+                pdf_url = upload_pdf_to_cloudinary(pdf_path, folder=f"appointments/{appt['appointment_id']}/final_report")
+
+            complete_final_report(appointments_collection, appt, final_markdown, pdf_url, config, report)
+
+        except Exception as e:
+            span.fail(e)
+            print("❌ Final report generation error:", e)
+            appointments_collection.update_one(
+                {"_id": appt['_id']},
+                {"$set": {"status": "error_finalizing", "updated_at": datetime.utcnow()}}
+            )
@@ -0,0 +1,77 @@
+"""
+Content-addressed index of uploaded files, and the text of lab report PDFs.
+
+Patients often re-upload the same lab report or photos across appointments.
+Every upload is recorded in the `assets` collection under its owner, the
+SHA-256 of its bytes and its resource type:
+    {_id: "<owner>:<resource_type>:<sha256>", owner, sha256, resource_type, secure_url, bytes, uses, created_at, last_used_at}
+so the owner's next upload of the same bytes reuses the stored URL instead of
+sending them to Cloudinary again. Uploads are never shared between owners: a
+URL points into its owner's folder. Text extracted from a PDF is kept in
+`pdf_texts` under the same hash with the page and character caps it was cut
+at, so a lab report is parsed once however many appointments attach it; a
+report uploaded here is recognised by its URL without downloading it.
+"""
+from datetime import datetime
+
+_indexed_dbs = set()
+
+
+def ensure_indexes(db):
+    if id(db) not in _indexed_dbs:
+        db.assets.create_index("secure_url")
+        _indexed_dbs.add(id(db))
+
+
+def asset_key(owner, content_hash, resource_type):
+    return f"{owner}:{resource_type}:{content_hash}"
+
+
+# === Uploads ===
+def find_asset(db, owner, content_hash, resource_type):
+    """The owner's stored upload with these bytes and resource type (counted as used), or None."""
+    return db.assets.find_one_and_update(
+        {"_id": asset_key(owner, content_hash, resource_type)},
+        {"$inc": {"uses": 1}, "$set": {"last_used_at": datetime.utcnow()}}
+    )
+
+
+def record_asset(db, owner, content_hash, resource_type, secure_url, size=None):
+    # Two sessions uploading the same bytes at once both succeed; the first URL recorded is the one reused
+    ensure_indexes(db)
+    now = datetime.utcnow()
+    db.assets.update_one(
+        {"_id": asset_key(owner, content_hash, resource_type)},
+        {"$setOnInsert": {
+            "owner": owner,
+            "sha256": content_hash,
+            "resource_type": resource_type,
+            "secure_url": secure_url,
+            "bytes": size,
+            "uses": 1,
+            "created_at": now,
+            "last_used_at": now
+        }},
+        upsert=True
+    )
+
+
+def hash_for_url(db, url):
+    ensure_indexes(db)
+    asset = db.assets.find_one({"secure_url": url}, {"sha256": 1})
+    return asset["sha256"] if asset else None
+
+
+# === PDF text ===
+def get_pdf_text(db, content_hash, max_pages, max_chars):
+    # Text cut at other caps is stale: the caller extracts again and overwrites it
+    cached = db.pdf_texts.find_one({"_id": content_hash, "max_pages": max_pages, "max_chars": max_chars}, {"text": 1})
+    return cached["text"] if cached else None
+
+
+def save_pdf_text(db, content_hash, text, max_pages, max_chars):
+    db.pdf_texts.update_one(
+        {"_id": content_hash},
+        {"$set": {"text": text, "max_pages": max_pages, "max_chars": max_chars, "created_at": datetime.utcnow()}},
+        upsert=True
+    )
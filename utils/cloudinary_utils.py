@@ -0,0 +1,64 @@
+import cloudinary
+import cloudinary.uploader
+from pymongo.errors import PyMongoError
+
+from utils import tracing
+from utils.assets import find_asset, record_asset
+from utils.idempotency import hash_attachment
+
+# === Cloudinary Configuration ===
+def configure_cloudinary(config):
+    cloudinary.config(
+        cloud_name=config["CLOUDINARY_CLOUD_NAME"],
+        api_key=config["CLOUDINARY_API_KEY"],
+        api_secret=config["CLOUDINARY_API_SECRET"],
+        secure=True
+    )
+
+# === Uploads ===
+def upload_to_cloudinary(file, folder="appointments", resource_type="auto", db=None, content_hash=None, owner=None):
+    """
+    `file` may be a Streamlit UploadedFile, an open file object or a local path.
+    With `db` and `owner`, bytes the same owner uploaded before (same SHA-256
+    and resource type) are not sent again: the stored URL is returned, whichever
+    of the owner's folders it lives in. Another owner's uploads are never reused.
+    Callers that already hashed the file pass `content_hash`.
+    """
+    indexed = db is not None and owner is not None
+    with tracing.child("cloudinary.upload", folder=folder, resource_type=resource_type) as span:
+        if indexed:
+            content_hash = content_hash or hash_attachment(file)
+            try:
+                asset = find_asset(db, owner, content_hash, resource_type)
+            except PyMongoError as e:
+                print("❌ Asset index lookup failed, uploading:", e)
+                asset = None
+            span.set(reused=asset is not None)
+            if asset is not None:
+                return asset["secure_url"]
+
+        result = cloudinary.uploader.upload(
+            file,
+            folder=folder,
+            resource_type=resource_type
+        )
+        secure_url = result.get("secure_url")
+
+        if indexed and secure_url:
+            try:
+                record_asset(db, owner, content_hash, resource_type, secure_url, result.get("bytes"))
+            except PyMongoError as e:
+                print("❌ Could not record uploaded asset:", e)
+    return secure_url
+
+def upload_pdf_to_cloudinary(file_path, folder="reports"):
+    # Generated reports are unique, so they skip the asset index
+    return upload_to_cloudinary(file_path, folder=folder, resource_type="raw")
+
+# Upload DP
+def upload_dp_to_cloudinary(file, username, db=None):
+    if file:
+        # Scoped to the user's own folder, so a picture is only reused for the same username
+        folder = f"profile_pictures/{username}"
+        return upload_to_cloudinary(file, folder=folder, resource_type="image", db=db, owner=folder)
+    return None
@@ -0,0 +1,113 @@
+import os
+import threading
+
+# Keys every deployment must provide (secrets.toml, environment or injected overrides)
+REQUIRED_KEYS = [
+    "MONGO_URI",
+    "DEEPSEEK_API",
+    "TAVILY_API_KEY",
+    "CLOUDINARY_CLOUD_NAME",
+    "CLOUDINARY_API_KEY",
+    "CLOUDINARY_API_SECRET",
+]
+
+# Optional settings and their defaults
+DEFAULTS = {
+    "WORKFLOW_SERVICE_URL": "",
+    "WORKFLOW_SERVICE_TOKEN": "",
+    "WORKFLOW_WORKERS": 4,
+    "SCHEDULER_AGING_SECONDS": 120,
+    "ARCHIVE_AFTER_DAYS": 180,
+    "ANALYTICS_EXPORT_DIR": "data/analytics",
+    "READ_POLICY_USER_HISTORY": "secondary",
+    "READ_POLICY_DOCTOR_PENDING": "secondary",
+    "READ_POLICY_AUTH_TOKEN": "primary",
+    "READ_MAX_STALENESS_S": 90,
+    "SUBMISSION_DEDUP_WINDOW_SECONDS": 600,
+    "BCRYPT_ROUNDS": 12,
+    "BCRYPT_POOL_SIZE": 2,
+    "PROFILE_CACHE_TTL_SECONDS": 300,
+    "CASE_INDEX_DIR": "data/case_index",
+    "CASE_INDEX_DIM": 1024,
+    "SIMILAR_CASES_K": 3,
+    "SIMILAR_CASES_MIN_SCORE": 0.55,
+    "SIMILAR_CASES_SKIP_SEARCH_COUNT": 2,
+    "KNOWLEDGE_STORE_DIR": "data/knowledge_store",
+    "KNOWLEDGE_MIN_COVERAGE": 0.8,
+    "MEDICATION_NORMALIZER": True,
+    "LAB_PARSER": True,
+    "FAST_PATH": True,
+    "FAST_PATH_MAX_INPUT_CHARS": 3000,
+    "ATTACHMENT_MAX_MB": 20,
+    "PDF_SPOOL_MB": 2,
+    "LAB_REPORT_MAX_PAGES": 30,
+    "LAB_REPORT_MAX_CHARS": 40000,
+    "LLM_MODELS_FILE": "",
+    "ROUTING_DEFAULT_PROFILE": "strong",
+    "ROUTING_REPORT_FILE": "data/routing_report.jsonl",
+    "TRACE_FILE": "data/traces.jsonl",
+    "RERUN_PROFILING": False,
+    "RERUN_PROFILE_SAMPLING": False,
+    "RERUN_PROFILE_SAMPLE_MS": 5,
+    "RERUN_PROFILE_LOG": "data/rerun_profile.jsonl",
+    "PROFILER_ADMINS": "",
+    "APPOINTMENT_SLO_S": 600,
+    "LLM_HEDGING": True,
+    "SPECULATIVE_FINAL_REPORT": True,
+    "SPECULATIVE_WORKERS": 1,
+    "PDF_FONT_FILE": "",
+    "RERENDER_STATE_FILE": "data/rerender_state.json",
+}
+
+_config = None
+_config_lock = threading.Lock()
+
+
+def _streamlit_secrets():
+    # st.secrets raises when no secrets.toml exists (e.g. headless service containers)
+    try:
+        import streamlit as st
+        return {key: st.secrets[key] for key in st.secrets}
+    except Exception:
+        return {}
+
+
+def load_config(overrides=None, use_streamlit_secrets=True):
+    """
+    Builds the configuration dict used by the workflows, pages and services.
+    Precedence: explicit overrides > environment variables > secrets.toml > defaults.
+    """
+    config = dict(DEFAULTS)
+    if use_streamlit_secrets:
+        config.update(_streamlit_secrets())
+
+    for key in REQUIRED_KEYS + list(DEFAULTS):
+        if os.environ.get(key) is not None:
+            config[key] = os.environ[key]
+
+    if overrides:
+        config.update(overrides)
+
+    # Environment values arrive as strings; coerce them to the type of their default
+    for key, default in DEFAULTS.items():
+        if isinstance(default, bool):
+            config[key] = str(config[key]).lower() in ("1", "true", "yes")
+        elif isinstance(default, (int, float)):
+            config[key] = type(default)(config[key])
+    return config
+
+
+def get_config():
+    """Process-wide configuration, loaded once on first use."""
+    global _config
+    if _config is None:
+        with _config_lock:
+            if _config is None:
+                _config = load_config()
+    return _config
+
+
+def require(config, *keys):
+    missing = [key for key in keys if not config.get(key)]
+    if missing:
+        raise ValueError(f"❌ Missing configuration: {', '.join(missing)}")
@@ -0,0 +1,73 @@
+import threading
+import time
+
+from pymongo import MongoClient, ReadPreference
+from pymongo.read_preferences import SecondaryPreferred
+
+from utils.config import get_config
+from utils.rerun_profiler import QUERY_COUNTER
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+# Query sites whose reads may be routed, and the config key holding each one's policy
+READ_SITES = {
+    "user_history": "READ_POLICY_USER_HISTORY",
+    "doctor_pending": "READ_POLICY_DOCTOR_PENDING",
+    "auth_token": "READ_POLICY_AUTH_TOKEN",
+}
+READ_POLICIES = ("primary", "secondary")
+_PRIMARY_UNTIL_KEY = "_db_primary_reads_until"
+
+
+def get_client(mongo_uri):
+    # MongoClient is thread-safe and pools connections, so share one per URI
+    client = _clients.get(mongo_uri)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(mongo_uri)
+            if client is None:
+                # The listener only counts commands of profiled Streamlit reruns
+                client = MongoClient(mongo_uri, event_listeners=[QUERY_COUNTER])
+                _clients[mongo_uri] = client
+    return client
+
+
+def get_db(config=None):
+    config = config or get_config()
+    return get_client(config["MONGO_URI"]).website_data
+
+
+# === Read routing ===
+def note_write(state, config=None):
+    """
+    Call after a write on behalf of a session (`state` is e.g. st.session_state).
+    For the next READ_MAX_STALENESS_S seconds its routed reads go to the primary,
+    which has applied every acknowledged write, so the session reads its own writes.
+    """
+    config = config or get_config()
+    state[_PRIMARY_UNTIL_KEY] = time.monotonic() + config["READ_MAX_STALENESS_S"]
+
+
+def read_policy(site, state=None, config=None):
+    config = config or get_config()
+    policy = config[READ_SITES[site]]
+    if policy not in READ_POLICIES:
+        raise ValueError(f"❌ {READ_SITES[site]} must be one of {', '.join(READ_POLICIES)}, got {policy!r}")
+    if policy == "secondary" and state is not None and state.get(_PRIMARY_UNTIL_KEY, 0) > time.monotonic():
+        return "primary"
+    return policy
+
+
+def routed_db(site, state=None, config=None):
+    """
+    The database handle to read `site` with. "secondary" reads go to a secondary
+    at most READ_MAX_STALENESS_S behind the primary (or to the primary when none
+    qualifies), except right after the session wrote; "primary" reads always go
+    to the primary. Writes must use get_db().
+    """
+    config = config or get_config()
+    db = get_db(config)
+    if read_policy(site, state, config) == "primary":
+        return db.with_options(read_preference=ReadPreference.PRIMARY)
+    return db.with_options(read_preference=SecondaryPreferred(max_staleness=config["READ_MAX_STALENESS_S"]))
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import re
+from datetime import datetime, timedelta
+from pymongo.errors import DuplicateKeyError
+
+TEXT_FIELDS = ["symptoms", "recent_medications", "regular_medications", "important_notes"]
+CHUNK_SIZE = 1024 * 1024
+
+_indexed_dbs = set()
+
+
+# === Fingerprinting ===
+def normalize_text(value):
+    # Case, surrounding and repeated whitespace don't make a submission different
+    return re.sub(r"\s+", " ", (value or "")).strip().casefold()
+
+
+def hash_attachment(file):
+    """
+    SHA-256 of an attachment's bytes. Accepts a Streamlit UploadedFile / file
+    object (rewound afterwards so it can still be uploaded) or a local path.
+    """
+    digest = hashlib.sha256()
+    if isinstance(file, str):
+        with open(file, "rb") as handle:
+            for chunk in iter(lambda: handle.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+    else:
+        position = file.tell()
+        file.seek(0)
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+        file.seek(position)
+    return digest.hexdigest()
+
+
+def compute_fingerprint(user_id, inputs, lab_report_hash=None, image_hashes=()):
+    payload = {
+        "user_id": str(user_id),
+        "inputs": {field: normalize_text(inputs.get(field)) for field in TEXT_FIELDS},
+        "lab_report": lab_report_hash,
+        "images": sorted(image_hashes),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+# === Atomic Claim ===
+def ensure_indexes(db, window_seconds):
+    # TTL cleanup only; the window itself is enforced in claim_submission
+    if id(db) not in _indexed_dbs:
+        db.submission_fingerprints.create_index("created_at", expireAfterSeconds=int(window_seconds))
+        _indexed_dbs.add(id(db))
+
+
+def find_duplicate(db, fingerprint, window_seconds):
+    """
+    The appointment_id `fingerprint` was claimed for within the window, or None.
+    A read-only check so a duplicate doesn't cost an appointment id; the
+    claim itself is still decided by claim_submission.
+    """
+    existing = db.submission_fingerprints.find_one(
+        {"_id": fingerprint, "created_at": {"$gte": datetime.utcnow() - timedelta(seconds=window_seconds)}},
+        {"appointment_id": 1}
+    )
+    return existing["appointment_id"] if existing else None
+
+
+def claim_submission(db, fingerprint, appointment_id, window_seconds):
+    """
+    Records `fingerprint` as belonging to `appointment_id` unless the same
+    fingerprint was claimed within the last `window_seconds`.
+
+    Returns None if the caller owns the submission, otherwise the appointment_id
+    of the earlier submission it duplicates. The unique _id makes the check
+    atomic across Streamlit sessions, service replicas and batch runs.
+    """
+    ensure_indexes(db, window_seconds)
+    now = datetime.utcnow()
+    try:
+        db.submission_fingerprints.insert_one({"_id": fingerprint, "appointment_id": appointment_id, "created_at": now})
+        return None
+    except DuplicateKeyError:
+        pass
+
+    # An expired claim the TTL monitor hasn't removed yet can be taken over
+    taken_over = db.submission_fingerprints.find_one_and_update(
+        {"_id": fingerprint, "created_at": {"$lt": now - timedelta(seconds=window_seconds)}},
+        {"$set": {"appointment_id": appointment_id, "created_at": now}}
+    )
+    if taken_over is not None:
+        return None
+
+    existing = db.submission_fingerprints.find_one({"_id": fingerprint})
+    if existing is None:
+        # Removed by the TTL monitor in between; claim it afresh
+        return claim_submission(db, fingerprint, appointment_id, window_seconds)
+    return existing["appointment_id"]
+
+
+def release_submission(db, fingerprint, appointment_id):
+    """
+    Drops the claim `appointment_id` holds on `fingerprint` when the steps
+    after claiming (uploads, insert, submit) failed, so a retry isn't turned
+    away as a duplicate of an appointment that was never created. A claim whose
+    appointment was inserted is kept.
+    """
+    if db.new_appointments.find_one({"appointment_id": appointment_id}, {"_id": 1}) is None:
+        db.submission_fingerprints.delete_one({"_id": fingerprint, "appointment_id": appointment_id})
@@ -0,0 +1,70 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+
+from utils.config import get_config
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# === Worker functions (run in the hashing processes) ===
+def _hash(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+def _check(password, password_hash):
+    return bcrypt.checkpw(password, password_hash)
+
+
+# === Hashing Pool ===
+def get_hashing_pool(config=None):
+    """
+    Process-wide pool for bcrypt work. bcrypt is deliberately CPU-heavy, so
+    running it in a few separate processes keeps Streamlit script threads free
+    and caps how many hashes run at once during login spikes.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                config = config or get_config()
+                _pool = ProcessPoolExecutor(
+                    max_workers=config["BCRYPT_POOL_SIZE"],
+                    # spawn: forking a multi-threaded Streamlit server is unsafe
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+    return _pool
+
+
+def hash_rounds(password_hash):
+    # bcrypt hashes look like $2b$12$<salt+digest>; the middle field is the cost
+    return int(password_hash.split(b"$")[2])
+
+
+def hash_password(password, config=None):
+    config = config or get_config()
+    return get_hashing_pool(config).submit(_hash, password.encode(), config["BCRYPT_ROUNDS"]).result()
+
+
+def verify_password(password, password_hash, config=None):
+    """Returns (matches, needs_rehash); needs_rehash is True when the stored cost differs from BCRYPT_ROUNDS."""
+    config = config or get_config()
+    matches = get_hashing_pool(config).submit(_check, password.encode(), password_hash).result()
+    return matches, matches and hash_rounds(password_hash) != config["BCRYPT_ROUNDS"]
+
+
+def rehash_in_background(collection, doc_id, password, config=None):
+    # Upgrades a stored hash to the current cost without delaying the login itself
+    config = config or get_config()
+    future = get_hashing_pool(config).submit(_hash, password.encode(), config["BCRYPT_ROUNDS"])
+
+    def _store(done):
+        try:
+            collection.update_one({"_id": doc_id}, {"$set": {"password_hash": done.result()}})
+        except Exception as e:
+            print("❌ Password rehash failed:", e)
+
+    future.add_done_callback(_store)
+    return future
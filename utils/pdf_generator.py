@@ -0,0 +1,181 @@
+import functools
+import os
+import pickle
+import re
+import shutil
+import tempfile
+import threading
+import unicodedata
+
+import fpdf
+from fpdf import FPDF
+from fpdf.py3k import hashpath
+from fpdf.ttfonts import TTFontFile
+
+from utils import tracing
+
+
+def markdown_to_plain_text(md):
+    # Remove markdown links and formatting
+    plain_text = re.sub(r'!\[.*?\]\(.*?\)', '', md)  # remove images
+    plain_text = re.sub(r'\[([^\]]+)\]\([^)]+\)', r'\1', plain_text)  # convert links to text
+    plain_text = re.sub(r'[>#*_`]', '', plain_text)  # strip markdown symbols
+    plain_text = re.sub(r'\n{2,}', '\n\n', plain_text)  # normalize line breaks
+    return plain_text.strip()
+
+# Typographic characters LLM output is full of, spelled with latin-1 for the built-in font
+LATIN1_FALLBACKS = {
+    "\u2013": "-", "\u2014": "-", "\u2212": "-", "\u2018": "'", "\u2019": "'",
+    "\u201c": '"', "\u201d": '"', "\u2026": "...", "\u2022": "-", "\u2264": "<=",
+    "\u2265": ">=", "\u2192": "->", "\u00a0": " ",
+}
+# Unicode TTFs looked for when PDF_FONT_FILE is not set; FreeSans and Noto cover Devanagari
+UNICODE_FONT_CANDIDATES = [
+    "/usr/share/fonts/truetype/freefont/FreeSans.ttf",
+    "/usr/share/fonts/gnu-free/FreeSans.ttf",
+    "/usr/share/fonts/truetype/noto/NotoSansDevanagari-Regular.ttf",
+    "/usr/share/fonts/noto/NotoSansDevanagari-Regular.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+]
+# Letters and vowel signs a font must have for Hindi names to show
+DEVANAGARI_SAMPLE = "अआइईउऊएऐओऔकखगघङचछजझञटठडढणतथदधनपफबभमयरलवशषसहािीुूृेैोौंः्"
+# Parsed font metrics are cached here so each report doesn't re-read the TTF
+FONT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "rogimitra_font_cache")
+FONT_CACHE_FILES = (".pkl", ".cw127.pkl")
+_font_cache_lock = threading.Lock()
+_checked_font_caches = set()
+
+def sanitize_text(text, unicode_font=False):
+    """
+    NFC-normalized text the report font can draw. With a Unicode TTF only
+    control characters and characters beyond the BMP (emoji, which FPDF's
+    TTF support cannot encode) go. The built-in Arial is latin-1 only: other
+    characters are folded where that keeps the meaning (dashes, quotes,
+    ligatures, accented letters) and shown as "?" otherwise, never dropped.
+    """
+    text = unicodedata.normalize("NFC", text)
+    if unicode_font:
+        return "".join(ch for ch in text if ch in "\n\t" or (ord(ch) <= 0xFFFF and unicodedata.category(ch) != "Cc"))
+    chars = []
+    for ch in text:
+        if ord(ch) < 256:
+            chars.append(ch)
+        elif ch in LATIN1_FALLBACKS:
+            chars.append(LATIN1_FALLBACKS[ch])
+        else:
+            folded = unicodedata.normalize("NFKD", ch).encode("latin-1", "ignore").decode("latin-1")
+            chars.append(folded or "?")
+    return "".join(chars)
+
+@functools.lru_cache(maxsize=None)
+def _char_widths(font_file):
+    # fpdf's own metrics: a width per BMP code point, 0 where the font has no glyph
+    ttf = TTFontFile()
+    ttf.getMetrics(font_file)
+    return ttf.charWidths
+
+def font_covers(font_file, text):
+    """Whether `font_file` has a glyph for every character of `text` it would be asked to draw."""
+    widths = _char_widths(font_file)
+    return all(widths[ord(ch)] for ch in set(sanitize_text(text, unicode_font=True)) if not ch.isspace())
+
+def find_report_font(configured="", text=""):
+    """
+    The Unicode TTF to draw `text` with: `configured` (PDF_FONT_FILE), else
+    the first common system font, that has a glyph for every character of
+    `text`; None if none does, and the report falls back to latin-1.
+    """
+    candidates = []
+    if configured:
+        if os.path.isfile(configured):
+            candidates.append(configured)
+        else:
+            print(f"❌ PDF_FONT_FILE not found, falling back: {configured}")
+    candidates += [path for path in UNICODE_FONT_CANDIDATES if os.path.isfile(path)]
+    return next((path for path in candidates if font_covers(path, text)), None)
+
+def _readable_pickle(path):
+    try:
+        with open(path, "rb") as fh:
+            pickle.load(fh)
+        return True
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return False
+
+def _prepare_font_cache(font_file, rebuild=False):
+    """
+    Makes sure FONT_CACHE_DIR holds complete metric files for `font_file`;
+    called with _font_cache_lock held. fpdf writes its cache files in place,
+    so they are built by a throwaway render in a private directory and moved
+    in with os.replace: reports only ever read them. Existing files are
+    unpickled once per process to check they are whole.
+    """
+    fpdf.set_global("FPDF_CACHE_MODE", 2)
+    fpdf.set_global("FPDF_CACHE_DIR", FONT_CACHE_DIR)
+    # fpdf names the files after a hash of the TTF path
+    paths = [os.path.join(FONT_CACHE_DIR, hashpath(font_file) + ext) for ext in FONT_CACHE_FILES]
+    if not rebuild and all(os.path.exists(path) for path in paths):
+        if font_file in _checked_font_caches or all(_readable_pickle(path) for path in paths):
+            _checked_font_caches.add(font_file)
+            return
+
+    os.makedirs(FONT_CACHE_DIR, exist_ok=True)
+    build_dir = tempfile.mkdtemp(dir=FONT_CACHE_DIR)
+    try:
+        fpdf.set_global("FPDF_CACHE_DIR", build_dir)
+        pdf = FPDF()
+        pdf.add_page()
+        pdf.add_font("Report", "", font_file, uni=True)
+        pdf.set_font("Report", size=12)
+        # A character past 127 makes fpdf write its .cw127.pkl as well
+        pdf.cell(0, 10, "Report \u2013")
+        pdf.output(os.path.join(build_dir, "warmup.pdf"))
+        for path in paths:
+            os.replace(os.path.join(build_dir, os.path.basename(path)), path)
+    finally:
+        fpdf.set_global("FPDF_CACHE_DIR", FONT_CACHE_DIR)
+        shutil.rmtree(build_dir, ignore_errors=True)
+    _checked_font_caches.add(font_file)
+
+def _render(plain_text, font_file, file_path):
+    pdf = FPDF()
+    pdf.add_page()
+    if font_file:
+        # The cache directory is a process-wide fpdf setting, so fonts are added under the lock
+        with _font_cache_lock:
+            _prepare_font_cache(font_file)
+            pdf.add_font("Report", "", font_file, uni=True)
+        pdf.set_font("Report", size=12)
+    else:
+        pdf.set_font("Arial", size=12)
+
+    for line in sanitize_text(plain_text, unicode_font=bool(font_file)).split('\n'):
+        pdf.multi_cell(0, 10, line)
+    pdf.output(file_path)
+
+def generate_pdf(markdown_text, appointment_id, font_file=None):
+    """
+    Renders the report to temp_reports/report_<appointment_id>.pdf and returns
+    the path. `font_file` defaults to find_report_font(PDF_FONT_FILE). A font
+    without a glyph for some character of the report is not used: a blank gap
+    in a name is worse than the "?" of the latin-1 font.
+    """
+    with tracing.child("pdf.generate", chars=len(markdown_text)):
+        plain_text = markdown_to_plain_text(markdown_text)
+        if font_file is None:
+            from utils.config import get_config
+            font_file = find_report_font(get_config()["PDF_FONT_FILE"], plain_text)
+        elif not font_covers(font_file, plain_text):
+            font_file = None
+
+        os.makedirs("temp_reports", exist_ok=True)
+        file_path = f"temp_reports/report_{appointment_id}.pdf"
+        try:
+            _render(plain_text, font_file, file_path)
+        except (pickle.UnpicklingError, EOFError) as e:
+            # A cache file damaged after this process checked it: rebuild it and render again
+            print("❌ Font cache unreadable, rebuilding:", e)
+            with _font_cache_lock:
+                _prepare_font_cache(font_file, rebuild=True)
+            _render(plain_text, font_file, file_path)
+        return file_path
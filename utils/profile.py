@@ -0,0 +1,174 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import streamlit as st
+
+from utils.appointments import calculate_age
+from utils.config import get_config
+
+PLACEHOLDER_DP = "https://via.placeholder.com/150"
+PROFILE_FIELDS = ("name", "dob", "gender", "height", "weight", "dp")
+MAX_CACHED_VIEWS = 5000
+
+# Process-wide cache: (kind, user_id) -> (expires_at, view), in the order written,
+# which with one TTL is also the order entries expire in
+_views = OrderedDict()
+_views_lock = threading.Lock()
+
+
+# === Derived Fields ===
+def calculate_bmi(weight, height):
+    try:
+        height_m = float(height) / 100
+        return round(float(weight) / (height_m * height_m), 1) if height_m > 0 else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _patient_card_html(view):
+    return f"""
+            <div style='
+                display: flex;
+                flex-direction: column;
+                align-items: center;
+                justify-content: center;
+                margin-top: 30px;
+                margin-bottom: 20px;
+            '>
+                <div style='
+                    width: 120px;
+                    height: 120px;
+                    border-radius: 50%;
+                    overflow: hidden;
+                    border: 3px solid #3B82F6;
+                    box-shadow: 0 0 10px rgba(59, 130, 246, 0.4);
+                    transition: transform 0.3s ease;
+                '>
+                    <img src="{view['profile_url']}" style='width: 100%; height: 100%; object-fit: cover;' alt="Profile Picture">
+                </div>
+                <h4 style='margin-top: 10px;'>{view['name']}</h4>
+                <p style='margin: 0; font-size: 13px; color: #666;'>DOB: {view['dob']}</p>
+                <p style='margin: 0; font-size: 13px; color: #666;'>Age: {view['age']} years</p>
+                <p style='margin: 0; font-size: 13px; color: #666;'>Gender: {view['gender']}</p>
+                <p style='margin: 0; font-size: 13px; color: #666;'>Height: {view['height']} cm</p>
+                <p style='margin: 0; font-size: 13px; color: #666;'>Weight: {view['weight']} kg</p>
+            </div>
+        """
+
+def _doctor_card_html(view):
+    return f"""
+            <div style='
+                display: flex;
+                flex-direction: column;
+                align-items: center;
+                justify-content: center;
+                margin-top: 30px;
+                margin-bottom: 20px;
+            '>
+                <div style='
+                    width: 120px;
+                    height: 120px;
+                    border-radius: 50%;
+                    overflow: hidden;
+                    border: 3px solid #10B981;
+                    box-shadow: 0 0 10px rgba(16, 185, 129, 0.4);
+                    transition: transform 0.3s ease;
+                '>
+                    <img src="{view['profile_url']}" style='width: 100%; height: 100%; object-fit: cover;' alt="Profile Picture">
+                </div>
+                <h4 style='margin-top: 10px;'>Dr. {view['name']}</h4>
+            </div>
+        """
+
+
+def build_profile_view(account, kind="user"):
+    """Everything the pages derive from a user/doctor document, computed once."""
+    view = {
+        "_id": account.get("_id"),
+        "kind": kind,
+        "source": tuple(account.get(field) for field in PROFILE_FIELDS),
+        "name": account.get("name"),
+        "profile_url": account.get("dp") or PLACEHOLDER_DP,
+    }
+    if kind == "user":
+        view.update({
+            "dob": account["dob"],
+            "age": calculate_age(datetime.strptime(account["dob"], '%Y-%m-%d').date()),
+            "gender": account.get("gender"),
+            "height": account.get("height"),
+            "weight": account.get("weight"),
+            "bmi": calculate_bmi(account.get("weight"), account.get("height")),
+        })
+        view["sidebar_html"] = _patient_card_html(view)
+    else:
+        view["sidebar_html"] = _doctor_card_html(view)
+    return view
+
+
+# === Caching ===
+def _cache_key(kind, user_id):
+    return (kind, str(user_id))
+
+def _store(key, view, ttl):
+    now = time.monotonic()
+    with _views_lock:
+        _views.pop(key, None)
+        _views[key] = (now + ttl, view)
+        # Drop expired entries, then the oldest ones past the size bound
+        while _views and (len(_views) > MAX_CACHED_VIEWS or next(iter(_views.values()))[0] <= now):
+            _views.popitem(last=False)
+
+def _cached(key):
+    with _views_lock:
+        entry = _views.get(key)
+    if entry and entry[0] > time.monotonic():
+        return entry[1]
+    return None
+
+
+def get_profile_view(account, kind="user"):
+    """
+    Profile view for the logged-in account, cached in the Streamlit session and
+    process-wide. A changed document (different profile fields) forces a
+    rebuild.
+    """
+    key = _cache_key(kind, account.get("_id"))
+    source = tuple(account.get(field) for field in PROFILE_FIELDS)
+
+    session_views = st.session_state.setdefault("_profile_views", {})
+    cached = session_views.get(key)
+    if cached and cached["source"] == source:
+        return cached
+
+    view = _cached(key)
+    if view is None or view["source"] != source:
+        view = build_profile_view(account, kind)
+        _store(key, view, get_config()["PROFILE_CACHE_TTL_SECONDS"])
+
+    session_views[key] = view
+    return view
+
+
+def get_profile_views(collection, user_ids, kind="user"):
+    """Profile views for many accounts; only ids missing from the cache are fetched, in one query."""
+    views, missing = {}, []
+    for user_id in dict.fromkeys(user_ids):
+        view = _cached(_cache_key(kind, user_id))
+        if view is None:
+            missing.append(user_id)
+        else:
+            views[user_id] = view
+
+    if missing:
+        ttl = get_config()["PROFILE_CACHE_TTL_SECONDS"]
+        for account in collection.find({"_id": {"$in": missing}}):
+            view = build_profile_view(account, kind)
+            _store(_cache_key(kind, account["_id"]), view, ttl)
+            views[account["_id"]] = view
+    return views
+
+
+def render_profile_card(view):
+    st.markdown(view["sidebar_html"], unsafe_allow_html=True)
@@ -0,0 +1,184 @@
+"""
+Compressed store for report bodies, kept out of the appointment documents.
+
+Every saved report is a new revision in the `reports` collection:
+    {appointment_id, kind, revision, draft, codec, body, size, created_at}
+where `kind` is "intermediate" or "final" and `body` is the zstd (or zlib,
+when zstandard is not installed) compressed markdown. The appointment only
+holds a small reference to the current revision under `reports.<kind>`, so
+dashboard queries no longer carry the markdown. Documents written before the
+store existed keep their inline `<kind>_report` field until migrated; readers
+accept both.
+
+Usage (from the project root):
+    python -m utils.report_store migrate [--batch-size 200] [--dry-run]
+    python -m utils.report_store history 42
+"""
+import argparse
+import zlib
+from datetime import datetime
+
+from pymongo.errors import DuplicateKeyError
+
+from utils.tiering import TIERS
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+KINDS = ("intermediate", "final")
+ZSTD_LEVEL = 10
+ZLIB_LEVEL = 9
+
+_indexed_dbs = set()
+
+
+# === Compression ===
+def compress(text):
+    data = text.encode("utf-8")
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return "zlib", zlib.compress(data, ZLIB_LEVEL)
+
+
+def decompress(codec, body):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("❌ Report is zstd-compressed but the zstandard package is not installed")
+        data = zstandard.ZstdDecompressor().decompress(body)
+    elif codec == "zlib":
+        data = zlib.decompress(body)
+    else:
+        raise ValueError(f"Unknown report codec {codec!r}")
+    return data.decode("utf-8")
+
+
+# === Writes ===
+def ensure_indexes(db):
+    if id(db) not in _indexed_dbs:
+        db.reports.create_index([("appointment_id", 1), ("kind", 1), ("revision", 1)], unique=True)
+        _indexed_dbs.add(id(db))
+
+
+def save_report(db, appointment_id, kind, text, draft=False):
+    """
+    Stores `text` as the next revision of the appointment's `kind` report and
+    returns the reference to keep on the appointment under `reports.<kind>`.
+    """
+    ensure_indexes(db)
+    codec, body = compress(text)
+    while True:
+        latest = db.reports.find_one({"appointment_id": appointment_id, "kind": kind}, {"revision": 1}, sort=[("revision", -1)])
+        revision = (latest["revision"] if latest else 0) + 1
+        document = {
+            "appointment_id": appointment_id,
+            "kind": kind,
+            "revision": revision,
+            "draft": draft,
+            "codec": codec,
+            "body": body,
+            "size": len(text),
+            "created_at": datetime.utcnow(),
+        }
+        try:
+            db.reports.insert_one(document)
+        except DuplicateKeyError:
+            continue  # a concurrent writer took this revision number
+        return {"id": document["_id"], "revision": revision, "size": len(text)}
+
+
+# === Reads ===
+def load_reports(db, refs):
+    """report id -> text for a list of references, in one query."""
+    ids = [ref["id"] for ref in refs if ref]
+    if not ids:
+        return {}
+    return {doc["_id"]: decompress(doc["codec"], doc["body"]) for doc in db.reports.find({"_id": {"$in": ids}}, {"codec": 1, "body": 1})}
+
+
+def get_report(db, appt, kind):
+    """The appointment's current `kind` report text, or None."""
+    ref = (appt.get("reports") or {}).get(kind)
+    if ref is None:
+        return appt.get(f"{kind}_report")
+    return load_reports(db, [ref]).get(ref["id"])
+
+
+def attach_reports(db, appts, kind):
+    """Sets `<kind>_report` on each appointment from the store, one query for all of them."""
+    refs = [(appt.get("reports") or {}).get(kind) for appt in appts]
+    texts = load_reports(db, refs)
+    for appt, ref in zip(appts, refs):
+        if ref is not None:
+            appt[f"{kind}_report"] = texts.get(ref["id"])
+    return appts
+
+
+def report_history(db, appointment_id, kind=None):
+    """Revision metadata (no bodies) for an appointment, oldest first."""
+    query = {"appointment_id": appointment_id}
+    if kind:
+        query["kind"] = kind
+    return list(db.reports.find(query, {"body": 0}).sort([("kind", 1), ("revision", 1)]))
+
+
+# === Migration ===
+def migrate(db, batch_size=200, dry_run=False):
+    """
+    Moves inline report fields of existing appointments, in both the hot and
+    the archive tier, into the store.
+    Safe to re-run: only documents that still carry an inline body are touched,
+    and each update only applies if that body has not changed meanwhile.
+    """
+    inline = [{f"{kind}_report": {"$type": "string"}} for kind in KINDS]
+    stats = {"appointments": 0, "reports": 0, "inline_bytes": 0, "stored_bytes": 0}
+    projection = {"appointment_id": 1, **{f"{kind}_report": 1 for kind in KINDS}}
+    for tier in TIERS:
+        for appt in db[tier].find({"$or": inline}, projection).batch_size(batch_size):
+            stats["appointments"] += 1
+            for kind in KINDS:
+                text = appt.get(f"{kind}_report")
+                if not isinstance(text, str):
+                    continue
+                stats["reports"] += 1
+                stats["inline_bytes"] += len(text.encode("utf-8"))
+                stats["stored_bytes"] += len(compress(text)[1])
+                if dry_run:
+                    continue
+                ref = save_report(db, appt["appointment_id"], kind, text)
+                db[tier].update_one(
+                    {"_id": appt["_id"], f"{kind}_report": text},
+                    {"$set": {f"reports.{kind}": ref, "updated_at": datetime.utcnow()}, "$unset": {f"{kind}_report": ""}}
+                )
+    return stats
+
+
+def main(argv=None):
+    from utils.config import load_config
+    from utils.db import get_db
+
+    parser = argparse.ArgumentParser(description="Compressed report store maintenance.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = sub.add_parser("migrate", help="Move inline report bodies into the store")
+    migrate_parser.add_argument("--batch-size", type=int, default=200)
+    migrate_parser.add_argument("--dry-run", action="store_true", help="Only report what would be moved")
+    history_parser = sub.add_parser("history", help="List an appointment's report revisions")
+    history_parser.add_argument("appointment_id", type=int)
+    args = parser.parse_args(argv)
+
+    db = get_db(load_config(use_streamlit_secrets=False))
+    if args.command == "migrate":
+        stats = migrate(db, batch_size=args.batch_size, dry_run=args.dry_run)
+        ratio = stats["inline_bytes"] / stats["stored_bytes"] if stats["stored_bytes"] else 0
+        verb = "Would move" if args.dry_run else "Moved"
+        print(f"✅ {verb} {stats['reports']} reports from {stats['appointments']} appointments: "
+              f"{stats['inline_bytes'] / 1e6:.2f} MB inline -> {stats['stored_bytes'] / 1e6:.2f} MB stored ({ratio:.1f}x)")
+    else:
+        for revision in report_history(db, args.appointment_id):
+            print(f"{revision['kind']:<14}r{revision['revision']:<4}{'draft' if revision.get('draft') else '':<7}"
+                  f"{revision['size']:>8} chars  {revision['codec']:<5}{revision['created_at']:%Y-%m-%d %H:%M}")
+
+
+if __name__ == "__main__":
+    main()
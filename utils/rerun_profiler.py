@@ -0,0 +1,292 @@
+"""
+Opt-in per-rerun profiling of the Streamlit app.
+
+With RERUN_PROFILING on, every script rerun records its wall time, the time
+spent in named sections (`with section("pending list"):` in the pages), the
+MongoDB commands it issued (count and server time, per command and
+collection) and, with RERUN_PROFILE_SAMPLING, a sampling profile of the
+script thread taken every RERUN_PROFILE_SAMPLE_MS. Profiles go to a rotating
+JSON-lines log (RERUN_PROFILE_LOG) and to an in-memory window shown in a
+sidebar panel to the doctors listed in PROFILER_ADMINS. With profiling off,
+section() and the Mongo listener do nothing beyond one context lookup.
+
+Usage (from the project root):
+    python -m utils.rerun_profiler summary [--file data/rerun_profile.jsonl]
+"""
+import argparse
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from pymongo import monitoring
+
+RECENT_PROFILES = 200
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 3
+TOP_FRAMES = 15
+
+_current = contextvars.ContextVar("rerun_profile", default=None)
+_recent = deque(maxlen=RECENT_PROFILES)
+_loggers = {}
+_loggers_lock = threading.Lock()
+
+
+class RerunProfile:
+    def __init__(self, sample_interval_s=None):
+        self.page = None
+        self.started = time.perf_counter()
+        self.started_at = datetime.now(timezone.utc)
+        self.sections = defaultdict(float)
+        self.stack = []
+        self.mongo = Counter()
+        self.mongo_ms = defaultdict(float)
+        self.pending_commands = {}
+        self.sampler = Sampler(threading.get_ident(), sample_interval_s) if sample_interval_s else None
+        self.record = None
+
+    def finish(self, ended_by=None):
+        record = {
+            "at": self.started_at.isoformat(),
+            "page": self.page or "-",
+            "wall_ms": (time.perf_counter() - self.started) * 1000,
+            "ended_by": ended_by,
+            "sections_ms": dict(self.sections),
+            "mongo_commands": sum(self.mongo.values()),
+            "mongo_ms": sum(self.mongo_ms.values()),
+            "mongo": {command: {"count": count, "ms": self.mongo_ms[command]} for command, count in self.mongo.most_common()},
+        }
+        if self.sampler is not None:
+            record["samples"] = self.sampler.stop()
+        return record
+
+
+# === Sampling ===
+class Sampler:
+    """Samples one thread's stack from a helper thread; counts each function as self (leaf) and total time."""
+
+    def __init__(self, thread_id, interval_s):
+        self.thread_id = thread_id
+        self.interval_s = interval_s
+        self.total = Counter()
+        self.self_time = Counter()
+        self.count = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="rerun_sampler", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval_s):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.count += 1
+            self.self_time[_frame_key(frame)] += 1
+            seen = set()
+            while frame is not None:
+                key = _frame_key(frame)
+                if key not in seen:  # recursion counts once
+                    seen.add(key)
+                    self.total[key] += 1
+                frame = frame.f_back
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        return {
+            "count": self.count,
+            "interval_ms": self.interval_s * 1000,
+            "top_total": self.total.most_common(TOP_FRAMES),
+            "top_self": self.self_time.most_common(TOP_FRAMES),
+        }
+
+
+def _frame_key(frame):
+    code = frame.f_code
+    return f"{os.path.relpath(code.co_filename) if code.co_filename.startswith(os.getcwd()) else os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+# === MongoDB commands ===
+class QueryCounter(monitoring.CommandListener):
+    """Attributes each command to the rerun running on the calling thread, if it is profiled."""
+
+    def started(self, event):
+        profile = _current.get()
+        if profile is not None:
+            collection = event.command.get(event.command_name)
+            key = f"{event.command_name} {collection}" if isinstance(collection, str) else event.command_name
+            profile.pending_commands[event.request_id] = key
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        self._finished(event)
+
+    def _finished(self, event):
+        profile = _current.get()
+        if profile is not None:
+            key = profile.pending_commands.pop(event.request_id, event.command_name)
+            profile.mongo[key] += 1
+            profile.mongo_ms[key] += event.duration_micros / 1000
+
+
+QUERY_COUNTER = QueryCounter()
+
+
+# === Recording ===
+def _logger(path):
+    with _loggers_lock:
+        logger = _loggers.get(path)
+        if logger is None:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            logger = logging.getLogger(f"rogimitra.rerun_profile.{path}")
+            logger.propagate = False
+            logger.setLevel(logging.INFO)
+            handler = logging.handlers.RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            _loggers[path] = logger
+        return logger
+
+
+@contextmanager
+def profile_rerun(config):
+    """Wraps one script rerun; yields the RerunProfile, or None when profiling is off."""
+    if not config["RERUN_PROFILING"]:
+        yield None
+        return
+
+    sample_interval_s = config["RERUN_PROFILE_SAMPLE_MS"] / 1000 if config["RERUN_PROFILE_SAMPLING"] else None
+    profile = RerunProfile(sample_interval_s)
+    token = _current.set(profile)
+    ended_by = None
+    try:
+        yield profile
+    except BaseException as e:
+        # st.rerun() and st.stop() end a rerun by raising
+        ended_by = type(e).__name__
+        raise
+    finally:
+        _current.reset(token)
+        record = profile.record = profile.finish(ended_by)
+        _recent.append(record)
+        if config["RERUN_PROFILE_LOG"]:
+            _logger(config["RERUN_PROFILE_LOG"]).info(json.dumps(record))
+
+
+def set_page(page):
+    profile = _current.get()
+    if profile is not None:
+        profile.page = page
+
+
+@contextmanager
+def section(name):
+    """Times a part of the page; nested sections are recorded as "outer/inner"."""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    profile.stack.append(name)
+    key = "/".join(profile.stack)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.sections[key] += (time.perf_counter() - started) * 1000
+        profile.stack.pop()
+
+
+# === Reporting ===
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summarize(records):
+    """Per page: reruns, wall-time percentiles, Mongo commands per rerun and mean time per section."""
+    pages = defaultdict(list)
+    for record in records:
+        pages[record["page"]].append(record)
+    rows = []
+    for page, page_records in sorted(pages.items()):
+        sections = defaultdict(float)
+        for record in page_records:
+            for name, ms in record["sections_ms"].items():
+                sections[name] += ms
+        walls = [record["wall_ms"] for record in page_records]
+        rows.append({
+            "page": page,
+            "reruns": len(page_records),
+            "p50_ms": percentile(walls, 50),
+            "p95_ms": percentile(walls, 95),
+            "mongo_per_rerun": sum(record["mongo_commands"] for record in page_records) / len(page_records),
+            "sections_ms": {name: total / len(page_records) for name, total in sorted(sections.items(), key=lambda item: -item[1])},
+        })
+    return rows
+
+
+def is_admin(config, user_type, account):
+    admins = {name.strip() for name in config["PROFILER_ADMINS"].split(",") if name.strip()}
+    return user_type == "doctor" and (account or {}).get("username") in admins
+
+
+def render_panel(last):
+    """Sidebar panel: this session's last rerun and the recent window of all sessions."""
+    import streamlit as st
+
+    with st.sidebar.expander("⏱️ Rerun profile"):
+        if last is not None:
+            st.markdown(f"**Last rerun:** {last['page']} · {last['wall_ms']:.0f} ms · "
+                        f"{last['mongo_commands']} Mongo commands ({last['mongo_ms']:.0f} ms)")
+            st.table([{"section": name, "ms": round(ms, 1)} for name, ms in last["sections_ms"].items()])
+            if last["mongo"]:
+                st.table([{"command": command, "count": row["count"], "ms": round(row["ms"], 1)} for command, row in last["mongo"].items()])
+            if last.get("samples"):
+                samples = last["samples"]
+                st.caption(f"{samples['count']} samples every {samples['interval_ms']:.0f} ms")
+                st.table([{"function": key, "total %": round(100 * count / max(samples["count"], 1))} for key, count in samples["top_total"]])
+
+        st.markdown(f"**Last {len(_recent)} reruns, all sessions**")
+        st.table([
+            {"page": row["page"], "reruns": row["reruns"], "p50 ms": round(row["p50_ms"]), "p95 ms": round(row["p95_ms"]),
+             "Mongo/rerun": round(row["mongo_per_rerun"], 1), "slowest section": next(iter(row["sections_ms"]), "-")}
+            for row in summarize(list(_recent))
+        ])
+
+
+def main(argv=None):
+    from utils.config import load_config
+
+    parser = argparse.ArgumentParser(description="Summarize recorded rerun profiles.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    summary_parser = sub.add_parser("summary", help="Per-page timings from the rerun profile log")
+    summary_parser.add_argument("--file", help="Defaults to RERUN_PROFILE_LOG")
+    args = parser.parse_args(argv)
+
+    path = args.file or load_config(use_streamlit_secrets=False)["RERUN_PROFILE_LOG"]
+    records = []
+    for candidate in [f"{path}.{i}" for i in range(LOG_BACKUPS, 0, -1)] + [path]:
+        if os.path.exists(candidate):
+            with open(candidate, encoding="utf-8") as file:
+                records.extend(json.loads(line) for line in file if line.strip())
+    if not records:
+        raise SystemExit(f"❌ No rerun profiles at {path}")
+
+    for row in summarize(records):
+        print(f"\n{row['page']}: {row['reruns']} reruns, p50 {row['p50_ms']:.0f} ms, p95 {row['p95_ms']:.0f} ms, "
+              f"{row['mongo_per_rerun']:.1f} Mongo commands per rerun")
+        for name, ms in row["sections_ms"].items():
+            print(f"    {name:<40}{ms:>10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Hot/cold tiering of appointments.
+
+`new_appointments` is the hot tier: everything in flight plus recently
+completed cases, which is what both dashboards query by status. Completed
+appointments finalized more than ARCHIVE_AFTER_DAYS ago are moved under the
+same _id to `archived_appointments` (the cold tier), indexed by patient and
+date. The archived copy is stamped with `archived_at`, and `updated_at` is set
+to the same time so incremental exports pick the move up. Report bodies already live in the report store and are not
+touched. Readers that need a patient's full history or a specific appointment
+use the helpers below, which query both tiers.
+
+Usage (from the project root):
+    python -m utils.tiering archive [--older-than-days 180] [--dry-run]
+    python -m utils.tiering stats
+"""
+import argparse
+from datetime import datetime, timedelta
+
+from pymongo.errors import BulkWriteError
+
+# Appointment collections, hot tier first
+TIERS = ("new_appointments", "archived_appointments")
+_indexed_dbs = set()
+
+
+def ensure_indexes(db):
+    if id(db) not in _indexed_dbs:
+        db.new_appointments.create_index([("status", 1)])
+        db.new_appointments.create_index([("user_id", 1), ("status", 1)])
+        db.archived_appointments.create_index([("user_id", 1), ("created_at", 1)])
+        db.archived_appointments.create_index([("appointment_id", 1)])
+        db.archived_appointments.create_index([("archived_at", 1)])
+        _indexed_dbs.add(id(db))
+
+
+# === Archival ===
+def archive_completed(db, older_than_days, batch_size=500, dry_run=False):
+    """
+    Moves completed appointments finalized before the cutoff to the archive.
+    Each batch is copied first and deleted from the hot tier second, so an
+    interrupted run leaves at most a batch in both tiers, and re-running
+    finishes it. Returns the number of appointments moved (or due, if dry_run).
+    """
+    ensure_indexes(db)
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    query = {"status": "completed", "$or": [
+        {"finalized_at": {"$lt": cutoff}},
+        {"finalized_at": None, "created_at": {"$lt": cutoff}},
+    ]}
+    if dry_run:
+        return db.new_appointments.count_documents(query)
+
+    moved = 0
+    while True:
+        batch = list(db.new_appointments.find(query).limit(batch_size))
+        if not batch:
+            return moved
+        archived_at = datetime.utcnow()
+        try:
+            db.archived_appointments.insert_many([dict(appt, archived_at=archived_at, updated_at=archived_at) for appt in batch], ordered=False)
+        except BulkWriteError as e:
+            # Copies left by an interrupted run are already there
+            if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                raise
+        db.new_appointments.delete_many({"_id": {"$in": [appt["_id"] for appt in batch]}})
+        moved += len(batch)
+        print(f"✅ Archived {moved} appointments")
+
+
+# === Reads across tiers ===
+def find_past_appointments(db, user_id):
+    """A patient's completed appointments from both tiers, oldest first."""
+    query = {"user_id": user_id, "status": "completed"}
+    appointments = {appt["_id"]: appt for appt in db.archived_appointments.find(query)}
+    # A case caught mid-archival is in both tiers; the hot copy wins
+    appointments.update((appt["_id"], appt) for appt in db.new_appointments.find(query))
+    return sorted(appointments.values(), key=lambda appt: (appt.get("created_at") or datetime.min, appt["appointment_id"]))
+
+
+def find_appointment(db, query, projection=None):
+    """One appointment from the hot tier, falling back to the archive."""
+    appt = db.new_appointments.find_one(query, projection)
+    if appt is None:
+        appt = db.archived_appointments.find_one(query, projection)
+    return appt
+
+
+def max_appointment_id(db):
+    ids = [
+        appt["appointment_id"]
+        for appt in (
+            db.new_appointments.find_one(sort=[("appointment_id", -1)]),
+            db.archived_appointments.find_one(sort=[("appointment_id", -1)]),
+        )
+        if appt
+    ]
+    return max(ids, default=0)
+
+
+def tier_stats(db):
+    stats = {}
+    for tier, name in zip(("hot", "archive"), TIERS):
+        collection = db[name]
+        stats[tier] = {
+            "appointments": collection.estimated_document_count(),
+            "size_mb": db.command("collStats", collection.name).get("size", 0) / 1e6,
+        }
+    return stats
+
+
+def main(argv=None):
+    from utils.config import load_config
+    from utils.db import get_db
+
+    parser = argparse.ArgumentParser(description="Move old completed appointments to the archive tier.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    archive_parser = sub.add_parser("archive", help="Archive completed appointments past the cutoff")
+    archive_parser.add_argument("--older-than-days", type=int, default=None, help="Defaults to ARCHIVE_AFTER_DAYS")
+    archive_parser.add_argument("--batch-size", type=int, default=500)
+    archive_parser.add_argument("--dry-run", action="store_true", help="Only count what would be moved")
+    sub.add_parser("stats", help="Document counts and data size per tier")
+    args = parser.parse_args(argv)
+
+    config = load_config(use_streamlit_secrets=False)
+    db = get_db(config)
+    if args.command == "archive":
+        days = args.older_than_days if args.older_than_days is not None else config["ARCHIVE_AFTER_DAYS"]
+        count = archive_completed(db, days, batch_size=args.batch_size, dry_run=args.dry_run)
+        print(f"{'Would archive' if args.dry_run else 'Archived'} {count} appointments completed more than {days} days ago.")
+    else:
+        for tier, row in tier_stats(db).items():
+            print(f"{tier:<8}{row['appointments']:>10} appointments{row['size_mb']:>10.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""
+Lightweight tracing of an appointment from submission to the final PDF.
+
+Each appointment gets a trace when it is submitted; its W3C `traceparent`
+("00-<trace id>-<span id>-01") is stored on the appointment document, so every
+later step - the workflow1 thread, the doctor's finalization minutes or days
+later, workflow2, PDF generation and upload - records its spans into the same
+trace, in whichever process runs it. Within a thread the current span lives in
+a context variable; work handed to another thread is wrapped with bind(), and
+calls to the workflow service carry the `traceparent` header. Entry points open
+span(); helpers open child(), which is recorded only inside a trace, so e.g. a
+PDF rendered by a script does not start a trace of its own.
+
+Finished spans are appended as JSON lines to TRACE_FILE (empty disables
+exporting; context is still propagated) by a background writer thread:
+    {trace_id, span_id, parent_id, name, service, start, duration_ms, status, attributes}
+
+Usage (from the project root):
+    python -m utils.tracing show --appointment 42
+    python -m utils.tracing show --trace 4bf92f3577b34da6a3ce929d0e0e4736
+    python -m utils.tracing top --limit 10
+"""
+import argparse
+import atexit
+import contextvars
+import functools
+import json
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+_current = contextvars.ContextVar("trace_span", default=None)
+_exporter = None
+_service = "rogimitra"
+
+
+class Span:
+    def __init__(self, name, trace_id, parent_id, attributes, sampled=True):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.sampled = sampled
+        self.status = "ok"
+        self.start_ns = time.time_ns()
+
+    @property
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def fail(self, error):
+        """Marks the span failed; for errors the traced code handles itself."""
+        self.status = "error"
+        self.attributes["error"] = f"{type(error).__name__}: {error}"
+
+
+# === Exporting ===
+class JsonlExporter:
+    """Appends finished spans to a file from a background thread, so request threads never block on disk."""
+
+    def __init__(self, path):
+        self.path = path
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self._run, name="trace_exporter", daemon=True)
+        self.thread.start()
+        atexit.register(self.flush)
+
+    def export(self, record):
+        self.queue.put(record)
+
+    def _run(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        while True:
+            records = [self.queue.get()]
+            while not self.queue.empty():
+                records.append(self.queue.get())
+            done = [record for record in records if isinstance(record, threading.Event)]
+            lines = [json.dumps(record, default=str) + "\n" for record in records if not isinstance(record, threading.Event)]
+            try:
+                with open(self.path, "a", encoding="utf-8") as file:
+                    file.writelines(lines)
+            except OSError as e:
+                print("❌ Could not write trace spans:", e)
+            for event in done:
+                event.set()
+
+    def flush(self, timeout=5):
+        event = threading.Event()
+        self.queue.put(event)
+        event.wait(timeout)
+
+
+def configure_tracing(config, service=None):
+    """Sets where this process exports spans (TRACE_FILE) and the service name recorded on them."""
+    global _exporter, _service
+    path = config.get("TRACE_FILE")
+    if service:
+        _service = service
+    if not path:
+        _exporter = None
+    elif _exporter is None or _exporter.path != path:
+        _exporter = JsonlExporter(path)
+
+
+def _export(span, end_ns):
+    if _exporter is None or not span.sampled:
+        return
+    _exporter.export({
+        "trace_id": span.trace_id,
+        "span_id": span.span_id,
+        "parent_id": span.parent_id,
+        "name": span.name,
+        "service": _service,
+        "thread": threading.current_thread().name,
+        "start": datetime.fromtimestamp(span.start_ns / 1e9, timezone.utc).isoformat(),
+        "duration_ms": (end_ns - span.start_ns) / 1e6,
+        "status": span.status,
+        "attributes": span.attributes,
+    })
+
+
+# === Context ===
+def parse_traceparent(traceparent):
+    """(trace_id, span_id, sampled) of a traceparent string, or None when it is missing or malformed."""
+    match = TRACEPARENT_RE.match((traceparent or "").strip().lower())
+    if not match:
+        return None
+    trace_id, span_id, flags = match.groups()
+    return trace_id, span_id, bool(int(flags, 16) & 1)
+
+
+def current_traceparent():
+    span = _current.get()
+    return span.traceparent if span else None
+
+
+def inject(headers):
+    """Adds the current span's traceparent to outgoing HTTP headers."""
+    traceparent = current_traceparent()
+    if traceparent:
+        headers["traceparent"] = traceparent
+    return headers
+
+
+@contextmanager
+def _start(name, parent, attributes, new_trace_sampled):
+    context = parse_traceparent(parent)
+    if context is None and _current.get() is not None:
+        context = (_current.get().trace_id, _current.get().span_id, _current.get().sampled)
+    trace_id, parent_id, sampled = context or (secrets.token_hex(16), None, new_trace_sampled)
+
+    current = Span(name, trace_id, parent_id, attributes, sampled)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.fail(e)
+        raise
+    finally:
+        _current.reset(token)
+        _export(current, time.time_ns())
+
+
+def span(name, parent=None, **attributes):
+    """
+    Records `name` as a child of `parent` (a traceparent string) or, without
+    one, of the current span; with neither it starts a new trace. Exceptions
+    mark the span as an error and propagate.
+    """
+    return _start(name, parent, attributes, True)
+
+
+def child(name, parent=None, **attributes):
+    """Like span(), but outside any trace the span (and everything under it) is not recorded."""
+    return _start(name, parent, attributes, False)
+
+
+def record(name, start_ns, end_ns, parent=None, **attributes):
+    """Records an already finished interval, e.g. the time a job spent queued."""
+    context = parse_traceparent(parent)
+    if context is None:
+        return
+    past = Span(name, *context[:2], attributes, context[2])
+    past.start_ns = start_ns
+    _export(past, end_ns)
+
+
+def bind(fn):
+    """fn, running in the trace context of the caller of bind() whichever thread calls it."""
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def bound(*args, **kwargs):
+        # A Context can only be entered by one thread at a time
+        return context.copy().run(fn, *args, **kwargs)
+    return bound
+
+
+# === Reading ===
+def load_spans(path):
+    with open(path, encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def format_trace(spans):
+    """An indented waterfall: offset from the trace start, duration and name of every span."""
+    spans = sorted(spans, key=lambda span: span["start"])
+    known = {span["span_id"] for span in spans}
+    children = defaultdict(list)
+    for span in spans:
+        children[span["parent_id"] if span["parent_id"] in known else None].append(span)
+    started = datetime.fromisoformat(spans[0]["start"])
+
+    lines = [f"trace {spans[0]['trace_id']}", f"{'offset s':>10}{'duration s':>12}  span"]
+
+    def walk(parent_id, depth):
+        for span in children[parent_id]:
+            offset = (datetime.fromisoformat(span["start"]) - started).total_seconds()
+            attributes = " ".join(f"{key}={value}" for key, value in span["attributes"].items())
+            error = "  ❌" if span["status"] == "error" else ""
+            lines.append(f"{offset:>10.2f}{span['duration_ms'] / 1000:>12.2f}  {'  ' * depth}{span['name']} [{span['service']}] {attributes}{error}")
+            walk(span["span_id"], depth + 1)
+
+    walk(None, 0)
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    from utils.config import load_config
+
+    parser = argparse.ArgumentParser(description="Inspect recorded appointment traces.")
+    parser.add_argument("--file", help="Defaults to TRACE_FILE")
+    sub = parser.add_subparsers(dest="command", required=True)
+    show_parser = sub.add_parser("show", help="Print one trace as a waterfall")
+    target = show_parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--appointment", type=int)
+    target.add_argument("--trace")
+    top_parser = sub.add_parser("top", help="List the longest traces")
+    top_parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    path = args.file or load_config(use_streamlit_secrets=False)["TRACE_FILE"]
+    if not path or not os.path.exists(path):
+        raise SystemExit(f"❌ No trace file at {path}")
+    traces = defaultdict(list)
+    for span in load_spans(path):
+        traces[span["trace_id"]].append(span)
+
+    if args.command == "show":
+        trace_id = args.trace
+        if args.appointment is not None:
+            trace_id = next((trace_id for trace_id, spans in traces.items()
+                             if any(span["attributes"].get("appointment_id") == args.appointment for span in spans)), None)
+        if trace_id not in traces:
+            raise SystemExit("❌ Trace not found")
+        print(format_trace(traces[trace_id]))
+    else:
+        def elapsed(spans):
+            starts = [datetime.fromisoformat(span["start"]).timestamp() for span in spans]
+            ends = [start + span["duration_ms"] / 1000 for start, span in zip(starts, spans)]
+            return max(ends) - min(starts)
+
+        print(f"{'trace':<34}{'appointment':>12}{'spans':>7}{'elapsed s':>11}")
+        for trace_id, spans in sorted(traces.items(), key=lambda item: -elapsed(item[1]))[:args.limit]:
+            appointment_id = next((span["attributes"]["appointment_id"] for span in spans if "appointment_id" in span["attributes"]), "-")
+            print(f"{trace_id:<34}{appointment_id!s:>12}{len(spans):>7}{elapsed(spans):>11.2f}")
+
+
+if __name__ == "__main__":
+    main()